@@ -0,0 +1,68 @@
+"""
+運用 エンドポイント
+遅いリクエストの処理時間の内訳（app.core.tracing のリングバッファ）を返す
+"""
+
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel
+
+from app.core.tracing import get_trace_buffer
+
+router = APIRouter()
+
+
+# Pydanticスキーマ
+class TraceSpan(BaseModel):
+    name: str
+    start_ms: float  # リクエスト開始からの経過時間
+    duration_ms: float
+    error: Optional[str]  # 例外で終了した場合の例外名
+
+
+class TraceDetail(BaseModel):
+    trace_id: str
+    method: str  # WebSocketの発話は WS
+    path: str
+    route: Optional[str]
+    status: Optional[int]
+    started_at: str
+    duration_ms: float
+    spans: List[TraceSpan]  # 開始順
+    dropped_spans: int  # 上限を超えて記録しなかったスパン数
+
+
+class TraceList(BaseModel):
+    stats: Dict[str, Any]
+    traces: List[TraceDetail]
+
+
+@router.get("/traces", response_model=TraceList)
+async def list_traces(
+    limit: int = Query(20, ge=1, le=1000, description="最大件数"),
+    min_ms: float = Query(0.0, ge=0, description="処理時間の下限（ミリ秒）"),
+    path: Optional[str] = Query(None, description="パスに含む文字列で絞り込み"),
+):
+    """遅いリクエスト（TRACE_SLOW_MS 以上）・サーバーエラーのトレース（新しい順）"""
+    buffer = get_trace_buffer()
+    return TraceList(
+        stats=buffer.stats(),
+        traces=[trace.to_dict() for trace in buffer.list(limit=limit, min_ms=min_ms, path=path)]
+    )
+
+
+@router.get("/traces/{trace_id}", response_model=TraceDetail)
+async def get_trace(trace_id: str):
+    """トレースの取得（X-Trace-Id レスポンスヘッダーの値を指定）"""
+    trace = get_trace_buffer().get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="トレースが見つかりません（保持対象外または破棄済み）")
+    return trace.to_dict()
+
+
+@router.delete("/traces")
+async def clear_traces():
+    """保持しているトレースを削除"""
+    get_trace_buffer().clear()
+    return {"status": "cleared"}
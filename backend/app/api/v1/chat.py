@@ -3,14 +3,27 @@
 テキストチャット、音声チャット機能を提供
 """
 
+import asyncio
+import json
+import math
 import os
-import tempfile
 import uuid
-from typing import List
-from pathlib import Path
+from email.utils import formatdate
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
 
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
-from fastapi.responses import FileResponse
+from fastapi import (
+    APIRouter,
+    Header,
+    HTTPException,
+    Depends,
+    Request,
+    Response,
+    WebSocket,
+    WebSocketDisconnect
+)
+from fastapi.responses import StreamingResponse
+from openai import RateLimitError
 
 from app.models.chat import (
     TextChatRequest,
@@ -18,18 +31,78 @@ from app.models.chat import (
     VoiceChatResponse,
     HealthCheckResponse
 )
-from app.services.openai_service import get_openai_service, OpenAIService
+from app.services.openai_service import get_openai_service, OpenAIService, WHISPER_PROMPT
+from app.services.audio_clips import get_clip_library, split_spoken_segments
+from app.services.audio_store import get_audio_store, parse_byte_range
+from app.services.tts_cache import get_tts_cache
+from app.services.voice_upload import (
+    InvalidUpload,
+    UploadTooLarge,
+    VoiceUpload,
+    read_voice_upload
+)
+from app.services.voice_session import VoiceSession, UtteranceTooLarge
+from app.services.conversation_store import (
+    Conversation,
+    WorkOrderNotFound,
+    get_conversation_store
+)
 from app.core.prompts import (
-    build_system_prompt,
     build_chat_prompt,
     extract_safety_keywords,
     add_safety_reminder
 )
+from app.core.prompt_cache import CompiledPrompt, get_prompt_compiler
+from app.core.answer_cache import BYPASS_HEADER_VALUE, get_answer_cache
+from app.core.mp3 import join_mp3
+from app.core.audio_preprocess import get_preprocess_stats
+from app.core.hedging import hedging_stats
+from app.core.history import conversation_key, get_history_compactor
+from app.core.http_pool import get_http_pool
+from app.core.metrics import WEBSOCKET_SESSIONS, record_error, stage_timer
+from app.core.scheduler import (
+    REQUEST_DEADLINE_SECONDS,
+    DeadlineExceeded,
+    Overloaded,
+    request_context,
+    retry_after_seconds,
+    scheduler_stats
+)
+from app.core.safety import SafetyMatch, detect_safety_categories, get_safety_scanner
+from app.core.single_flight import single_flight_stats
+from app.core.tracing import finish_trace, span, trace_request
+from app.core.usage import bind_work_order, get_usage_ledger, usage_context
+from app.core.retrieval import build_reference_context
 from app.data.aircon_manuals import get_manual
 
 
 router = APIRouter()
 
+# 音声アップロードのリクエスト形式（本文を独自に解析するためOpenAPIに明示）
+VOICE_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["audio"],
+                    "properties": {
+                        "audio": {
+                            "type": "string",
+                            "format": "binary",
+                            "description": "音声ファイル（mp3, wav, m4a等）"
+                        },
+                        "model": {"type": "string", "description": "エアコン機種名"},
+                        "current_step": {"type": "string", "description": "現在の作業工程"},
+                        "work_order_id": {"type": "string", "description": "作業案件ID（サーバー側の対話履歴を使用）"}
+                    }
+                }
+            }
+        }
+    }
+}
+
 
 @router.get("/health", response_model=HealthCheckResponse)
 async def health_check():
@@ -45,9 +118,40 @@ async def health_check():
     )
 
 
+@router.get("/stats")
+async def get_stats(openai_service: OpenAIService = Depends(get_openai_service)):
+    """
+    チャット処理のキャッシュ統計を取得
+
+    Args:
+        openai_service: OpenAIサービス（DI）
+
+    Returns:
+        各キャッシュのヒット/ミス数等
+    """
+    return {
+        "prompt_cache": get_prompt_compiler().stats(),
+        "answer_cache": get_answer_cache().stats(),
+        "tts_cache": get_tts_cache().stats(),
+        "audio_clips": get_clip_library().stats(),
+        "audio_store": get_audio_store().stats(),
+        "audio_preprocess": get_preprocess_stats().stats(),
+        "single_flight": single_flight_stats(),
+        "scheduler": scheduler_stats(),
+        "hedging": hedging_stats(),
+        "history": get_history_compactor().stats(),
+        "conversations": get_conversation_store().stats(),
+        "usage": get_usage_ledger().stats(),
+        "chat_providers": openai_service.chat_router.stats(),
+        "http_pool": get_http_pool().stats()
+    }
+
+
 @router.post("/text", response_model=TextChatResponse)
 async def text_chat(
     request: TextChatRequest,
+    response: Response,
+    x_answer_cache: Optional[str] = Header(None, description="bypass で回答キャッシュを使わない"),
     openai_service: OpenAIService = Depends(get_openai_service)
 ):
     """
@@ -55,81 +159,398 @@ async def text_chat(
 
     Args:
         request: チャットリクエスト
+        response: レスポンス（X-Answer-Cache ヘッダー設定用）
+        x_answer_cache: 回答キャッシュ制御ヘッダー
         openai_service: OpenAIサービス（DI）
 
     Returns:
         TextChatResponse: チャット応答
     """
+    conversation = await _open_text_conversation(request)
     try:
-        # マニュアルデータ取得
-        manual_data = None
-        if request.model:
-            manual_data = get_manual(request.model)
-            if not manual_data:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"機種 {request.model} のマニュアルが見つかりません"
-                )
-
-        # システムプロンプト構築
-        system_prompt = build_system_prompt(
-            model=request.model,
-            current_step=request.current_step,
-            manual_data=manual_data
+        messages, tokens_saved = await _build_text_messages(request, conversation)
+        cache_key = _answer_cache_key(
+            x_answer_cache, request.model, request.current_step, request.message, conversation.messages
         )
 
-        # メッセージリスト構築
-        messages = build_chat_prompt(
-            system_prompt=system_prompt,
-            chat_history=request.chat_history,
-            user_message=request.message
-        )
-
-        # GPT-4で応答生成
+        # GPT-4で応答生成（同じ質問の回答はキャッシュから返す）
         result = await openai_service.chat_completion(
             messages=messages,
             temperature=0.7,
-            max_tokens=500
+            max_tokens=500,
+            cache_key=cache_key
         )
+        response.headers["X-Answer-Cache"] = _answer_cache_status(cache_key, result.cached)
 
-        # 安全キーワード検出
-        safety_keywords = extract_safety_keywords(request.message)
+        # 安全キーワード検出（質問と回答の両方）
+        safety_keywords = detect_safety_categories(request.message, result.content)
 
         # 安全リマインダー追加
         reply = add_safety_reminder(result.content, safety_keywords)
 
+        # 対話履歴に追加し、次のターンに向けて古い対話を要約に畳み込む（保存・要約はバックグラウンド）
+        _record_turn(conversation, request.message, reply, openai_service)
+
         return TextChatResponse(
             reply=reply,
             model_used=result.model,
-            usage=result.usage,
+            usage={**result.usage, **tokens_saved},
             safety_warnings=safety_keywords
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _service_error(e)
 
 
-@router.post("/voice", response_model=VoiceChatResponse)
-async def voice_chat(
-    audio: UploadFile = File(..., description="音声ファイル（mp3, wav, m4a等）"),
-    model: str = Form(None, description="エアコン機種名"),
-    current_step: str = Form(None, description="現在の作業工程"),
+@router.post("/text/stream")
+async def text_chat_stream(
+    request: TextChatRequest,
+    x_answer_cache: Optional[str] = Header(None, description="bypass で回答キャッシュを使わない"),
     openai_service: OpenAIService = Depends(get_openai_service)
 ):
     """
-    音声ベースのチャット
+    テキストベースのチャット（Server-Sent Events によるストリーミング）
+
+    イベント順序:
+        safety: 検出された安全警告 {"safety_warnings": [...]}
+                （応答中に新たな安全カテゴリを検出した場合は、その時点で検出済みの全カテゴリを再送）
+        token:  応答トークン {"content": "..."}（複数回）
+        done:   安全リマインダーとトークン使用量
+                {"reminder": "...", "model_used": "...", "usage": {...}, "answer_cache": "HIT|MISS|BYPASS"}
+        error:  ストリーム途中のエラー {"detail": "..."}
 
     Args:
-        audio: アップロードされた音声ファイル
+        request: チャットリクエスト
+        x_answer_cache: 回答キャッシュ制御ヘッダー
+        openai_service: OpenAIサービス（DI）
+
+    Returns:
+        StreamingResponse: text/event-stream
+    """
+    # 機種エラー等はストリーム開始前に通常のHTTPエラーとして返す
+    conversation = await _open_text_conversation(request)
+    messages, tokens_saved = await _build_text_messages(request, conversation)
+    cache_key = _answer_cache_key(
+        x_answer_cache, request.model, request.current_step, request.message, conversation.messages
+    )
+
+    # 安全キーワード検出
+    safety_keywords = extract_safety_keywords(request.message)
+
+    async def event_stream():
+        yield _sse_event("safety", {"safety_warnings": safety_keywords})
+
+        content_parts: List[str] = []
+        # 応答はトークン毎に照合する（断片の境目をまたぐキーワードも検出）
+        safety_stream = get_safety_scanner().stream()
+        model_used = openai_service.chat_model
+        usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        cached = False
+
+        try:
+            async for chunk in openai_service.chat_completion_stream(
+                messages=messages,
+                temperature=0.7,
+                max_tokens=500,
+                cache_key=cache_key
+            ):
+                cached = cached or chunk.cached
+                if chunk.model:
+                    model_used = chunk.model
+                if chunk.usage:
+                    usage = chunk.usage
+                if chunk.content:
+                    content_parts.append(chunk.content)
+                    yield _sse_event("token", {"content": chunk.content})
+                    if _merge_safety_categories(safety_keywords, safety_stream.feed(chunk.content)):
+                        yield _sse_event("safety", {"safety_warnings": safety_keywords})
+        except Exception as e:
+            yield _sse_event("error", {"detail": str(e)})
+            return
+        if _merge_safety_categories(safety_keywords, safety_stream.finish()):
+            yield _sse_event("safety", {"safety_warnings": safety_keywords})
+
+        # 安全リマインダー（応答末尾に追加される部分のみ送信）
+        content = "".join(content_parts)
+        reminder = add_safety_reminder(content, safety_keywords)[len(content):]
+        _record_turn(conversation, request.message, content + reminder, openai_service)
+
+        yield _sse_event("done", {
+            "reminder": reminder,
+            "model_used": model_used,
+            "usage": {**usage, **tokens_saved},
+            "answer_cache": _answer_cache_status(cache_key, cached)
+        })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # リバースプロキシでのバッファリング無効化
+        }
+    )
+
+
+async def _open_work_order_conversation(work_order_id: Optional[str]) -> Optional[Conversation]:
+    """
+    作業案件の会話（サーバー側の対話履歴）を取得
+
+    Args:
+        work_order_id: 作業案件ID
+
+    Returns:
+        Conversation（作業案件の指定がない場合はNone）
+
+    Raises:
+        HTTPException: 作業案件が存在しない場合（404）
+    """
+    if not work_order_id:
+        return None
+    try:
+        conversation = await get_conversation_store().open(work_order_id)
+    except WorkOrderNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    bind_work_order(conversation.work_order_id)
+    return conversation
+
+
+async def _open_text_conversation(request: TextChatRequest) -> Conversation:
+    """
+    テキストチャットの会話を取得
+
+    作業案件の指定があればサーバー側の対話履歴、なければリクエストの対話履歴を使用する
+
+    Args:
+        request: チャットリクエスト
+
+    Returns:
+        Conversation
+
+    Raises:
+        HTTPException: 作業案件が存在しない場合（404）
+    """
+    conversation = await _open_work_order_conversation(request.work_order_id)
+    if conversation is not None:
+        return conversation
+
+    # クライアントが履歴を送る場合は、クライアントの会話IDで識別（未指定の場合は要約しない）
+    history = list(request.chat_history or [])
+    return Conversation(conversation_key(request.conversation_id), messages=history)
+
+
+async def _build_text_messages(
+    request: TextChatRequest,
+    conversation: Conversation
+) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+    """
+    テキストチャットリクエストからメッセージリストを構築
+
+    Args:
+        request: チャットリクエスト
+        conversation: 会話（対話履歴）
+
+    Returns:
+        (OpenAI APIに渡すメッセージリスト, 削減したトークン数 {"manual_tokens_saved", "history_tokens_saved"})
+
+    Raises:
+        HTTPException: 指定機種のマニュアルが存在しない場合（404）
+    """
+    # マニュアルデータ取得
+    manual_data = None
+    if request.model:
+        manual_data = get_manual(request.model)
+        if not manual_data:
+            raise HTTPException(
+                status_code=404,
+                detail=f"機種 {request.model} のマニュアルが見つかりません"
+            )
+
+    # システムプロンプト構築
+    compiled = get_prompt_compiler().compile(
+        model=request.model,
+        current_step=request.current_step,
+        manual_data=manual_data
+    )
+
+    # 古い対話は要約に畳み込む（要約が未作成の場合は直近の対話のみ）
+    history = get_history_compactor().compact(conversation.key, conversation.messages, conversation.offset)
+
+    # メッセージリスト構築（質問に関連するマニュアル抜粋を追加）
+    messages = build_chat_prompt(
+        system_prompt=compiled.text,
+        chat_history=history.recent,
+        user_message=request.message,
+        reference_context=await build_reference_context(
+            request.message,
+            model=request.model,
+            included_sections=compiled.sections
+        ),
+        history_summary=history.summary
+    )
+    return messages, {
+        "manual_tokens_saved": compiled.manual_tokens_saved,
+        "history_tokens_saved": history.tokens_saved
+    }
+
+
+def _record_turn(
+    conversation: Conversation,
+    user_message: str,
+    reply: str,
+    openai_service: OpenAIService
+) -> None:
+    """
+    今回のターンを対話履歴に追加し、要約の更新を予約
+
+    作業案件の会話は chat_history への書き込みも予約する（いずれもバックグラウンドで実行）
+
+    Args:
+        conversation: 会話
+        user_message: 利用者の発言
+        reply: 応答
+        openai_service: OpenAIサービス
+    """
+    get_conversation_store().add_turn(conversation, user_message, reply)
+    get_history_compactor().schedule_update(
+        conversation.key, conversation.messages, openai_service.summarize, conversation.offset
+    )
+
+
+def _reference_provider(model: Optional[str], compiled: CompiledPrompt):
+    """認識テキストから参考情報（マニュアル検索結果）を返す関数を生成"""
+    async def provide(query: str) -> Optional[str]:
+        return await build_reference_context(query, model=model, included_sections=compiled.sections)
+    return provide
+
+
+async def _read_voice_upload(request: Request) -> VoiceUpload:
+    """
+    音声アップロードを受信（上限超過は413、形式不正は400）
+
+    Args:
+        request: リクエスト（multipart/form-data）
+
+    Returns:
+        VoiceUpload
+    """
+    try:
+        with span("upload"):
+            return await read_voice_upload(request)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidUpload as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _service_error(e: Exception) -> HTTPException:
+    """
+    サービス層の例外をHTTPエラーに変換
+
+    Args:
+        e: 例外
+
+    Returns:
+        HTTPException（混雑・レート制限は503、期限切れは504、その他は500）
+    """
+    record_error(e, "api")
+    if isinstance(e, (Overloaded, RateLimitError)):
+        retry_after = e.retry_after if isinstance(e, Overloaded) else retry_after_seconds(e)
+        return HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(retry_after or 1))}
+        )
+    if isinstance(e, DeadlineExceeded):
+        return HTTPException(status_code=504, detail=str(e))
+    return HTTPException(status_code=500, detail=str(e))
+
+
+def _answer_cache_key(
+    header_value: Optional[str],
+    model: Optional[str],
+    current_step: Optional[str],
+    question: str,
+    chat_history: Optional[List[Dict[str, str]]] = None
+) -> Optional[str]:
+    """
+    回答キャッシュのキーを生成
+
+    Args:
+        header_value: X-Answer-Cache リクエストヘッダーの値
         model: エアコン機種名
         current_step: 現在の作業工程
+        question: 質問文
+        chat_history: 対話履歴
+
+    Returns:
+        キャッシュキー（bypass 指定時・キャッシュ対象外の場合はNone）
+    """
+    answer_cache = get_answer_cache()
+    if (header_value or "").strip().lower() == BYPASS_HEADER_VALUE:
+        answer_cache.record_bypass()
+        return None
+    return answer_cache.make_key(model, current_step, question, chat_history)
+
+
+def _answer_cache_status(cache_key: Optional[str], cached: bool) -> str:
+    """回答キャッシュの利用結果（HIT / MISS / BYPASS）"""
+    if cache_key is None:
+        return "BYPASS"
+    return "HIT" if cached else "MISS"
+
+
+def _merge_safety_categories(safety_keywords: List[str], matches: List[SafetyMatch]) -> bool:
+    """
+    応答中に検出した安全カテゴリを検出済みのリストに追加
+
+    Args:
+        safety_keywords: 検出済みの安全カテゴリ（追加して並べ直す）
+        matches: 応答の照合結果
+
+    Returns:
+        新たなカテゴリを追加したか
+    """
+    added = {match.category for match in matches} - set(safety_keywords)
+    if added:
+        safety_keywords[:] = get_safety_scanner().order([*safety_keywords, *added])
+    return bool(added)
+
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Server-Sent Events 形式の1イベントを生成"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/voice", response_model=VoiceChatResponse, openapi_extra=VOICE_UPLOAD_OPENAPI)
+async def voice_chat(
+    request: Request,
+    x_answer_cache: Optional[str] = Header(None, description="bypass で回答キャッシュを使わない"),
+    openai_service: OpenAIService = Depends(get_openai_service)
+):
+    """
+    音声ベースのチャット
+
+    multipart/form-data（audio: 音声ファイル, model: エアコン機種名, current_step: 現在の作業工程,
+    work_order_id: 作業案件ID）を受信しながら解析し、音声はメモリ上のままWhisperに渡す
+
+    Args:
+        request: リクエスト（multipart/form-data）
+        x_answer_cache: 回答キャッシュ制御ヘッダー
         openai_service: OpenAIサービス（DI）
 
     Returns:
         VoiceChatResponse: 音声チャット応答
     """
-    temp_audio_path = None
-    temp_response_path = None
+    upload = await _read_voice_upload(request)
+    model = upload.fields.get("model") or None
+    current_step = upload.fields.get("current_step") or None
+    conversation = (
+        await _open_work_order_conversation(upload.fields.get("work_order_id"))
+        or Conversation(uuid.uuid4().hex)
+    )
 
     try:
         # マニュアルデータ取得
@@ -138,41 +559,48 @@ async def voice_chat(
             manual_data = get_manual(model)
 
         # システムプロンプト構築
-        system_prompt = build_system_prompt(
+        compiled = get_prompt_compiler().compile(
             model=model,
             current_step=current_step,
             manual_data=manual_data
         )
-
-        # 一時ファイルに音声を保存
-        suffix = Path(audio.filename).suffix or ".mp3"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
-            content = await audio.read()
-            temp_file.write(content)
-            temp_audio_path = temp_file.name
+        system_prompt = compiled.text
+        history = get_history_compactor().compact(conversation.key, conversation.messages, conversation.offset)
 
         # 音声→テキスト→チャット→音声の一連処理
         result = await openai_service.voice_to_voice_chat(
-            audio_file_path=temp_audio_path,
+            audio_file_path=None,
+            audio_data=upload.audio,
+            audio_filename=upload.filename,
             system_prompt=system_prompt,
-            chat_history=[],  # TODO: データベースから取得
-            temperature=0.7
+            chat_history=history.messages,
+            temperature=0.7,
+            reference_provider=_reference_provider(model if manual_data else None, compiled),
+            cache_key_provider=lambda transcript: _answer_cache_key(
+                x_answer_cache, model, current_step, transcript, conversation.messages
+            )
         )
 
-        # 安全キーワード検出
-        safety_keywords = extract_safety_keywords(result["transcript"])
+        # 安全キーワード検出（質問と回答の両方）
+        safety_keywords = detect_safety_categories(result["transcript"], result["response_text"])
 
         # 安全リマインダー追加
         reply_text = add_safety_reminder(result["response_text"], safety_keywords)
 
-        # 応答音声を一時ファイルに保存
-        response_audio_id = str(uuid.uuid4())
-        temp_response_path = f"/tmp/response_{response_audio_id}.mp3"
+        # 安全リマインダーの読み上げを応答音声の末尾にフレーム単位で連結（事前合成クリップを使用）
+        response_audio = result["response_audio"]
+        reminder_segments = split_spoken_segments(reply_text[len(result["response_text"]):])
+        if reminder_segments:
+            response_audio = join_mp3(
+                [response_audio] + await get_clip_library().render(openai_service, reminder_segments)
+            )
+
+        # 応答音声を音声ストアに保存（保存期間の経過後に自動削除）
+        response_audio_id = await get_audio_store().put(response_audio)
 
-        with open(temp_response_path, "wb") as f:
-            f.write(result["response_audio"])
+        if result["transcript"].strip():
+            _record_turn(conversation, result["transcript"], reply_text, openai_service)
 
-        # 音声ファイルのURL（実際はS3等にアップロードすべき）
         audio_url = f"/api/v1/chat/audio/{response_audio_id}"
 
         return VoiceChatResponse(
@@ -180,42 +608,401 @@ async def voice_chat(
             reply=reply_text,
             audio_url=audio_url,
             model_used=result["model"],
-            usage=result["usage"],
+            usage={
+                **result["usage"],
+                "manual_tokens_saved": compiled.manual_tokens_saved,
+                "history_tokens_saved": history.tokens_saved,
+                "answer_cache_hit": int(result["cached"]),
+                "audio_ms_dropped": int(result["audio_seconds_dropped"] * 1000)
+            },
             safety_warnings=safety_keywords
         )
 
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _service_error(e)
+
+
+@router.post("/voice/stream", openapi_extra=VOICE_UPLOAD_OPENAPI)
+async def voice_chat_stream(
+    request: Request,
+    x_answer_cache: Optional[str] = Header(None, description="bypass で回答キャッシュを使わない"),
+    openai_service: OpenAIService = Depends(get_openai_service)
+):
+    """
+    音声ベースのチャット（文単位パイプライン、音声ストリーミング応答）
+
+    応答を文末（。！？）で区切って順次音声合成し、audio/mpeg として順番に返す
+    （冒頭に事前合成した相槌、末尾に安全リマインダーの事前合成クリップを含む）。
+    音声認識結果と安全警告はレスポンスヘッダー（URLエンコード）で返す。
+
+    Args:
+        request: リクエスト（multipart/form-data、項目は /voice と同じ）
+        x_answer_cache: 回答キャッシュ制御ヘッダー
+        openai_service: OpenAIサービス（DI）
+
+    Returns:
+        StreamingResponse: audio/mpeg
+    """
+    upload = await _read_voice_upload(request)
+    model = upload.fields.get("model") or None
+    current_step = upload.fields.get("current_step") or None
+    conversation = (
+        await _open_work_order_conversation(upload.fields.get("work_order_id"))
+        or Conversation(uuid.uuid4().hex)
+    )
+
+    try:
+        # マニュアルデータ取得
+        manual_data = None
+        if model:
+            manual_data = get_manual(model)
+
+        # システムプロンプト構築
+        compiled = get_prompt_compiler().compile(
+            model=model,
+            current_step=current_step,
+            manual_data=manual_data
+        )
+        history = get_history_compactor().compact(conversation.key, conversation.messages, conversation.offset)
+
+        def safety_epilogue(transcript: str, response_text: str) -> str:
+            # 応答末尾に安全リマインダーを読み上げる（質問と回答の両方から検出）
+            keywords = detect_safety_categories(transcript, response_text)
+            return add_safety_reminder(response_text, keywords)[len(response_text):]
+
+        events = openai_service.voice_to_voice_chat_stream(
+            audio_file_path=None,
+            audio_data=upload.audio,
+            audio_filename=upload.filename,
+            system_prompt=compiled.text,
+            chat_history=history.messages,
+            temperature=0.7,
+            epilogue=safety_epilogue,
+            reference_provider=_reference_provider(model if manual_data else None, compiled),
+            cache_key_provider=lambda transcript: _answer_cache_key(
+                x_answer_cache, model, current_step, transcript, conversation.messages
+            )
+        )
+
+        # 最初のイベント（音声認識結果）を待ってからレスポンスを開始
+        transcript_event = await events.__anext__()
+
+    except Exception as e:
+        raise _service_error(e)
+
+    safety_keywords = extract_safety_keywords(transcript_event.text)
+
+    async def audio_stream():
+        try:
+            # 応答生成を待つ間、事前合成した相槌を先に再生
+            filler = get_clip_library().next_filler()
+            if filler:
+                yield filler[1]
+
+            async for event in events:
+                if event.type == "audio":
+                    yield event.audio_data
+                elif event.type == "done" and transcript_event.text.strip():
+                    _record_turn(conversation, transcript_event.text, event.text, openai_service)
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(
+        audio_stream(),
+        media_type="audio/mpeg",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Transcript": quote(transcript_event.text),
+            "X-Safety-Warnings": quote(",".join(safety_keywords))
+        }
+    )
+
+
+@router.websocket("/voice/ws")
+async def voice_session_ws(
+    websocket: WebSocket,
+    openai_service: OpenAIService = Depends(get_openai_service)
+):
+    """
+    音声チャットセッション（WebSocket）
+
+    1接続の間、機種・作業工程・対話履歴をサーバー側で保持する（作業案件IDを指定すると
+    対話履歴は作業案件毎に保持され、テキストチャット・再接続後も引き継ぐ）。
+    発話中の音声フレームを随時受け取り、発話終了通知で音声認識を開始する。
+
+    クライアント→サーバー:
+        {"type": "start", "model": "...", "current_step": "...", "format": "webm", "work_order_id": "..."}
+            セッション設定（"config" で途中変更も可能、接続URLのクエリでも指定可能）
+        バイナリフレーム: 発話中の音声データ
+        {"type": "end"}: 発話終了（蓄積した音声を認識・応答）
+        {"type": "cancel"}: 蓄積中の音声を破棄
+
+    サーバー→クライアント:
+        {"type": "ready"}
+        {"type": "transcript", "text": "...", "safety_warnings": [...]}
+        {"type": "audio", "text": "..."} + 直後のバイナリフレーム（文毎の応答音声）
+            先頭に相槌（"filler": true）が届く場合がある
+        {"type": "done", "reply": "...", "safety_warnings": [...], "model_used": "...", "usage": {...},
+         "answer_cache": "HIT|MISS|BYPASS"}（safety_warnings は質問と回答の両方から検出）
+        {"type": "error", "detail": "..."}
+
+    Args:
+        websocket: WebSocket接続
+        openai_service: OpenAIサービス（DI）
+    """
+    await websocket.accept()
+    WEBSOCKET_SESSIONS.inc()
+
+    session = VoiceSession(
+        model=websocket.query_params.get("model"),
+        current_step=websocket.query_params.get("current_step"),
+        audio_format=websocket.query_params.get("format", "webm")
+    )
+    utterances: "asyncio.Queue[bytes]" = asyncio.Queue()
+
+    work_order_id = websocket.query_params.get("work_order_id")
+    if work_order_id:
+        try:
+            session.attach(await get_conversation_store().open(work_order_id))
+        except WorkOrderNotFound as e:
+            WEBSOCKET_SESSIONS.dec()
+            await websocket.send_json({"type": "error", "detail": str(e)})
+            await websocket.close(code=1008)
+            return
+
+    # 応答処理は別タスクで行い、その間も次の発話の音声を受信する
+    worker = asyncio.create_task(
+        _run_voice_turns(
+            websocket, session, utterances, openai_service,
+            answer_cache_header=websocket.headers.get("x-answer-cache"),
+            worker_id=websocket.headers.get("x-worker-id") or websocket.query_params.get("worker_id")
+        )
+    )
+
+    try:
+        await websocket.send_json({"type": "ready"})
+
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            if message.get("bytes") is not None:
+                try:
+                    session.append_audio(message["bytes"])
+                except UtteranceTooLarge as e:
+                    await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+
+            try:
+                data = json.loads(message.get("text") or "")
+            except ValueError:
+                await websocket.send_json({"type": "error", "detail": "不正なメッセージ形式です"})
+                continue
+
+            message_type = data.get("type")
+            if message_type in ("start", "config"):
+                session.configure(
+                    model=data.get("model"),
+                    current_step=data.get("current_step"),
+                    audio_format=data.get("format")
+                )
+                if data.get("work_order_id"):
+                    try:
+                        session.attach(await get_conversation_store().open(data["work_order_id"]))
+                    except WorkOrderNotFound as e:
+                        await websocket.send_json({"type": "error", "detail": str(e)})
+            elif message_type == "end":
+                audio = session.take_utterance()
+                if audio:
+                    utterances.put_nowait(audio)
+            elif message_type == "cancel":
+                session.discard_utterance()
+            else:
+                await websocket.send_json({
+                    "type": "error",
+                    "detail": f"不明なメッセージ種別です: {message_type}"
+                })
+
+    except WebSocketDisconnect:
+        pass
 
     finally:
-        # 一時ファイルのクリーンアップ
-        if temp_audio_path and os.path.exists(temp_audio_path):
-            os.unlink(temp_audio_path)
+        WEBSOCKET_SESSIONS.dec()
+        worker.cancel()
+        # 作業案件の会話の要約は次の接続・テキストチャットで使うため残す
+        if not session.conversation.persistent:
+            get_history_compactor().forget(session.conversation_id)
+
+
+async def _run_voice_turns(
+    websocket: WebSocket,
+    session: VoiceSession,
+    utterances: "asyncio.Queue[bytes]",
+    openai_service: OpenAIService,
+    answer_cache_header: Optional[str] = None,
+    worker_id: Optional[str] = None
+) -> None:
+    """
+    発話を順番に処理（音声認識→応答生成→文単位の音声合成）
+
+    Args:
+        websocket: WebSocket接続
+        session: 音声セッション
+        utterances: 発話音声のキュー
+        openai_service: OpenAIサービス
+        answer_cache_header: 接続時の X-Answer-Cache ヘッダーの値
+        worker_id: 作業者ID（X-Worker-Id ヘッダーまたは接続URLのクエリ、API使用量の記録用）
+    """
+    while True:
+        audio = await utterances.get()
+
+        # 発話毎に期限・API使用量の記録先・処理時間の内訳の記録先を設定（期限を過ぎた呼び出しは送信しない）
+        with (
+            request_context(timeout=REQUEST_DEADLINE_SECONDS),
+            usage_context(worker_id, websocket.url.path) as usage,
+            trace_request("WS", websocket.url.path) as trace
+        ):
+            if session.conversation.persistent:
+                usage.work_order_id = session.conversation.work_order_id
+            status = 200
+            try:
+                with stage_timer("voice_ws", "transcribe"):
+                    transcription = await openai_service.transcribe_audio_data(
+                        audio_data=audio,
+                        filename=session.utterance_filename,
+                        language="ja",
+                        prompt=WHISPER_PROMPT
+                    )
+                transcript = transcription.text.strip()
+
+                # 安全キーワード検出
+                safety_keywords = extract_safety_keywords(transcript)
+
+                await websocket.send_json({
+                    "type": "transcript",
+                    "text": transcript,
+                    "safety_warnings": safety_keywords
+                })
+                if not transcript:
+                    continue
+
+                # 応答生成を待つ間、事前合成した相槌を先に再生
+                filler = get_clip_library().next_filler()
+                if filler:
+                    await websocket.send_json({"type": "audio", "text": filler[0], "filler": True})
+                    await websocket.send_bytes(filler[1])
+
+                def safety_epilogue(response_text: str) -> str:
+                    keywords = detect_safety_categories(transcript, response_text)
+                    return add_safety_reminder(response_text, keywords)[len(response_text):]
+
+                messages, manual_tokens_saved = await session.build_messages(transcript)
+                cache_key = _answer_cache_key(
+                    answer_cache_header, session.model, session.current_step, transcript, session.history
+                )
+
+                async for event in openai_service.chat_speech_stream(
+                    messages=messages,
+                    temperature=0.7,
+                    epilogue=safety_epilogue,
+                    cache_key=cache_key
+                ):
+                    if event.type == "audio":
+                        await websocket.send_json({"type": "audio", "text": event.text})
+                        await websocket.send_bytes(event.audio_data)
+                    elif event.type == "done":
+                        session.add_turn(transcript, event.text)
+                        get_history_compactor().schedule_update(
+                            session.conversation_id, session.history, openai_service.summarize,
+                            session.conversation.offset
+                        )
+                        response_keywords = detect_safety_categories(transcript, event.text)
+                        await websocket.send_json({
+                            "type": "done",
+                            "reply": add_safety_reminder(event.text, response_keywords),
+                            "safety_warnings": response_keywords,
+                            "model_used": event.model,
+                            "usage": {
+                                **(event.usage or {}),
+                                "manual_tokens_saved": manual_tokens_saved,
+                                "audio_ms_dropped": int(transcription.audio_seconds_dropped * 1000)
+                            },
+                            "answer_cache": _answer_cache_status(cache_key, event.cached)
+                        })
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                status = 500
+                record_error(e, "api")
+                await websocket.send_json({"type": "error", "detail": str(e)})
+            finally:
+                finish_trace(trace, status)
 
 
 @router.get("/audio/{audio_id}")
-async def get_audio(audio_id: str):
+async def get_audio(audio_id: str, request: Request):
     """
     音声ファイルを取得
 
+    Range（単一範囲）・If-Range・If-None-Match に対応し、途中からの再取得を可能にする
+
     Args:
         audio_id: 音声ファイルID
+        request: リクエスト（条件付き・範囲リクエストのヘッダー参照用）
 
     Returns:
-        音声ファイル
+        音声ファイル（200 / 206 / 304 / 416）
     """
-    audio_path = f"/tmp/response_{audio_id}.mp3"
-
-    if not os.path.exists(audio_path):
+    audio_store = get_audio_store()
+    audio = await audio_store.get(audio_id)
+    if audio is None:
         raise HTTPException(status_code=404, detail="音声ファイルが見つかりません")
 
-    return FileResponse(
-        audio_path,
-        media_type="audio/mpeg",
-        filename=f"response_{audio_id}.mp3"
+    size = len(audio.data)
+    last_modified = formatdate(audio.created_at, usegmt=True)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": audio.etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": f"private, max-age={int(audio_store.ttl_seconds)}",
+        "Content-Disposition": f'attachment; filename="response_{audio_id}.mp3"'
+    }
+
+    if _etag_matches(request.headers.get("if-none-match"), audio.etag):
+        return Response(status_code=304, headers=headers)
+
+    # If-Range が現在の音声と一致しない場合は範囲指定を無視して全体を返す
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range.strip() in (audio.etag, last_modified):
+        try:
+            byte_range = parse_byte_range(request.headers.get("range"), size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        return Response(content=audio.data, media_type=audio.content_type, headers=headers)
+
+    start, end = byte_range
+    return Response(
+        content=audio.data[start:end + 1],
+        status_code=206,
+        media_type=audio.content_type,
+        headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}"}
     )
 
 
+def _etag_matches(header_value: Optional[str], etag: str) -> bool:
+    """If-None-Match ヘッダーが ETag に一致するか（弱い比較）"""
+    if not header_value:
+        return False
+    candidates = [value.strip() for value in header_value.split(",")]
+    return "*" in candidates or any(value.removeprefix("W/") == etag for value in candidates)
+
+
 @router.get("/models")
 async def get_available_models():
     """
@@ -0,0 +1,178 @@
+"""
+API使用量の集計 エンドポイント
+usage_records を作業者・作業案件・日付毎に集計し、料金（概算）・応答時間の内訳を返す
+"""
+
+import uuid
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import cast, func, select, Date
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel
+
+from app.core.database import get_db
+from app.core.usage import estimate_cost
+from app.models.database import UsageRecord
+
+router = APIRouter()
+
+
+# Pydanticスキーマ
+class UsageKindSummary(BaseModel):
+    calls: int
+    cached_calls: int
+    cost_usd: float
+    latency_ms_avg: float
+    latency_ms_p95: float  # 複数モデルの場合は最大値
+
+
+class UsageSummary(BaseModel):
+    key: Optional[str]  # 作業者ID / 作業案件ID / 日付（未設定の呼び出しはnull）
+    calls: int
+    prompt_tokens: int
+    completion_tokens: int
+    audio_seconds: float
+    tts_characters: int
+    cost_usd: float
+    by_kind: Dict[str, UsageKindSummary]
+
+
+@router.get("/by-worker", response_model=List[UsageSummary])
+async def usage_by_worker(
+    start: Optional[date] = Query(None, description="集計開始日（既定は30日前）"),
+    end: Optional[date] = Query(None, description="集計終了日（この日を含む、既定は今日）"),
+    db: AsyncSession = Depends(get_db),
+):
+    """作業者毎の使用量（料金の高い順）"""
+    rows = await _aggregate(db, UsageRecord.worker_id, start, end)
+    return sorted(_summarize(rows), key=lambda summary: summary.cost_usd, reverse=True)
+
+
+@router.get("/by-work-order", response_model=List[UsageSummary])
+async def usage_by_work_order(
+    start: Optional[date] = Query(None, description="集計開始日（既定は30日前）"),
+    end: Optional[date] = Query(None, description="集計終了日（この日を含む、既定は今日）"),
+    worker_id: Optional[uuid.UUID] = Query(None, description="作業者IDで絞り込み"),
+    db: AsyncSession = Depends(get_db),
+):
+    """作業案件毎の使用量（料金の高い順）"""
+    filters = [UsageRecord.worker_id == worker_id] if worker_id else []
+    rows = await _aggregate(db, UsageRecord.work_order_id, start, end, filters)
+    return sorted(_summarize(rows), key=lambda summary: summary.cost_usd, reverse=True)
+
+
+@router.get("/daily", response_model=List[UsageSummary])
+async def usage_daily(
+    start: Optional[date] = Query(None, description="集計開始日（既定は30日前）"),
+    end: Optional[date] = Query(None, description="集計終了日（この日を含む、既定は今日）"),
+    worker_id: Optional[uuid.UUID] = Query(None, description="作業者IDで絞り込み"),
+    work_order_id: Optional[uuid.UUID] = Query(None, description="作業案件IDで絞り込み"),
+    db: AsyncSession = Depends(get_db),
+):
+    """日毎の使用量（日付順）"""
+    filters = []
+    if worker_id:
+        filters.append(UsageRecord.worker_id == worker_id)
+    if work_order_id:
+        filters.append(UsageRecord.work_order_id == work_order_id)
+    rows = await _aggregate(db, cast(UsageRecord.created_at, Date), start, end, filters)
+    return sorted(_summarize(rows), key=lambda summary: summary.key or "")
+
+
+async def _aggregate(
+    db: AsyncSession,
+    key_column: Any,
+    start: Optional[date],
+    end: Optional[date],
+    filters: Optional[List[Any]] = None,
+) -> List[Any]:
+    """
+    集計キー・呼び出し種別・モデル毎に使用量を集計（料金はモデル毎に計算するためモデルでも分ける）
+
+    Args:
+        db: DBセッション
+        key_column: 集計キーの列（作業者ID・作業案件ID・日付）
+        start: 集計開始日
+        end: 集計終了日（この日を含む）
+        filters: 追加の絞り込み条件
+
+    Returns:
+        (key, kind, model, calls, cached_calls, prompt_tokens, completion_tokens,
+         audio_seconds, tts_characters, latency_ms_avg, latency_ms_p95) の行
+    """
+    end = end or date.today()
+    start = start or end - timedelta(days=30)
+
+    key = key_column.label("key")
+    query = (
+        select(
+            key,
+            UsageRecord.kind,
+            UsageRecord.model,
+            func.count().label("calls"),
+            func.count().filter(UsageRecord.cached.is_(True)).label("cached_calls"),
+            func.sum(UsageRecord.prompt_tokens).label("prompt_tokens"),
+            func.sum(UsageRecord.completion_tokens).label("completion_tokens"),
+            func.sum(UsageRecord.audio_seconds).label("audio_seconds"),
+            func.sum(UsageRecord.tts_characters).label("tts_characters"),
+            func.avg(UsageRecord.latency_ms).label("latency_ms_avg"),
+            func.percentile_cont(0.95).within_group(UsageRecord.latency_ms).label("latency_ms_p95"),
+        )
+        .where(UsageRecord.created_at >= start)
+        .where(UsageRecord.created_at < end + timedelta(days=1))
+        .where(*(filters or []))
+        .group_by(key, UsageRecord.kind, UsageRecord.model)
+    )
+    result = await db.execute(query)
+    return list(result.all())
+
+
+def _summarize(rows: List[Any]) -> List[UsageSummary]:
+    """集計キー・呼び出し種別・モデル毎の行を集計キー毎にまとめる"""
+    summaries: Dict[Optional[str], UsageSummary] = {}
+    for row in rows:
+        key = str(row.key) if row.key is not None else None
+        summary = summaries.get(key)
+        if summary is None:
+            summary = summaries[key] = UsageSummary(
+                key=key,
+                calls=0,
+                prompt_tokens=0,
+                completion_tokens=0,
+                audio_seconds=0.0,
+                tts_characters=0,
+                cost_usd=0.0,
+                by_kind={},
+            )
+
+        prompt_tokens = int(row.prompt_tokens or 0)
+        completion_tokens = int(row.completion_tokens or 0)
+        audio_seconds = float(row.audio_seconds or 0.0)
+        tts_characters = int(row.tts_characters or 0)
+        cost = estimate_cost(row.model, prompt_tokens, completion_tokens, audio_seconds, tts_characters)
+
+        summary.calls += row.calls
+        summary.prompt_tokens += prompt_tokens
+        summary.completion_tokens += completion_tokens
+        summary.audio_seconds = round(summary.audio_seconds + audio_seconds, 1)
+        summary.tts_characters += tts_characters
+        summary.cost_usd = round(summary.cost_usd + cost, 6)
+
+        kind = summary.by_kind.get(row.kind)
+        if kind is None:
+            kind = summary.by_kind[row.kind] = UsageKindSummary(
+                calls=0, cached_calls=0, cost_usd=0.0, latency_ms_avg=0.0, latency_ms_p95=0.0
+            )
+        # モデル毎の平均を呼び出し数で重み付けして合算
+        calls = kind.calls + row.calls
+        kind.latency_ms_avg = round(
+            (kind.latency_ms_avg * kind.calls + float(row.latency_ms_avg or 0.0) * row.calls) / calls, 1
+        )
+        kind.latency_ms_p95 = round(max(kind.latency_ms_p95, float(row.latency_ms_p95 or 0.0)), 1)
+        kind.calls = calls
+        kind.cached_calls += row.cached_calls
+        kind.cost_usd = round(kind.cost_usd + cost, 6)
+
+    return list(summaries.values())
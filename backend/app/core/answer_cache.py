@@ -0,0 +1,190 @@
+"""
+回答キャッシュ
+同じ機種・作業工程での同じ質問（表記揺れを正規化）に対する回答を再利用し、
+GPT呼び出しを省略する
+"""
+
+import hashlib
+import os
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from app.data.aircon_manuals import MANUAL_VERSION
+
+
+# キャッシュを無効化するリクエストヘッダー値（X-Answer-Cache: bypass）
+BYPASS_HEADER_VALUE = "bypass"
+
+# カタカナ → ひらがな 変換表（ァ〜ヶ）
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(ord("ァ"), ord("ヶ") + 1)}
+
+
+# 正規化で除去する文の区切り・括弧（NFKC 後の表記、- . / ~ % 等の数値に関わる記号は残す）
+_SENTENCE_PUNCTUATION = set("。、,?!…‥・「」『』()【】[]〈〉《》\"'“”‘’")
+
+
+def normalize_question(text: str) -> str:
+    """
+    質問文を正規化（全角半角の統一、カタカナ→ひらがな、句読点・空白の除去、小文字化）
+
+    数値の符号・小数点・分数・範囲・単位の記号（-0.1MPa、1/4 等）は回答が変わるため残す
+
+    Args:
+        text: 質問文
+
+    Returns:
+        正規化した質問文
+    """
+    text = unicodedata.normalize("NFKC", text).lower().translate(_KATAKANA_TO_HIRAGANA)
+    return "".join(
+        char for char in text
+        # 文の区切り・空白・制御文字を除去
+        if char not in _SENTENCE_PUNCTUATION and unicodedata.category(char)[0] not in ("Z", "C")
+    )
+
+
+class CachedAnswer(BaseModel):
+    """キャッシュした回答"""
+    content: str
+    model: str
+    expires_at: float
+
+
+class AnswerCache:
+    """TTL付きLRUの回答キャッシュ"""
+
+    def __init__(self, max_size: int = 512, ttl_seconds: float = 3600, max_history: int = 2):
+        """
+        初期化
+
+        Args:
+            max_size: 保持する回答の最大数
+            ttl_seconds: 回答の有効期間（秒）
+            max_history: キャッシュ対象とする対話履歴の最大メッセージ数
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.max_history = max_history
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def make_key(
+        self,
+        model: Optional[str],
+        current_step: Optional[str],
+        question: str,
+        chat_history: Optional[List[Dict[str, str]]] = None
+    ) -> Optional[str]:
+        """
+        キャッシュキーを生成
+
+        Args:
+            model: エアコン機種名
+            current_step: 現在の作業工程
+            question: 質問文
+            chat_history: 対話履歴（短い履歴のみキャッシュ対象、内容もキーに含める）
+
+        Returns:
+            キャッシュキー（履歴が長い等でキャッシュ対象外の場合はNone）
+        """
+        chat_history = chat_history or []
+        normalized = normalize_question(question)
+        if not normalized or len(chat_history) > self.max_history:
+            return None
+
+        parts = [model or "", current_step or "", MANUAL_VERSION, normalized]
+        for message in chat_history:
+            parts.append(f"{message.get('role')}:{normalize_question(message.get('content', ''))}")
+
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedAnswer]:
+        """
+        キャッシュ済みの回答を取得
+
+        Args:
+            key: make_key() で生成したキー
+
+        Returns:
+            CachedAnswer（未登録・期限切れの場合はNone）
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, content: str, model: str) -> None:
+        """
+        回答を登録
+
+        Args:
+            key: make_key() で生成したキー
+            content: GPTの回答（安全リマインダー追加前）
+            model: 使用したモデル
+        """
+        self._entries[key] = CachedAnswer(
+            content=content,
+            model=model,
+            expires_at=time.monotonic() + self.ttl_seconds
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def record_bypass(self) -> None:
+        """リクエストヘッダーによるキャッシュ無効化を記録"""
+        self.bypasses += 1
+
+    def clear(self) -> None:
+        """キャッシュを破棄"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """キャッシュ統計を取得"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds
+        }
+
+
+# シングルトンインスタンス
+_answer_cache: Optional[AnswerCache] = None
+
+
+def get_answer_cache() -> AnswerCache:
+    """AnswerCacheのシングルトンインスタンスを取得"""
+    global _answer_cache
+    if _answer_cache is None:
+        _answer_cache = AnswerCache(
+            max_size=int(os.getenv("ANSWER_CACHE_SIZE", "512")),
+            ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+            max_history=int(os.getenv("ANSWER_CACHE_MAX_HISTORY", "2"))
+        )
+    return _answer_cache
@@ -0,0 +1,256 @@
+"""
+音声認識前の前処理
+WAV（PCM / float）をデコードし、エネルギーベースの音声区間検出で前後の無音を除去、
+モノラル・16kHz に変換してからWhisperに渡す（送信量・課金対象の秒数を削減）
+"""
+
+import io
+import os
+import struct
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+from app.core.wav import WAVE_FORMAT_IEEE_FLOAT, WAVE_FORMAT_PCM, parse_wav
+
+
+# 前処理を行うか
+PREPROCESS_ENABLED = os.getenv("AUDIO_PREPROCESS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Whisperに渡すサンプリング周波数（Whisper内部の処理単位）
+TARGET_SAMPLE_RATE = 16000
+
+# 音声区間検出の設定
+VAD_FRAME_SECONDS = 0.03         # 判定単位（30ms）
+VAD_MARGIN_DB = 12.0             # 背景雑音レベル（下位10%のフレーム）からの閾値
+VAD_MIN_THRESHOLD_DB = -50.0     # 閾値の下限（dBFS、静かな環境で微小な雑音を音声と誤判定しない）
+VAD_PADDING_SECONDS = 0.25       # 音声区間の前後に残す余白
+
+
+class PreprocessResult(BaseModel):
+    """前処理結果"""
+    audio: bytes
+    filename: str
+    applied: bool = False          # デコードできず元の音声のまま渡す場合はFalse
+    original_seconds: float = 0.0
+    output_seconds: float = 0.0
+    original_bytes: int = 0
+    output_bytes: int = 0
+
+    @property
+    def dropped_seconds(self) -> float:
+        """除去した音声の長さ（秒）"""
+        return max(self.original_seconds - self.output_seconds, 0.0)
+
+
+def decode_wav(data: bytes) -> Optional[Tuple[np.ndarray, int]]:
+    """
+    WAVを float32 のサンプル列にデコード
+
+    Args:
+        data: WAVファイル
+
+    Returns:
+        ((サンプル数, チャンネル数) の float32 行列（-1.0〜1.0）, サンプリング周波数)
+        （対応していない形式の場合はNone）
+    """
+    info = parse_wav(data)
+    if info is None or info.channels <= 0 or info.sample_rate <= 0:
+        return None
+
+    raw = memoryview(data)[info.data_offset:info.data_offset + info.data_size]
+    width = info.bits_per_sample // 8
+    usable = len(raw) - len(raw) % (width * info.channels) if width else 0
+    raw = raw[:usable]
+
+    if info.audio_format == WAVE_FORMAT_PCM and info.bits_per_sample == 8:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif info.audio_format == WAVE_FORMAT_PCM and info.bits_per_sample == 16:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif info.audio_format == WAVE_FORMAT_PCM and info.bits_per_sample == 24:
+        # 3バイト整数を上位に詰めた32ビット整数として読む
+        triplets = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = (triplets[:, 0] << 8) | (triplets[:, 1] << 16) | (triplets[:, 2] << 24)
+        samples = values.astype(np.float32) / 2147483648.0
+    elif info.audio_format == WAVE_FORMAT_PCM and info.bits_per_sample == 32:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    elif info.audio_format == WAVE_FORMAT_IEEE_FLOAT and info.bits_per_sample in (32, 64):
+        dtype = "<f4" if info.bits_per_sample == 32 else "<f8"
+        samples = np.frombuffer(raw, dtype=dtype).astype(np.float32)
+    else:
+        return None
+
+    return samples.reshape(-1, info.channels), info.sample_rate
+
+
+def encode_wav(samples: np.ndarray, sample_rate: int) -> bytes:
+    """
+    モノラルの float32 サンプル列を16ビットPCMのWAVにエンコード
+
+    Args:
+        samples: 1次元の float32 配列（-1.0〜1.0）
+        sample_rate: サンプリング周波数
+
+    Returns:
+        WAVファイル
+    """
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+    buffer = io.BytesIO()
+    buffer.write(b"RIFF" + struct.pack("<I", 36 + len(pcm)) + b"WAVE")
+    buffer.write(b"fmt " + struct.pack("<IHHIIHH", 16, WAVE_FORMAT_PCM, 1, sample_rate, sample_rate * 2, 2, 16))
+    buffer.write(b"data" + struct.pack("<I", len(pcm)))
+    buffer.write(pcm)
+    return buffer.getvalue()
+
+
+def voiced_range(samples: np.ndarray, sample_rate: int) -> Optional[Tuple[int, int]]:
+    """
+    エネルギーベースで音声区間を検出
+
+    フレーム毎のRMSをdBに変換し、背景雑音レベル + マージン（下限あり）を超えるフレームを音声とみなす
+
+    Args:
+        samples: モノラルの float32 配列
+        sample_rate: サンプリング周波数
+
+    Returns:
+        (開始サンプル, 終了サンプル)（音声区間がない場合はNone）
+    """
+    frame = max(int(sample_rate * VAD_FRAME_SECONDS), 1)
+    count = len(samples) // frame
+    if count == 0:
+        return None
+
+    frames = samples[:count * frame].reshape(count, frame)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+    energy_db = 20.0 * np.log10(np.maximum(rms, 1e-10))
+
+    noise_floor = np.percentile(energy_db, 10)
+    threshold = max(noise_floor + VAD_MARGIN_DB, VAD_MIN_THRESHOLD_DB)
+    voiced = np.flatnonzero(energy_db > threshold)
+    if voiced.size == 0:
+        return None
+
+    padding = int(sample_rate * VAD_PADDING_SECONDS)
+    start = max(int(voiced[0]) * frame - padding, 0)
+    end = min((int(voiced[-1]) + 1) * frame + padding, len(samples))
+    return start, end
+
+
+def resample(samples: np.ndarray, source_rate: int, target_rate: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    """
+    サンプリング周波数を変換（ダウンサンプリング時は窓付きsincの低域通過フィルタで折り返し雑音を抑制）
+
+    Args:
+        samples: モノラルの float32 配列
+        source_rate: 元のサンプリング周波数
+        target_rate: 変換後のサンプリング周波数
+
+    Returns:
+        変換後の float32 配列
+    """
+    if source_rate == target_rate or len(samples) == 0:
+        return samples
+
+    if target_rate < source_rate:
+        cutoff = 0.5 * target_rate / source_rate  # 正規化遮断周波数（サンプリング周波数比）
+        taps = np.arange(-31, 32, dtype=np.float32)
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * taps) * np.hamming(len(taps)).astype(np.float32)
+        kernel /= kernel.sum()
+        samples = np.convolve(samples, kernel, mode="same").astype(np.float32)
+
+    duration = len(samples) / source_rate
+    target_length = max(int(round(duration * target_rate)), 1)
+    positions = np.arange(target_length, dtype=np.float64) * (source_rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def preprocess_audio(data: bytes, filename: str) -> PreprocessResult:
+    """
+    Whisperに渡す前の前処理（デコード → ダウンミックス → 無音除去 → 16kHz変換 → WAV）
+
+    Args:
+        data: アップロードされた音声
+        filename: ファイル名
+
+    Returns:
+        PreprocessResult（デコードできない形式は元の音声のまま applied=False）
+    """
+    untouched = PreprocessResult(
+        audio=data,
+        filename=filename,
+        original_bytes=len(data),
+        output_bytes=len(data)
+    )
+    if not PREPROCESS_ENABLED:
+        return untouched
+
+    decoded = decode_wav(data)
+    if decoded is None:
+        return untouched
+
+    samples, sample_rate = decoded
+    original_seconds = len(samples) / sample_rate
+
+    mono = samples.mean(axis=1, dtype=np.float32) if samples.shape[1] > 1 else samples[:, 0]
+    span = voiced_range(mono, sample_rate)
+    if span is not None:
+        mono = mono[span[0]:span[1]]
+
+    output = resample(mono, sample_rate)
+    audio = encode_wav(output, TARGET_SAMPLE_RATE)
+
+    return PreprocessResult(
+        audio=audio,
+        filename=f"{Path(filename).stem or 'audio'}.wav",
+        applied=True,
+        original_seconds=original_seconds,
+        output_seconds=len(output) / TARGET_SAMPLE_RATE,
+        original_bytes=len(data),
+        output_bytes=len(audio)
+    )
+
+
+class PreprocessStats:
+    """前処理の累計"""
+
+    def __init__(self):
+        self.requests = 0
+        self.applied = 0
+        self.original_seconds = 0.0
+        self.dropped_seconds = 0.0
+        self.bytes_saved = 0
+
+    def record(self, result: PreprocessResult) -> None:
+        """1リクエスト分の前処理結果を記録"""
+        self.requests += 1
+        if result.applied:
+            self.applied += 1
+            self.original_seconds += result.original_seconds
+            self.dropped_seconds += result.dropped_seconds
+            self.bytes_saved += max(result.original_bytes - result.output_bytes, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        """統計を取得"""
+        return {
+            "requests": self.requests,
+            "applied": self.applied,
+            "original_seconds": round(self.original_seconds, 3),
+            "dropped_seconds": round(self.dropped_seconds, 3),
+            "dropped_ratio": self.dropped_seconds / self.original_seconds if self.original_seconds else 0.0,
+            "bytes_saved": self.bytes_saved
+        }
+
+
+# シングルトンインスタンス
+_preprocess_stats: Optional[PreprocessStats] = None
+
+
+def get_preprocess_stats() -> PreprocessStats:
+    """PreprocessStatsのシングルトンインスタンスを取得"""
+    global _preprocess_stats
+    if _preprocess_stats is None:
+        _preprocess_stats = PreprocessStats()
+    return _preprocess_stats
@@ -0,0 +1,162 @@
+"""
+DBへのまとめ書き込み（write-behind）
+行をメモリ上のバッファに溜め、一定間隔（または一定件数溜まった時点）で複数行の INSERT 1回にまとめて書き込む。
+リクエストの応答はDBへの書き込みを待たない
+"""
+
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+
+logger = logging.getLogger(__name__)
+
+# 書き込み待ちの上限件数（DB障害が続いた場合は古いものから破棄）
+DEFAULT_MAX_PENDING = 10000
+
+
+class BatchWriter:
+    """1テーブルへの書き込みバッファ"""
+
+    def __init__(
+        self,
+        model: Any,
+        session_factory: Callable[[], Any],
+        flush_batch: int = 100,
+        max_pending: int = DEFAULT_MAX_PENDING
+    ):
+        """
+        初期化
+
+        Args:
+            model: 書き込み先のORMモデル（app.models.database）
+            session_factory: DBセッションを生成する関数（AsyncSession のコンテキストマネージャー）
+            flush_batch: 1回の INSERT で書き込む最大件数
+            max_pending: 書き込み待ちの上限件数
+        """
+        self.model = model
+        self.session_factory = session_factory
+        self.flush_batch = flush_batch
+        self.max_pending = max_pending
+
+        self._pending: List[Dict[str, Any]] = []  # 書き込み待ちの行（古い順）
+        self._writing: List[Dict[str, Any]] = []  # 書き込み中の行
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+        self.written = 0
+        self.flushes = 0
+        self.failures = 0
+        self.dropped = 0
+
+    @property
+    def name(self) -> str:
+        """テーブル名（ログ表示用）"""
+        return self.model.__tablename__
+
+    def add(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        行を書き込み待ちに追加（件数が溜まった場合は次の書き込みを早める）
+
+        Args:
+            rows: 列名 → 値 の辞書のリスト
+        """
+        self._pending.extend(rows)
+        self._trim()
+        if len(self._pending) >= self.flush_batch:
+            self._wake.set()
+
+    def unwritten(self) -> List[Dict[str, Any]]:
+        """まだDBに書き込まれていない行（書き込み中を含む、古い順）"""
+        return self._writing + self._pending
+
+    def _trim(self) -> None:
+        """書き込み待ちが上限を超えた分を古いものから破棄"""
+        overflow = len(self._pending) - self.max_pending
+        if overflow > 0:
+            del self._pending[:overflow]
+            self.dropped += overflow
+            logger.warning("%s の書き込み待ちが上限を超えたため %d 件を破棄しました", self.name, overflow)
+
+    async def flush(self) -> int:
+        """
+        書き込み待ちの行を flush_batch 件毎に複数行の INSERT で書き込む
+
+        Returns:
+            書き込んだ件数（書き込みに失敗した分は次回に再試行）
+        """
+        async with self._lock:
+            written_before = self.written
+            while self._pending:
+                batch = self._writing = self._pending[:self.flush_batch]
+                del self._pending[:len(batch)]
+                try:
+                    await self._write_batch(batch)
+                except (SQLAlchemyError, OSError) as e:
+                    self.failures += 1
+                    self._pending[:0] = self._writing
+                    self._trim()
+                    logger.warning("%s への書き込みに失敗しました（次回に再試行）: %s", self.name, e)
+                    break
+                finally:
+                    self._writing = []
+                self.flushes += 1
+            return self.written - written_before
+
+    async def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        """
+        1バッチを書き込む
+
+        参照先の削除等、再試行しても書き込めない行（IntegrityError）を含む場合は
+        バッチを半分ずつに分けて書き込み直し、書き込めない行のみ破棄する
+
+        Args:
+            batch: 書き込む行
+
+        Raises:
+            SQLAlchemyError, OSError: DB障害等（未書き込みの行は self._writing に残す）
+        """
+        chunks = [batch]  # 書き込む行のまとまり（末尾から順に書き込む）
+        while chunks:
+            rows = chunks.pop()
+            try:
+                async with self.session_factory() as session:
+                    await session.execute(insert(self.model).values(rows))
+                    await session.commit()
+            except IntegrityError as e:
+                if len(rows) > 1:
+                    middle = len(rows) // 2
+                    chunks += [rows[middle:], rows[:middle]]
+                    continue
+                self.failures += 1
+                self.dropped += 1
+                logger.warning("%s に書き込めない行を破棄しました（id=%s）: %s", self.name, rows[0].get("id"), e.orig)
+            except (SQLAlchemyError, OSError):
+                self._writing = rows + [row for chunk in reversed(chunks) for row in chunk]
+                raise
+            else:
+                self.written += len(rows)
+
+    async def run(self, interval_seconds: float) -> None:
+        """一定間隔（または書き込み待ちが溜まった時点）で flush() を実行（起動時にバックグラウンドタスクとして開始）"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """書き込みの統計を取得"""
+        return {
+            "pending": len(self._pending),
+            "written": self.written,
+            "flushes": self.flushes,
+            "write_failures": self.failures,
+            "dropped": self.dropped,
+            "rows_per_flush": round(self.written / self.flushes, 1) if self.flushes else 0.0
+        }
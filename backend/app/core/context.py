@@ -0,0 +1,173 @@
+"""
+作業工程に応じたマニュアルコンテキストの組み立て
+作業工程と関連するマニュアルセクションを対応付け、トークン予算内で優先度順に詰める
+"""
+
+import math
+import os
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+# 作業工程（requirements.md 2.1 の順序）
+WORK_STEPS = [
+    "事前準備",
+    "室内機設置",
+    "室外機設置",
+    "配管工事",
+    "真空引き・試運転",
+    "仕上げ",
+]
+
+# 作業工程毎に関連するマニュアルセクション
+STEP_SECTIONS: Dict[str, List[str]] = {
+    "事前準備": ["special_notes"],
+    "室内機設置": ["indoor_unit"],
+    "室外機設置": ["outdoor_unit"],
+    "配管工事": ["piping"],
+    "真空引き・試運転": ["vacuum_pump", "test_run", "troubleshooting"],
+    "仕上げ": ["test_run", "special_notes"],
+}
+
+# 工程名の表記揺れを吸収するキーワード（先に一致したものを採用）
+STEP_KEYWORDS = [
+    ("準備", "事前準備"),
+    ("室内機", "室内機設置"),
+    ("据付板", "室内機設置"),
+    ("室外機", "室外機設置"),
+    ("配管", "配管工事"),
+    ("フレア", "配管工事"),
+    ("配線", "配管工事"),
+    ("ドレン", "配管工事"),
+    ("真空", "真空引き・試運転"),
+    ("試運転", "真空引き・試運転"),
+    ("仕上", "仕上げ"),
+    ("清掃", "仕上げ"),
+]
+
+# 常に含めるセクション
+ALWAYS_INCLUDED_SECTIONS = ["safety_warnings"]
+
+# マニュアルコンテキストのトークン予算（既定値）
+DEFAULT_TOKEN_BUDGET = int(os.getenv("MANUAL_CONTEXT_TOKEN_BUDGET", "1500"))
+
+
+class ManualContext(BaseModel):
+    """組み立てたマニュアルコンテキスト"""
+    sections: Dict[str, str]
+    tokens: int
+    full_tokens: int
+
+    @property
+    def tokens_saved(self) -> int:
+        """マニュアル全文と比べて削減したトークン数"""
+        return max(self.full_tokens - self.tokens, 0)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    トークン数を概算（英数字は約4文字/トークン、日本語は約1文字/トークン）
+
+    Args:
+        text: 対象テキスト
+
+    Returns:
+        推定トークン数
+    """
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return math.ceil(ascii_chars / 4) + (len(text) - ascii_chars)
+
+
+def resolve_step(current_step: Optional[str]) -> Optional[str]:
+    """
+    作業工程名を WORK_STEPS のいずれかに正規化
+
+    Args:
+        current_step: クライアントから送られた作業工程（自由記述）
+
+    Returns:
+        正規化した作業工程名（該当なしの場合はNone）
+    """
+    if not current_step:
+        return None
+
+    for step in WORK_STEPS:
+        if step in current_step:
+            return step
+
+    for keyword, step in STEP_KEYWORDS:
+        if keyword in current_step:
+            return step
+
+    return None
+
+
+def section_priority(current_step: Optional[str]) -> List[str]:
+    """
+    作業工程に応じたセクションの優先順位
+
+    安全警告 → 現在の工程 → 前後の工程 の順
+
+    Args:
+        current_step: 作業工程
+
+    Returns:
+        セクションキーの優先順リスト（工程が不明な場合は空リスト）
+    """
+    step = resolve_step(current_step)
+    if step is None:
+        return []
+
+    index = WORK_STEPS.index(step)
+    neighbours = [WORK_STEPS[i] for i in (index - 1, index + 1) if 0 <= i < len(WORK_STEPS)]
+
+    ordered: List[str] = list(ALWAYS_INCLUDED_SECTIONS)
+    for name in [step] + neighbours:
+        for key in STEP_SECTIONS[name]:
+            if key not in ordered:
+                ordered.append(key)
+    return ordered
+
+
+def assemble_manual_context(
+    rendered_sections: Dict[str, str],
+    current_step: Optional[str] = None,
+    token_budget: int = DEFAULT_TOKEN_BUDGET
+) -> ManualContext:
+    """
+    トークン予算内でマニュアルセクションを選択
+
+    Args:
+        rendered_sections: render_manual_sections() の出力
+        current_step: 作業工程
+        token_budget: マニュアルコンテキストのトークン予算
+
+    Returns:
+        ManualContext: 選択したセクション（元の掲載順）と推定トークン数
+    """
+    section_tokens = {key: estimate_tokens(text) for key, text in rendered_sections.items()}
+    full_tokens = sum(section_tokens.values())
+
+    priority = section_priority(current_step)
+    if not priority:
+        # 工程が不明な場合は安全警告を先頭に、残りは掲載順
+        priority = ALWAYS_INCLUDED_SECTIONS + [
+            key for key in rendered_sections if key not in ALWAYS_INCLUDED_SECTIONS
+        ]
+
+    selected = set()
+    used = 0
+    for key in priority:
+        if key not in rendered_sections:
+            continue
+        # 安全警告は予算を超えても必ず含める
+        if key in ALWAYS_INCLUDED_SECTIONS or used + section_tokens[key] <= token_budget:
+            selected.add(key)
+            used += section_tokens[key]
+
+    return ManualContext(
+        sections={key: text for key, text in rendered_sections.items() if key in selected},
+        tokens=used,
+        full_tokens=full_tokens
+    )
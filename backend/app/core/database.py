@@ -5,6 +5,7 @@
 import os
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from app.core.metrics import instrument_engine
 from app.models.database import Base
 
 DATABASE_URL = os.getenv(
@@ -19,6 +20,9 @@ engine = create_async_engine(
     future=True,
 )
 
+# クエリの所要時間・エラーを /metrics に記録
+instrument_engine(engine)
+
 # セッションファクトリ
 AsyncSessionLocal = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
@@ -0,0 +1,185 @@
+"""
+処理段階毎のタイムアウトとヘッジリクエスト
+音声認識・応答生成・音声合成の各段階に上限時間を設け、
+直近の応答時間のp95を過ぎても応答がない呼び出しは複製を送り、先に完了した方の結果を使う
+（複製の送信数は呼び出し数に対する割合で上限を設ける）
+"""
+
+import asyncio
+import os
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from app.core.scheduler import DeadlineExceeded, remaining_time
+
+
+T = TypeVar("T")
+
+# 処理段階毎のタイムアウト（秒）
+DEFAULT_STAGE_TIMEOUTS = {"whisper": 15.0, "chat": 20.0, "tts": 10.0}
+
+# ヘッジリクエストを送るか
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# 複製を送る応答時間のパーセンタイル・判定に必要な件数・最小待ち時間（秒）
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY_SECONDS = 0.2
+
+# 複製を送れる割合の上限（呼び出し数に対する比率、追加の課金を抑える）
+HEDGE_BUDGET_RATIO = float(os.getenv("HEDGE_BUDGET_RATIO", "0.05"))
+
+
+class Hedger:
+    """1処理段階の呼び出しのタイムアウトとヘッジリクエストを管理"""
+
+    def __init__(
+        self,
+        stage: str,
+        timeout: float,
+        hedge_enabled: bool = HEDGE_ENABLED,
+        percentile: float = HEDGE_PERCENTILE,
+        budget_ratio: float = HEDGE_BUDGET_RATIO
+    ):
+        """
+        初期化
+
+        Args:
+            stage: 処理段階名（whisper / chat / tts）
+            timeout: タイムアウト（秒）
+            hedge_enabled: ヘッジリクエストを送るか
+            percentile: 複製を送る応答時間のパーセンタイル
+            budget_ratio: 複製を送れる割合の上限
+        """
+        self.stage = stage
+        self.timeout = timeout
+        self.hedge_enabled = hedge_enabled
+        self.percentile = percentile
+        self.budget_ratio = budget_ratio
+
+        self._latencies: deque = deque(maxlen=256)  # 直近の成功した呼び出しの応答時間（秒）
+
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        複製を送るまでの待ち時間
+
+        Returns:
+            直近の応答時間のパーセンタイル（ヘッジ無効・件数不足の場合はNone）
+        """
+        if not self.hedge_enabled or len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        latencies = sorted(self._latencies)
+        index = min(int(len(latencies) * self.percentile / 100), len(latencies) - 1)
+        return max(latencies[index], HEDGE_MIN_DELAY_SECONDS)
+
+    def _within_budget(self) -> bool:
+        """複製を送っても上限割合を超えないか"""
+        return self.hedged + 1 <= self.budget_ratio * self.calls
+
+    async def run(
+        self,
+        factory: Callable[[], Awaitable[T]],
+        alternate: Optional[Callable[[], Awaitable[T]]] = None
+    ) -> T:
+        """
+        タイムアウト付きで呼び出し、応答が遅い場合は複製を送って先に完了した結果を返す
+
+        Args:
+            factory: 呼び出しのコルーチンを生成する関数
+            alternate: 複製の代わりに送る呼び出し（別のプロバイダー等、Noneの場合は factory）
+
+        Returns:
+            先に成功した呼び出しの結果
+
+        Raises:
+            DeadlineExceeded: タイムアウト（またはリクエストの期限）までに応答がない場合
+            Exception: 送った呼び出しが全て失敗した場合は最後の例外
+        """
+        self.calls += 1
+        timeout = self.timeout
+        remaining = remaining_time()
+        if remaining is not None:
+            timeout = min(timeout, max(remaining, 0.0))
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        primary = asyncio.ensure_future(factory())
+        pending = {primary}
+
+        try:
+            delay = self.hedge_delay()
+            if delay is not None and delay < timeout:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done and self._within_budget():
+                    self.hedged += 1
+                    pending.add(asyncio.ensure_future((alternate or factory)()))
+
+            error: Optional[BaseException] = None
+            while pending:
+                left = started + timeout - loop.time()
+                done, _ = await asyncio.wait(pending, timeout=max(left, 0.0), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.timeouts += 1
+                    if timeout < self.timeout:
+                        raise DeadlineExceeded(f"{self.stage}: リクエストの期限までに応答がありませんでした")
+                    raise DeadlineExceeded(f"{self.stage}: {self.timeout:g}秒以内に応答がありませんでした")
+
+                pending -= done
+                # 失敗した側の例外も取り出しておく（未取得の警告を避ける）
+                errors = [task.exception() for task in done]
+                for task, task_error in zip(done, errors):
+                    if task_error is None:
+                        self._latencies.append(loop.time() - started)
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task_error
+
+            raise error
+        finally:
+            # 後から完了する側の呼び出しは中止
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """タイムアウト・ヘッジリクエストの統計を取得"""
+        latencies = sorted(self._latencies)
+        delay = self.hedge_delay()
+        return {
+            "timeout_seconds": self.timeout,
+            "hedge_enabled": self.hedge_enabled,
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedge_ratio": self.hedged / self.calls if self.calls else 0.0,
+            "timeouts": self.timeouts,
+            "hedge_delay_ms": round(delay * 1000, 1) if delay is not None else None,
+            "latency_ms_p50": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None
+        }
+
+
+# 処理段階毎のインスタンス
+_hedgers: Dict[str, Hedger] = {}
+
+
+def get_hedger(stage: str) -> Hedger:
+    """
+    処理段階毎の Hedger インスタンスを取得
+
+    タイムアウトは環境変数 STAGE_TIMEOUT_<段階>（例: STAGE_TIMEOUT_WHISPER）で変更できる
+    """
+    hedger = _hedgers.get(stage)
+    if hedger is None:
+        timeout = float(os.getenv(f"STAGE_TIMEOUT_{stage.upper()}", str(DEFAULT_STAGE_TIMEOUTS.get(stage, 30.0))))
+        hedger = _hedgers[stage] = Hedger(stage, timeout)
+    return hedger
+
+
+def hedging_stats() -> Dict[str, Dict[str, Any]]:
+    """全処理段階の統計"""
+    return {stage: hedger.stats() for stage, hedger in _hedgers.items()}
@@ -0,0 +1,388 @@
+"""
+対話履歴の圧縮
+直近の対話をトークン予算内で残し、予算からあふれた古い対話は要約（安価なモデルで生成）に畳み込む。
+要約は会話毎にキャッシュし、新たにあふれた対話だけを既存の要約に追加して更新する（バックグラウンド）
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+
+from app.core.context import estimate_tokens
+from app.core.scheduler import PRIORITY_BATCH, request_context
+
+
+logger = logging.getLogger(__name__)
+
+# 対話履歴（要約を含む）のトークン予算
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1200"))
+
+# 要約を保持する会話数
+HISTORY_SUMMARY_CACHE_SIZE = int(os.getenv("HISTORY_SUMMARY_CACHE_SIZE", "1024"))
+
+# 要約の最大トークン数（予算の見積もりと生成の上限に使用）
+SUMMARY_MAX_TOKENS = 500
+
+# 要約の更新のタイムアウト（秒）
+SUMMARY_TIMEOUT_SECONDS = 30.0
+
+# 1メッセージあたりの書式のトークン数（role 等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# 要約に畳み込んだ範囲の境界の確認に使う末尾のメッセージ数
+BOUNDARY_MESSAGES = 2
+
+# 要約の生成指示
+SUMMARY_INSTRUCTION = """あなたはエアコン設置作業の記録係です。
+作業者とアシスタントの対話の要約を更新してください。
+
+- これまでの要約に、追加の対話の内容を反映する
+- 機種名、作業工程の進捗、確認済みの数値（トルク・真空度・配管長等）、未解決の問題、安全上の注意は必ず残す
+- 挨拶や重複は省き、箇条書きで400文字以内にまとめる
+- 要約のみを出力する"""
+
+# 要約をプロンプトに含める際の見出し
+SUMMARY_HEADER = "【これまでの対話の要約】\n"
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    """1メッセージのトークン数（概算）"""
+    return estimate_tokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS
+
+
+def history_tokens(messages: Sequence[Dict[str, str]]) -> int:
+    """メッセージリストのトークン数（概算）"""
+    return sum(message_tokens(message) for message in messages)
+
+
+def recent_start(history: Sequence[Dict[str, str]], budget: int) -> int:
+    """
+    トークン予算内に収まる直近の対話の開始位置
+
+    新しいメッセージから順に予算まで残し、先頭が assistant にならないよう user の位置に揃える
+
+    Args:
+        history: 対話履歴
+        budget: トークン予算
+
+    Returns:
+        直近の対話の開始位置（history[start:] を残す）
+    """
+    start = len(history)
+    used = 0
+    for index in range(len(history) - 1, -1, -1):
+        used += message_tokens(history[index])
+        if used > budget:
+            break
+        start = index
+
+    while start < len(history) and history[start].get("role") != "user":
+        start += 1
+    return start
+
+
+def select_recent_history(history: Sequence[Dict[str, str]], budget: int = HISTORY_TOKEN_BUDGET) -> List[Dict[str, str]]:
+    """
+    トークン予算内の直近の対話を選択
+
+    Args:
+        history: 対話履歴
+        budget: トークン予算
+
+    Returns:
+        直近の対話
+    """
+    return list(history[recent_start(history, budget):])
+
+
+def summary_message(summary: str) -> Dict[str, str]:
+    """要約をプロンプトに含めるメッセージ"""
+    return {"role": "system", "content": SUMMARY_HEADER + summary}
+
+
+def build_summary_messages(previous_summary: str, messages: Sequence[Dict[str, str]]) -> List[Dict[str, str]]:
+    """
+    要約の更新を依頼するメッセージリストを構築
+
+    Args:
+        previous_summary: これまでの要約（初回は空文字）
+        messages: 要約に追加する対話
+
+    Returns:
+        要約生成用のメッセージリスト
+    """
+    lines = []
+    for message in messages:
+        speaker = "アシスタント" if message.get("role") == "assistant" else "作業者"
+        lines.append(f"{speaker}: {message.get('content', '')}")
+
+    return [
+        {"role": "system", "content": SUMMARY_INSTRUCTION},
+        {
+            "role": "user",
+            "content": f"これまでの要約:\n{previous_summary or '（なし）'}\n\n追加の対話:\n" + "\n".join(lines)
+        }
+    ]
+
+
+def _boundary_hash(history: Sequence[Dict[str, str]], end: int) -> str:
+    """要約に畳み込んだ範囲（history[:end]）の末尾の対話の同一性確認用ハッシュ"""
+    digest = hashlib.sha256()
+    for message in history[max(end - BOUNDARY_MESSAGES, 0):end]:
+        digest.update(message.get("role", "").encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(message.get("content", "").encode("utf-8"))
+        digest.update(b"\x01")
+    return digest.hexdigest()
+
+
+class CompactedHistory(BaseModel):
+    """圧縮した対話履歴"""
+    summary: Optional[str] = None
+    recent: List[Dict[str, str]]
+    tokens: int                    # 要約と直近の対話のトークン数
+    full_tokens: int               # 圧縮前の対話履歴のトークン数
+    unsummarized: int = 0          # 要約が間に合わず省いたメッセージ数
+
+    @property
+    def messages(self) -> List[Dict[str, str]]:
+        """プロンプトに含めるメッセージ（要約 + 直近の対話）"""
+        return ([summary_message(self.summary)] if self.summary else []) + self.recent
+
+    @property
+    def tokens_saved(self) -> int:
+        """圧縮で削減したトークン数"""
+        return max(self.full_tokens - self.tokens, 0)
+
+
+class _SummaryState:
+    """1会話の要約"""
+
+    def __init__(self, summary: str, covered: int, boundary_hash: str):
+        self.summary = summary
+        self.covered = covered              # 要約に畳み込んだ範囲の終端（会話の先頭からの位置、先頭を削った分を含む）
+        self.boundary_hash = boundary_hash  # 畳み込んだ範囲の末尾の対話のハッシュ
+
+
+# 要約を生成する関数（要約生成用のメッセージリスト → 要約）
+Summarizer = Callable[[List[Dict[str, str]]], Awaitable[str]]
+
+
+class HistoryCompactor:
+    """会話毎の要約を保持し、対話履歴をトークン予算内に圧縮する"""
+
+    def __init__(self, budget: int = HISTORY_TOKEN_BUDGET, max_conversations: int = HISTORY_SUMMARY_CACHE_SIZE):
+        """
+        初期化
+
+        Args:
+            budget: 対話履歴（要約を含む）のトークン予算
+            max_conversations: 要約を保持する会話数（超えた場合は最終利用の古い順に破棄）
+        """
+        self.budget = budget
+        self.max_conversations = max_conversations
+        self._states: "OrderedDict[str, _SummaryState]" = OrderedDict()
+        self._tasks: Dict[str, "asyncio.Task"] = {}
+
+        self.compactions = 0
+        self.summary_updates = 0
+        self.summary_failures = 0
+        self.unsummarized = 0
+        self._tokens: deque = deque(maxlen=256)  # 直近の圧縮後のトークン数
+
+    def _state(self, key: str, history: Sequence[Dict[str, str]], offset: int) -> Tuple[Optional[_SummaryState], int]:
+        """
+        会話の要約と、要約に畳み込んだ範囲の履歴上の終端を取得
+
+        先頭が削られた履歴（保持件数の上限・DBからの読み込み直し）でも、畳み込んだ範囲の末尾の対話を
+        探して位置を合わせる（見つからない場合は履歴が編集されたとみなし、要約を使わない）
+
+        Args:
+            key: 会話の識別子
+            history: 対話履歴
+            offset: 履歴の先頭から削ったメッセージ数（history[0] の会話の先頭からの位置）
+
+        Returns:
+            (要約, history[:終端] が要約済み)（要約がない場合は (None, 0)）
+        """
+        state = self._states.get(key)
+        if state is None:
+            return None, 0
+        end = state.covered - offset
+        if end <= 0:
+            # 畳み込んだ対話は全て履歴から削られている
+            self._states.move_to_end(key)
+            return state, 0
+        if end > len(history) or _boundary_hash(history, end) != state.boundary_hash:
+            end = next(
+                (index for index in range(min(end, len(history)), 0, -1)
+                 if _boundary_hash(history, index) == state.boundary_hash),
+                0
+            )
+            if not end:
+                del self._states[key]
+                return None, 0
+            state.covered = offset + end
+        self._states.move_to_end(key)
+        return state, end
+
+    def compact(self, key: Optional[str], history: Sequence[Dict[str, str]], offset: int = 0) -> CompactedHistory:
+        """
+        対話履歴を要約 + 直近の対話に圧縮
+
+        Args:
+            key: 会話の識別子（Noneの場合は要約を使わない）
+            history: 対話履歴
+            offset: 履歴の先頭から削ったメッセージ数（Conversation.offset）
+
+        Returns:
+            CompactedHistory
+        """
+        self.compactions += 1
+        history = list(history or [])
+        state, covered = self._state(key, history, offset) if key else (None, 0)
+        summary = state.summary if state else None
+
+        budget = self.budget - (message_tokens(summary_message(summary)) if summary else 0)
+        start = max(recent_start(history, budget), covered)
+        recent = history[start:]
+
+        # 要約の更新が間に合っていない対話（次のターンまでに要約される）
+        unsummarized = start - covered
+        self.unsummarized += unsummarized
+
+        result = CompactedHistory(
+            summary=summary,
+            recent=recent,
+            tokens=(message_tokens(summary_message(summary)) if summary else 0) + history_tokens(recent),
+            full_tokens=history_tokens(history),
+            unsummarized=unsummarized
+        )
+        self._tokens.append(result.tokens)
+        return result
+
+    def schedule_update(
+        self,
+        key: Optional[str],
+        history: Sequence[Dict[str, str]],
+        summarizer: Summarizer,
+        offset: int = 0
+    ) -> None:
+        """
+        予算からあふれる対話を要約に畳み込む（バックグラウンドで実行）
+
+        各ターンの応答後に、次のターンの履歴で呼び出しておくと次のターンまでに要約が更新される
+
+        Args:
+            key: 会話の識別子（Noneの場合は何もしない）
+            history: 対話履歴（最新のターンを含む）
+            summarizer: 要約を生成する関数
+            offset: 履歴の先頭から削ったメッセージ数（Conversation.offset）
+        """
+        if not key:
+            return
+        running = self._tasks.get(key)
+        if running is not None and not running.done():
+            return  # 実行中の更新の完了後、次のターンで残りを畳み込む
+
+        history = list(history)
+        state, covered = self._state(key, history, offset)
+        summary = state.summary if state else ""
+
+        # 更新後の要約は上限まで増えると見込む（予算が小さい場合も半分は直近の対話に残す）
+        budget = self.budget - min(SUMMARY_MAX_TOKENS, self.budget // 2) - message_tokens(summary_message(""))
+        end = recent_start(history, budget)
+        if end <= covered:
+            return
+
+        task = asyncio.create_task(self._update(key, history[:end], summary, covered, offset, summarizer))
+        self._tasks[key] = task
+
+        def release(_: "asyncio.Task") -> None:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+
+        task.add_done_callback(release)
+
+    async def _update(
+        self,
+        key: str,
+        folded: List[Dict[str, str]],
+        previous_summary: str,
+        covered: int,
+        offset: int,
+        summarizer: Summarizer
+    ) -> None:
+        """要約に folded[covered:] を追加して保存（offset は folded[0] の会話の先頭からの位置）"""
+        try:
+            # 利用者のリクエストを優先し、元のリクエストの期限は引き継がない
+            with request_context(timeout=SUMMARY_TIMEOUT_SECONDS, priority=PRIORITY_BATCH):
+                summary = await summarizer(build_summary_messages(previous_summary, folded[covered:]))
+        except Exception as e:
+            self.summary_failures += 1
+            logger.warning("対話履歴の要約に失敗しました: %s", e)
+            return
+
+        summary = summary.strip()
+        # 要約中に forget() された会話には書き戻さない（登録中の更新が自身の場合のみ保存）
+        if not summary or self._tasks.get(key) is not asyncio.current_task():
+            return
+        self.summary_updates += 1
+        self._states[key] = _SummaryState(summary, offset + len(folded), _boundary_hash(folded, len(folded)))
+        self._states.move_to_end(key)
+        while len(self._states) > self.max_conversations:
+            self._states.popitem(last=False)
+
+    def forget(self, key: str) -> None:
+        """会話の要約を破棄（実行中の更新も中止）"""
+        self._states.pop(key, None)
+        task = self._tasks.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """圧縮・要約の統計を取得"""
+        tokens = sorted(self._tokens)
+        return {
+            "budget": self.budget,
+            "conversations": len(self._states),
+            "compactions": self.compactions,
+            "summary_updates": self.summary_updates,
+            "summary_failures": self.summary_failures,
+            "summary_updates_running": sum(1 for task in self._tasks.values() if not task.done()),
+            "unsummarized_messages": self.unsummarized,
+            "history_tokens_avg": round(sum(tokens) / len(tokens), 1) if tokens else 0.0,
+            "history_tokens_max": tokens[-1] if tokens else 0
+        }
+
+
+def conversation_key(*parts: Any) -> Optional[str]:
+    """
+    会話の識別子を生成（クライアントが履歴を送る場合はクライアントの会話IDから）
+
+    Args:
+        parts: 会話を識別する値（Noneのみの場合は識別しない）
+
+    Returns:
+        識別子（SHA-256の16進文字列）
+    """
+    if not any(parts):
+        return None
+    return hashlib.sha256("\x00".join(str(part or "") for part in parts).encode("utf-8")).hexdigest()
+
+
+# シングルトンインスタンス
+_history_compactor: Optional[HistoryCompactor] = None
+
+
+def get_history_compactor() -> HistoryCompactor:
+    """HistoryCompactorのシングルトンインスタンスを取得"""
+    global _history_compactor
+    if _history_compactor is None:
+        _history_compactor = HistoryCompactor()
+    return _history_compactor
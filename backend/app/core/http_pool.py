@@ -0,0 +1,196 @@
+"""
+共有HTTPコネクションプール
+Whisper・GPT・TTS（および他のチャットプロバイダー）の呼び出しで1つの httpx.AsyncClient を共有し、
+keep-alive で接続を使い回す（h2 パッケージがあれば HTTP/2）。
+起動時に接続を事前に確立し、初回リクエストの DNS・TCP・TLS の待ち時間を避ける
+"""
+
+import asyncio
+import functools
+import importlib.util
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, Optional
+
+import httpx
+
+
+logger = logging.getLogger(__name__)
+
+# 接続数の上限・keep-alive で保持する接続数・保持期間（秒）
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "90"))
+
+# 接続確立のタイムアウト（秒、応答のタイムアウトは呼び出し毎に指定）
+HTTP_CONNECT_TIMEOUT = 5.0
+
+# 起動時に確立する接続数（ホスト毎、HTTP/2 では多重化できるため1）
+HTTP_WARM_CONNECTIONS = int(os.getenv("HTTP_WARM_CONNECTIONS", "4"))
+
+
+def _http2_available() -> bool:
+    """HTTP/2 を使えるか（h2 パッケージがあり、HTTP2_ENABLED が無効でない）"""
+    if os.getenv("HTTP2_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return False
+    return importlib.util.find_spec("h2") is not None
+
+
+class HTTPPool:
+    """共有 httpx.AsyncClient と接続の統計"""
+
+    def __init__(
+        self,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_keepalive: int = HTTP_MAX_KEEPALIVE,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+        http2: Optional[bool] = None
+    ):
+        """
+        初期化
+
+        Args:
+            max_connections: 接続数の上限
+            max_keepalive: keep-alive で保持する接続数
+            keepalive_expiry: 未使用の接続を保持する期間（秒）
+            http2: HTTP/2 を使うか（Noneの場合は h2 パッケージの有無で判定）
+        """
+        self.http2 = _http2_available() if http2 is None else http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.client = httpx.AsyncClient(
+            http2=self.http2,
+            limits=self.limits,
+            timeout=httpx.Timeout(60.0, connect=HTTP_CONNECT_TIMEOUT),
+            event_hooks={"request": [self._on_request], "response": [self._on_response]}
+        )
+
+        self.requests = 0
+        self.completed = 0           # 応答を受信したリクエスト数（接続の事前確立を除く）
+        self.completed_on_new_connection = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+        self.last_request_at = 0.0
+
+    async def _on_request(self, request: httpx.Request) -> None:
+        """リクエスト送信前のフック（接続の確立を数えるためトレースを設定）"""
+        self.requests += 1
+        self.last_request_at = time.monotonic()
+        request.extensions["trace"] = functools.partial(self._trace, request)
+
+    async def _on_response(self, response: httpx.Response) -> None:
+        """応答受信時のフック（接続の再利用率の集計、接続の事前確立は除く）"""
+        if response.request.extensions.get("warm_up"):
+            return
+        self.completed += 1
+        if response.request.extensions.get("new_connection"):
+            self.completed_on_new_connection += 1
+
+    async def _trace(self, request: httpx.Request, event_name: str, info: Dict[str, Any]) -> None:
+        """httpcore のトレースイベント"""
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+            request.extensions["new_connection"] = True
+        elif event_name == "connection.start_tls.complete":
+            self.tls_handshakes += 1
+
+    async def warm_up(self, urls: Iterable[str], connections: Optional[int] = None) -> int:
+        """
+        接続を事前に確立（応答のステータスは問わない、認証なしの GET）
+
+        Args:
+            urls: 接続先のURL（APIのベースURL等）
+            connections: ホスト毎に確立する接続数（Noneの場合は HTTP_WARM_CONNECTIONS、HTTP/2 では1）
+
+        Returns:
+            成功したリクエスト数
+        """
+        if connections is None:
+            connections = 1 if self.http2 else HTTP_WARM_CONNECTIONS
+
+        async def touch(url: str) -> bool:
+            request = self.client.build_request(
+                "GET", url, timeout=HTTP_CONNECT_TIMEOUT * 2, extensions={"warm_up": True}
+            )
+            try:
+                await self.client.send(request)
+                return True
+            except httpx.HTTPError as e:
+                logger.warning("接続の事前確立に失敗しました (%s): %s", url, e)
+                return False
+
+        # 同時に送ることで、それぞれ別の接続を確立させる
+        results = await asyncio.gather(*(touch(url) for url in set(urls) for _ in range(connections)))
+        return sum(results)
+
+    async def run_keepalive(self, urls: Iterable[str], interval: float) -> None:
+        """
+        一定時間リクエストがない場合に接続を確立し直す（停止するまで実行）
+
+        keep-alive の保持期間を過ぎて接続が閉じられた後の初回リクエストの遅延を避ける
+
+        Args:
+            urls: 接続先のURL
+            interval: 確認間隔（秒、keep-alive の保持期間より短くする）
+        """
+        urls = list(urls)
+        while True:
+            await asyncio.sleep(interval)
+            if time.monotonic() - self.last_request_at >= interval:
+                await self.warm_up(urls, connections=1)
+
+    def stats(self) -> Dict[str, Any]:
+        """接続数・利用率・接続の再利用率を取得"""
+        connections = []
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        if pool is not None:
+            connections = [connection for connection in pool.connections if not connection.is_closed()]
+
+        active = sum(1 for connection in connections if not connection.is_idle())
+        http2_connections = sum(1 for connection in connections if "HTTP/2" in connection.info())
+        max_connections = self.limits.max_connections
+
+        return {
+            "http2": self.http2,
+            "max_connections": max_connections,
+            "max_keepalive": self.limits.max_keepalive_connections,
+            "connections": len(connections),
+            "active": active,
+            "idle": len(connections) - active,
+            "http2_connections": http2_connections,
+            "utilization": active / max_connections if max_connections else 0.0,
+            "requests": self.requests,
+            "completed": self.completed,
+            "connections_opened": self.connections_opened,
+            "tls_handshakes": self.tls_handshakes,
+            # 応答を受信したリクエストのうち、既存の接続を使い回した割合（失敗・事前確立は含まない）
+            "reuse_rate": 1 - self.completed_on_new_connection / self.completed if self.completed else 0.0
+        }
+
+    async def close(self) -> None:
+        """接続を全て閉じる（終了時に呼び出す）"""
+        await self.client.aclose()
+
+
+# シングルトンインスタンス
+_http_pool: Optional[HTTPPool] = None
+
+
+def get_http_pool() -> HTTPPool:
+    """HTTPPoolのシングルトンインスタンスを取得"""
+    global _http_pool
+    if _http_pool is None:
+        _http_pool = HTTPPool()
+    return _http_pool
+
+
+async def close_http_pool() -> None:
+    """共有 HTTPPool の接続を閉じる（終了時処理、未作成の場合は何もしない）"""
+    global _http_pool
+    if _http_pool is not None:
+        await _http_pool.close()
+        _http_pool = None
@@ -0,0 +1,334 @@
+"""
+Prometheus 形式のメトリクス
+HTTPリクエスト・音声チャットの処理段階・OpenAI API呼び出し・DBクエリの応答時間のヒストグラム、
+トークン数・音声の長さのカウンター、処理中のリクエスト数、例外の種類毎のエラー数を記録し、/metrics で出力する。
+
+記録はイベントループのスレッドからのみ行うため、ロックを取らずに加算する（1回の記録は辞書の参照と加算のみ）
+"""
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+from app.core.scheduler import scheduler_stats
+from app.core.tracing import add_span
+
+
+# 応答時間のバケット（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    """ラベル値のエスケープ"""
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """{name="value",...} 形式のラベル（ラベルなしは空文字）"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    """数値の出力形式（整数は小数点なし）"""
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """メトリクスの共通部分（ラベル値の組毎の値を保持）"""
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, Any] = {}
+        _registry.append(self)
+
+    def labels(self, *values: Any) -> Any:
+        """ラベル値の組の値を取得（初回は作成）"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} のラベルは {self.labelnames} です")
+            child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        """HELP・TYPE と全サンプルの行"""
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+            *self.samples()
+        ]
+
+
+class _Value:
+    """カウンター・ゲージの値"""
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    """単調増加するカウンター"""
+    type_name = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        """ラベルなしのカウンターを加算"""
+        self.labels().inc(amount)
+
+    def samples(self) -> Iterator[str]:
+        for key, child in list(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+
+
+class Gauge(_Metric):
+    """増減する値（set_function を指定した場合は出力時に取得）"""
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Optional[Callable[[], Dict[LabelValues, float]]] = None
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set_function(self, function: Callable[[], Dict[LabelValues, float]]) -> None:
+        """出力時に {ラベル値の組: 値} を返す関数を設定（他モジュールの統計を出力する場合）"""
+        self._function = function
+
+    def samples(self) -> Iterator[str]:
+        if self._function is not None:
+            values = self._function()
+        else:
+            values = {key: child.value for key, child in list(self._children.items())}
+        for key, value in values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class _HistogramValue:
+    """ヒストグラムの値（バケット毎の件数は累積せずに保持し、出力時に累積する）"""
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # 末尾は +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    """値の分布（応答時間等）"""
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        """ラベルなしのヒストグラムに記録"""
+        self.labels().observe(value)
+
+    def samples(self) -> Iterator[str]:
+        for key, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), list(child.counts)):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(child.sum)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+
+# 登録済みのメトリクス（出力順）
+_registry: List[_Metric] = []
+
+
+# HTTPリクエスト（route はパスのテンプレート、該当なしは unmatched）
+HTTP_REQUESTS = Counter("http_requests_total", "HTTPリクエスト数", ("method", "route", "status"))
+HTTP_REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTPリクエストの応答時間（ストリーミングは送信完了まで）", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "処理中のHTTPリクエスト数")
+WEBSOCKET_SESSIONS = Gauge("websocket_sessions_active", "接続中の音声チャットセッション数")
+
+# 音声チャットの処理段階（transcribe / retrieve / chat / tts / first_audio / respond）
+PIPELINE_STAGE_SECONDS = Histogram("pipeline_stage_duration_seconds", "音声チャットの処理段階毎の所要時間", ("pipeline", "stage"))
+
+# OpenAI API（チャットプロバイダーを含む）の呼び出し
+OPENAI_REQUEST_SECONDS = Histogram("openai_request_duration_seconds", "API呼び出しの応答時間（キャッシュ応答を除く）", ("kind", "model"))
+OPENAI_TOKENS = Counter("openai_tokens_total", "トークン数", ("kind", "model", "type"))
+OPENAI_AUDIO_SECONDS = Counter("openai_audio_seconds_total", "音声認識した音声の長さ（秒）", ("model",))
+OPENAI_TTS_CHARACTERS = Counter("openai_tts_characters_total", "音声合成した文字数", ("model",))
+OPENAI_CACHED = Counter("openai_cached_responses_total", "キャッシュから返した応答数", ("kind",))
+OPENAI_RUNNING = Gauge("openai_requests_running", "実行中のAPI呼び出し数", ("kind",))
+OPENAI_QUEUED = Gauge("openai_requests_queued", "同時実行数の上限で待機中のAPI呼び出し数", ("kind",))
+OPENAI_RUNNING.set_function(lambda: {(kind,): stats["running"] for kind, stats in scheduler_stats().items()})
+OPENAI_QUEUED.set_function(lambda: {(kind,): stats["queued"] for kind, stats in scheduler_stats().items()})
+
+# DB
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "DBクエリの所要時間", ("operation",), buckets=DB_BUCKETS)
+
+# 例外（source: http＝未処理の例外、api＝クライアントにエラーを返した例外、pipeline＝処理段階で発生した例外（api と重複）、db）
+ERRORS = Counter("errors_total", "例外の種類毎のエラー数", ("source", "exception"))
+
+
+def record_error(exc: BaseException, source: str) -> None:
+    """
+    エラーを記録
+
+    Args:
+        exc: 例外
+        source: 発生箇所（http / api / pipeline / db）
+    """
+    ERRORS.labels(source, type(exc).__name__).inc()
+
+
+@contextmanager
+def stage_timer(pipeline: str, stage: str) -> Iterator[None]:
+    """
+    処理段階の所要時間を記録（例外は種類毎に数えて再送出、リクエストのトレースにもスパンとして記録）
+
+    Args:
+        pipeline: 処理の種類（voice / voice_stream / speech_stream）
+        stage: 処理段階
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record_error(e, "pipeline")
+        raise
+    finally:
+        ended = time.perf_counter()
+        PIPELINE_STAGE_SECONDS.labels(pipeline, stage).observe(ended - started)
+        add_span(stage, started, ended)
+
+
+def record_api_call(
+    kind: str,
+    model: str,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    audio_seconds: float = 0.0,
+    tts_characters: int = 0,
+    latency_seconds: float = 0.0,
+    cached: bool = False
+) -> None:
+    """
+    API呼び出し1回の応答時間・使用量を記録（app.core.usage から呼び出す）
+
+    Args:
+        kind: 呼び出し種別（whisper / chat / tts / embedding / summary）
+        model: モデル名
+        prompt_tokens: 入力トークン数
+        completion_tokens: 出力トークン数
+        audio_seconds: 音声の長さ（秒）
+        tts_characters: 読み上げ文字数
+        latency_seconds: 応答時間（秒）
+        cached: キャッシュから返したか
+    """
+    if cached:
+        OPENAI_CACHED.labels(kind).inc()
+        return
+    OPENAI_REQUEST_SECONDS.labels(kind, model).observe(latency_seconds)
+    if prompt_tokens:
+        OPENAI_TOKENS.labels(kind, model, "prompt").inc(prompt_tokens)
+    if completion_tokens:
+        OPENAI_TOKENS.labels(kind, model, "completion").inc(completion_tokens)
+    if audio_seconds:
+        OPENAI_AUDIO_SECONDS.labels(model).inc(audio_seconds)
+    if tts_characters:
+        OPENAI_TTS_CHARACTERS.labels(model).inc(tts_characters)
+
+
+def _sql_operation(statement: str) -> str:
+    """SQL文の種類（SELECT / INSERT / UPDATE / DELETE 等）"""
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+
+
+def instrument_engine(engine: Any) -> None:
+    """
+    SQLAlchemyエンジンのクエリ所要時間・エラーを記録（クエリはリクエストのトレースにもスパンとして記録）
+
+    Args:
+        engine: AsyncEngine または Engine
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("query_started")
+        if started:
+            query_started, ended = started.pop(), time.perf_counter()
+            DB_QUERY_SECONDS.labels(_sql_operation(statement)).observe(ended - query_started)
+            add_span("db", query_started, ended)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        if context.connection is not None and context.connection.info.get("query_started"):
+            context.connection.info["query_started"].pop()
+        record_error(context.original_exception, "db")
+
+
+def render_metrics() -> str:
+    """全メトリクスを Prometheus のテキスト形式（0.0.4）で出力"""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Prometheus のテキスト形式の Content-Type
+CONTENT_TYPE = "text/plain; version=0.0.4"
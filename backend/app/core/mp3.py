@@ -0,0 +1,178 @@
+"""
+MP3フレーム処理
+ID3タグ・Xing/Infoヘッダーを除いたフレーム列を取り出し、
+複数の音声をフレーム境界で連結する（再エンコード不要）
+"""
+
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+
+# ビットレート表（kbps）: (MPEG1か, レイヤー) → インデックス順
+_BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+
+# サンプリング周波数表（Hz）: バージョンビット → インデックス順
+_SAMPLE_RATES = {
+    0: [11025, 12000, 8000],   # MPEG2.5
+    2: [22050, 24000, 16000],  # MPEG2
+    3: [44100, 48000, 32000],  # MPEG1
+}
+
+
+def parse_frame_header(header: bytes) -> Optional[Tuple[int, int]]:
+    """
+    MPEGオーディオのフレームヘッダーを解析
+
+    Args:
+        header: フレーム先頭の4バイト
+
+    Returns:
+        (フレーム長, Xing/Infoヘッダーの位置)（フレームヘッダーでない場合はNone）
+    """
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+
+    version = (header[1] >> 3) & 0x03
+    layer = 4 - ((header[1] >> 1) & 0x03)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    mpeg1 = version == 3
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    padding = (header[2] >> 1) & 0x01
+
+    if layer == 1:
+        length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 3 and not mpeg1:
+        length = 72 * bitrate // sample_rate + padding
+    else:
+        length = 144 * bitrate // sample_rate + padding
+
+    # Xing/Info ヘッダーはサイド情報の直後に置かれる
+    mono = (header[3] >> 6) == 3
+    side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    crc = 0 if header[1] & 0x01 else 2
+    return length, 4 + crc + side_info
+
+
+def strip_tags(data: bytes) -> bytes:
+    """
+    先頭のID3v2タグと末尾のID3v1タグを除去
+
+    Args:
+        data: MP3データ
+
+    Returns:
+        タグを除いたデータ
+    """
+    start = 0
+    while data[start:start + 3] == b"ID3" and len(data) >= start + 10:
+        size = 0
+        for byte in data[start + 6:start + 10]:
+            size = (size << 7) | (byte & 0x7F)  # syncsafe整数
+        footer = 10 if data[start + 5] & 0x10 else 0
+        start += 10 + size + footer
+
+    end = len(data)
+    if end - start >= 128 and data[end - 128:end - 125] == b"TAG":
+        end -= 128
+    return data[start:end]
+
+
+def iter_frames(data: bytes) -> Iterator[Tuple[int, int, int]]:
+    """
+    フレームを先頭から順に列挙（不正なバイト列は次の同期ワードまで読み飛ばす）
+
+    Args:
+        data: タグを除いたMP3データ
+
+    Yields:
+        (フレーム開始位置, フレーム長, Xing/Infoヘッダーの位置)
+    """
+    position = 0
+    size = len(data)
+    while position + 4 <= size:
+        parsed = parse_frame_header(data[position:position + 4])
+        if parsed and position + parsed[0] <= size:
+            length, tag_offset = parsed
+            # 偽の同期ワードを避けるため、次のフレームヘッダーも確認
+            following = position + length
+            if following + 4 > size or parse_frame_header(data[following:following + 4]):
+                yield position, length, tag_offset
+                position = following
+                continue
+        position = data.find(b"\xFF", position + 1)
+        if position < 0:
+            return
+
+
+def audio_frames(data: bytes) -> bytes:
+    """
+    連結用にタグ・Xing/Infoヘッダーを除いたフレーム列を取り出す
+
+    Args:
+        data: MP3データ
+
+    Returns:
+        フレーム列（MP3として解析できない場合は元のデータ）
+    """
+    body = strip_tags(data)
+    frames: List[bytes] = []
+    for index, (start, length, tag_offset) in enumerate(iter_frames(body)):
+        frame = body[start:start + length]
+        # 先頭フレームの Xing/Info/VBRI は元の音声全体のフレーム数を持つため連結後は不正確になる
+        if index == 0 and (
+            frame[tag_offset:tag_offset + 4] in (b"Xing", b"Info") or frame[36:40] == b"VBRI"
+        ):
+            continue
+        frames.append(frame)
+
+    return b"".join(frames) if frames else data
+
+
+def join_mp3(segments: Sequence[bytes]) -> bytes:
+    """
+    複数のMP3をフレーム境界で連結
+
+    Args:
+        segments: MP3データのリスト（同じTTSモデルで合成したもの）
+
+    Returns:
+        連結したMP3データ
+    """
+    return b"".join(audio_frames(segment) for segment in segments if segment)
+
+
+def duration_seconds(data: bytes) -> float:
+    """
+    再生時間を計算（フレーム毎のサンプル数 / サンプリング周波数の合計）
+
+    Args:
+        data: MP3データ
+
+    Returns:
+        再生時間（秒、MP3として解析できない場合は0.0）
+    """
+    body = strip_tags(data)
+    total = 0.0
+    for start, _, _ in iter_frames(body):
+        version = (body[start + 1] >> 3) & 0x03
+        layer = 4 - ((body[start + 1] >> 1) & 0x03)
+        sample_rate = _SAMPLE_RATES[version][(body[start + 2] >> 2) & 0x03]
+        if layer == 1:
+            samples = 384
+        elif layer == 3 and version != 3:
+            samples = 576
+        else:
+            samples = 1152
+        total += samples / sample_rate
+    return total
@@ -0,0 +1,183 @@
+"""
+システムプロンプトのコンパイル・キャッシュ
+機種別マニュアルセクションを一度だけ整形し、完成したプロンプトを
+(機種, 作業工程, マニュアルバージョン) をキーとするLRUで保持する
+"""
+
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.core.context import DEFAULT_TOKEN_BUDGET, assemble_manual_context
+from app.core.prompts import (
+    assemble_system_prompt,
+    format_manual_section,
+    render_manual_sections
+)
+from app.data.aircon_manuals import MANUAL_VERSION
+
+
+PromptKey = Tuple[Optional[str], Optional[str], str]
+
+
+class CompiledPrompt(BaseModel):
+    """コンパイル済みシステムプロンプト"""
+    text: str
+    manual_tokens_saved: int = 0
+    # プロンプトに含めたマニュアルセクション
+    sections: List[str] = []
+
+
+class PromptCompiler:
+    """システムプロンプトのコンパイル結果を保持するLRUキャッシュ"""
+
+    def __init__(
+        self,
+        max_size: int = 256,
+        manual_version: str = MANUAL_VERSION,
+        token_budget: int = DEFAULT_TOKEN_BUDGET
+    ):
+        """
+        初期化
+
+        Args:
+            max_size: 保持する完成プロンプトの最大数
+            manual_version: マニュアルデータのバージョン（キャッシュキーに含める）
+            token_budget: マニュアルコンテキストのトークン予算
+        """
+        self.max_size = max_size
+        self.manual_version = manual_version
+        self.token_budget = token_budget
+
+        # 機種別の整形済みマニュアルセクション（機種数が限られるため上限なし）
+        self._sections: Dict[Tuple[str, str], Dict[str, str]] = {}
+        # 完成プロンプト（LRU）
+        self._prompts: "OrderedDict[PromptKey, CompiledPrompt]" = OrderedDict()
+        # 削減したマニュアルトークン数の累計（キャッシュヒット分を含む）
+        self.manual_tokens_saved = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_system_prompt(
+        self,
+        model: Optional[str] = None,
+        current_step: Optional[str] = None,
+        manual_data: Optional[dict] = None
+    ) -> str:
+        """
+        システムプロンプトを取得（キャッシュ済みならそれを返す）
+
+        Args:
+            model: エアコン機種名
+            current_step: 現在の作業工程
+            manual_data: マニュアルデータ（get_manual(model) の結果）
+
+        Returns:
+            システムプロンプト文字列
+        """
+        return self.compile(model, current_step, manual_data).text
+
+    def compile(
+        self,
+        model: Optional[str] = None,
+        current_step: Optional[str] = None,
+        manual_data: Optional[dict] = None
+    ) -> CompiledPrompt:
+        """
+        システムプロンプトをコンパイル（キャッシュ済みならそれを返す）
+
+        マニュアルは作業工程に応じてトークン予算内のセクションのみ含める
+
+        Args:
+            model: エアコン機種名
+            current_step: 現在の作業工程
+            manual_data: マニュアルデータ（get_manual(model) の結果）
+
+        Returns:
+            CompiledPrompt: プロンプトと削減したマニュアルトークン数
+        """
+        # マニュアルが無い機種は機種なしと同じプロンプトになる
+        key: PromptKey = (model if manual_data else None, current_step or None, self.manual_version)
+
+        compiled = self._prompts.get(key)
+        if compiled is not None:
+            self._prompts.move_to_end(key)
+            self.hits += 1
+            self.manual_tokens_saved += compiled.manual_tokens_saved
+            return compiled
+
+        self.misses += 1
+        manual_section = ""
+        tokens_saved = 0
+        sections: List[str] = []
+        if manual_data:
+            context = assemble_manual_context(
+                self._get_manual_sections(model, manual_data),
+                current_step=key[1],
+                token_budget=self.token_budget
+            )
+            manual_section = format_manual_section(manual_data, context.sections)
+            tokens_saved = context.tokens_saved
+            sections = list(context.sections)
+
+        compiled = CompiledPrompt(
+            text=assemble_system_prompt(key[0], key[1], manual_data, manual_section),
+            manual_tokens_saved=tokens_saved,
+            sections=sections
+        )
+        self.manual_tokens_saved += tokens_saved
+
+        self._prompts[key] = compiled
+        if len(self._prompts) > self.max_size:
+            self._prompts.popitem(last=False)
+            self.evictions += 1
+
+        return compiled
+
+    def _get_manual_sections(self, model: Optional[str], manual_data: dict) -> Dict[str, str]:
+        """機種別の整形済みマニュアルセクションを取得（機種毎に一度だけ整形）"""
+        section_key = (model or "", self.manual_version)
+        sections = self._sections.get(section_key)
+        if sections is None:
+            sections = render_manual_sections(manual_data)
+            self._sections[section_key] = sections
+        return sections
+
+    def clear(self) -> None:
+        """キャッシュを破棄（マニュアルデータ更新時）"""
+        self._sections.clear()
+        self._prompts.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """キャッシュ統計を取得"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._prompts),
+            "max_size": self.max_size,
+            "compiled_manuals": len(self._sections),
+            "manual_version": self.manual_version,
+            "token_budget": self.token_budget,
+            "manual_tokens_saved": self.manual_tokens_saved
+        }
+
+
+# シングルトンインスタンス
+_prompt_compiler: Optional[PromptCompiler] = None
+
+
+def get_prompt_compiler() -> PromptCompiler:
+    """PromptCompilerのシングルトンインスタンスを取得"""
+    global _prompt_compiler
+    if _prompt_compiler is None:
+        _prompt_compiler = PromptCompiler(
+            max_size=int(os.getenv("PROMPT_CACHE_SIZE", "256"))
+        )
+    return _prompt_compiler
@@ -4,23 +4,14 @@
 """
 
 import json
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, List, Optional
 
+from app.core.history import HISTORY_TOKEN_BUDGET, history_tokens, select_recent_history, summary_message
+from app.core.safety import get_safety_scanner
 
-def build_system_prompt(model: str = None, current_step: str = None, manual_data: dict = None) -> str:
-    """
-    システムプロンプトを構築
 
-    Args:
-        model: エアコン機種名（例: CS-X400D2）
-        current_step: 現在の作業工程
-        manual_data: マニュアルデータ（app/data/aircon_manuals.pyから取得）
-
-    Returns:
-        システムプロンプト文字列
-    """
-
-    base_prompt = """あなたはエアコン設置工事の現場作業者を支援する専門AIアシスタントです。
+# システムプロンプトの固定部分（専門家ペルソナ・制約・安全ルール）
+BASE_SYSTEM_PROMPT = """あなたはエアコン設置工事の現場作業者を支援する専門AIアシスタントです。
 
 【役割】
 - 作業手順、設置仕様、安全基準、トラブルシューティングに関する質問に明確かつ簡潔に答える
@@ -49,14 +40,98 @@ def build_system_prompt(model: str = None, current_step: str = None, manual_data
 - 重量物運搬 → 2名以上で作業、腰痛注意
 """
 
+# システムプロンプト末尾の回答例
+ANSWER_EXAMPLES_PROMPT = """
+【回答例】
+質問: 「この機種の室内機の取付位置は？」
+回答: 「CS-X400D2の室内機は、天井から50mm以上、左の壁から100mm以上、右の壁から100mm以上離してください。右側には配管スペースが必要です。床からの高さは2.0m推奨です。」
+
+質問: 「真空引きで真空度が上がらない」
+回答: 「真空度が上がらない主な原因は3つです。1. フレアナットの締め付け不足、2. フレア加工不良、3. 3方弁の閉め忘れ。まずフレアナットを規定トルクで増し締めしてください。2分は14〜18ニュートンメートル、3分は34〜42ニュートンメートルです。」
+
+質問: 「室外機を屋根に設置する」
+回答: 「⚠️ 警告: 屋根への室外機設置は高所作業になります。必ずフルハーネス型安全帯を着用してください。また、屋根の荷重強度を確認し、必要に応じて補強が必要です。作業は2名以上で行ってください。」
+
+それでは、作業者からの質問に答えてください。
+"""
+
+
+def build_system_prompt(model: str = None, current_step: str = None, manual_data: dict = None) -> str:
+    """
+    システムプロンプトを構築
+
+    リクエスト毎の呼び出しには app.core.prompt_cache.get_prompt_compiler() 経由の
+    キャッシュ済みプロンプトを使用すること。
+
+    Args:
+        model: エアコン機種名（例: CS-X400D2）
+        current_step: 現在の作業工程
+        manual_data: マニュアルデータ（app/data/aircon_manuals.pyから取得）
+
+    Returns:
+        システムプロンプト文字列
+    """
+    manual_section = format_manual_section(manual_data) if manual_data else ""
+    return assemble_system_prompt(model, current_step, manual_data, manual_section)
+
+
+def assemble_system_prompt(
+    model: Optional[str],
+    current_step: Optional[str],
+    manual_data: Optional[dict],
+    manual_section: str
+) -> str:
+    """
+    整形済みのマニュアルセクションからシステムプロンプトを組み立てる
+
+    Args:
+        model: エアコン機種名
+        current_step: 現在の作業工程
+        manual_data: マニュアルデータ
+        manual_section: format_manual_section() の出力（マニュアルなしの場合は空文字）
+
+    Returns:
+        システムプロンプト文字列
+    """
+    parts = [BASE_SYSTEM_PROMPT]
+
     # 機種情報がある場合は追加
     if model and manual_data:
-        manufacturer = manual_data.get("manufacturer", "不明")
-        series = manual_data.get("series", "")
-        capacity = manual_data.get("capacity", "")
-        refrigerant = manual_data.get("refrigerant", "")
+        parts.append(format_model_info(model, manual_data))
+
+    # 作業工程がある場合は追加
+    if current_step:
+        parts.append(f"""
+【現在の作業工程】
+{current_step}
+""")
+
+    # マニュアルデータがある場合は詳細を追加
+    if manual_section:
+        parts.append(manual_section)
 
-        model_info = f"""
+    parts.append(ANSWER_EXAMPLES_PROMPT)
+
+    return "".join(parts)
+
+
+def format_model_info(model: str, manual_data: dict) -> str:
+    """
+    作業機種の概要をプロンプト用に整形
+
+    Args:
+        model: エアコン機種名
+        manual_data: マニュアル辞書
+
+    Returns:
+        整形された機種情報テキスト
+    """
+    manufacturer = manual_data.get("manufacturer", "不明")
+    series = manual_data.get("series", "")
+    capacity = manual_data.get("capacity", "")
+    refrigerant = manual_data.get("refrigerant", "")
+
+    return f"""
 【現在の作業機種】
 - メーカー: {manufacturer}
 - シリーズ: {series}
@@ -64,236 +139,243 @@ def build_system_prompt(model: str = None, current_step: str = None, manual_data
 - 能力: {capacity}
 - 冷媒: {refrigerant}
 """
-        base_prompt += model_info
 
-    # 作業工程がある場合は追加
-    if current_step:
-        step_info = f"""
-【現在の作業工程】
-{current_step}
-"""
-        base_prompt += step_info
 
-    # マニュアルデータがある場合は詳細を追加
-    if manual_data:
+def format_manual_section(manual_data: dict, sections: Optional[Dict[str, str]] = None) -> str:
+    """
+    マニュアル詳細をシステムプロンプトの1セクションとして整形
+
+    Args:
+        manual_data: マニュアル辞書
+        sections: render_manual_sections() の出力から選択したセクション（省略時は全セクション）
+
+    Returns:
+        【機種別マニュアル情報】セクション文字列
+    """
+    if sections is None:
         manual_details = format_manual_for_prompt(manual_data)
-        base_prompt += f"""
+    else:
+        manual_details = "\n\n".join(sections.values())
+    return f"""
 【機種別マニュアル情報】
 {manual_details}
 """
 
-    base_prompt += """
-【回答例】
-質問: 「この機種の室内機の取付位置は？」
-回答: 「CS-X400D2の室内機は、天井から50mm以上、左の壁から100mm以上、右の壁から100mm以上離してください。右側には配管スペースが必要です。床からの高さは2.0m推奨です。」
 
-質問: 「真空引きで真空度が上がらない」
-回答: 「真空度が上がらない主な原因は3つです。1. フレアナットの締め付け不足、2. フレア加工不良、3. 3方弁の閉め忘れ。まずフレアナットを規定トルクで増し締めしてください。2分は14〜18ニュートンメートル、3分は34〜42ニュートンメートルです。」
-
-質問: 「室外機を屋根に設置する」
-回答: 「⚠️ 警告: 屋根への室外機設置は高所作業になります。必ずフルハーネス型安全帯を着用してください。また、屋根の荷重強度を確認し、必要に応じて補強が必要です。作業は2名以上で行ってください。」
+def format_manual_for_prompt(manual_data: dict) -> str:
+    """
+    マニュアルデータをプロンプト用に整形
 
-それでは、作業者からの質問に答えてください。
-"""
+    Args:
+        manual_data: マニュアル辞書
 
-    return base_prompt
+    Returns:
+        整形されたマニュアルテキスト
+    """
+    return "\n\n".join(render_manual_sections(manual_data).values())
 
 
-def format_manual_for_prompt(manual_data: dict) -> str:
+def render_manual_sections(manual_data: dict) -> Dict[str, str]:
     """
-    マニュアルデータをプロンプト用に整形
+    マニュアルデータをセクション毎に整形
 
     Args:
         manual_data: マニュアル辞書
 
     Returns:
-        整形されたマニュアルテキスト
+        {セクションキー: 整形テキスト}（MANUAL_SECTION_FORMATTERS の順序）
     """
-    sections = []
-
-    # 室内機仕様
-    if "indoor_unit" in manual_data:
-        indoor = manual_data["indoor_unit"]
-        text = "■ 室内機仕様\n"
-
-        if "dimensions" in indoor:
-            dims = indoor["dimensions"]
-            text += f"寸法: 幅{dims.get('width')} × 高さ{dims.get('height')} × 奥行{dims.get('depth')}\n"
-            text += f"重量: {dims.get('weight')}\n"
-
-        if "installation" in indoor:
-            inst = indoor["installation"]
-            text += "\n設置基準:\n"
-            for key, value in inst.items():
-                if isinstance(value, str):
-                    text += f"- {key}: {value}\n"
+    return {
+        key: formatter(manual_data[key])
+        for key, formatter in MANUAL_SECTION_FORMATTERS.items()
+        if key in manual_data
+    }
 
-        if "mounting_plate" in indoor:
-            plate = indoor["mounting_plate"]
-            text += "\n据付板:\n"
-            for key, value in plate.items():
-                if isinstance(value, str):
-                    text += f"- {key}: {value}\n"
-
-        sections.append(text)
-
-    # 室外機仕様
-    if "outdoor_unit" in manual_data:
-        outdoor = manual_data["outdoor_unit"]
-        text = "■ 室外機仕様\n"
-
-        if "dimensions" in outdoor:
-            dims = outdoor["dimensions"]
-            text += f"寸法: 幅{dims.get('width')} × 高さ{dims.get('height')} × 奥行{dims.get('depth')}\n"
-            text += f"重量: {dims.get('weight')}\n"
-
-        if "installation" in outdoor:
-            inst = outdoor["installation"]
-            if "clearances" in inst:
-                text += "\n離隔距離:\n"
-                for direction, distance in inst["clearances"].items():
-                    text += f"- {direction}: {distance}\n"
-
-            if "foundation" in inst:
-                found = inst["foundation"]
-                text += "\n基礎:\n"
-                for key, value in found.items():
-                    if isinstance(value, str):
-                        text += f"- {key}: {value}\n"
-
-        sections.append(text)
-
-    # 配管仕様
-    if "piping" in manual_data:
-        piping = manual_data["piping"]
-        text = "■ 配管仕様\n"
-
-        if "refrigerant_pipe" in piping:
-            ref = piping["refrigerant_pipe"]
-            text += "冷媒配管:\n"
-            text += f"- 液管サイズ: {ref.get('size_liquid')}\n"
-            text += f"- ガス管サイズ: {ref.get('size_gas')}\n"
-            text += f"- 最大配管長: {ref.get('max_length')}\n"
-
-            if "flare_nut_torque" in ref:
-                text += "- フレアナット締付トルク:\n"
-                for size, torque in ref["flare_nut_torque"].items():
-                    text += f"  - {size}: {torque}\n"
-
-            if "flare_processing" in ref:
-                text += "\nフレア加工手順:\n"
-                flare = ref["flare_processing"]
-                for key, value in flare.items():
-                    if isinstance(value, str):
-                        text += f"- {key}: {value}\n"
-                    elif key == "flare_dimensions" and isinstance(value, dict):
-                        text += "- フレア寸法:\n"
-                        for size, dim in value.items():
-                            text += f"  - {size}: {dim}\n"
-
-        if "drain_pipe" in piping:
-            drain = piping["drain_pipe"]
-            text += "\nドレン配管:\n"
-            for key, value in drain.items():
-                if isinstance(value, str):
-                    text += f"- {key}: {value}\n"
 
-        if "electrical_wiring" in piping:
-            elec = piping["electrical_wiring"]
-            text += "\n電気配線:\n"
-            for key, value in elec.items():
-                if isinstance(value, str):
-                    text += f"- {key}: {value}\n"
-
-        sections.append(text)
-
-    # 真空引き手順
-    if "vacuum_pump" in manual_data:
-        vacuum = manual_data["vacuum_pump"]
-        text = "■ 真空引き手順\n"
-        text += f"目標真空度: {vacuum.get('target_vacuum')}\n"
-        text += f"保持時間: {vacuum.get('hold_time')}\n"
-
-        if "procedure" in vacuum:
-            text += "\n手順:\n"
-            for step_num, step_desc in sorted(vacuum["procedure"].items()):
-                text += f"{step_num}. {step_desc}\n"
-
-        sections.append(text)
-
-    # 試運転手順
-    if "test_run" in manual_data:
-        test = manual_data["test_run"]
-        text = "■ 試運転手順\n"
-
-        if "preparation" in test:
-            text += "準備:\n"
-            for key, value in test["preparation"].items():
-                text += f"- {key}: {value}\n"
-
-        if "cooling_test" in test:
-            cool = test["cooling_test"]
-            text += "\n冷房試運転:\n"
-            for key, value in cool.items():
-                if isinstance(value, str):
-                    text += f"- {key}: {value}\n"
+def _format_items(lines: List[str], items: Dict[str, Any]) -> None:
+    """文字列値の項目を「- キー: 値」形式で追加"""
+    for key, value in items.items():
+        if isinstance(value, str):
+            lines.append(f"- {key}: {value}\n")
+
+
+def _format_dimensions(lines: List[str], dims: Dict[str, str]) -> None:
+    """寸法・重量を追加"""
+    lines.append(f"寸法: 幅{dims.get('width')} × 高さ{dims.get('height')} × 奥行{dims.get('depth')}\n")
+    lines.append(f"重量: {dims.get('weight')}\n")
+
+
+def _format_indoor_unit(indoor: dict) -> str:
+    """室内機仕様"""
+    lines = ["■ 室内機仕様\n"]
+
+    if "dimensions" in indoor:
+        _format_dimensions(lines, indoor["dimensions"])
+
+    if "installation" in indoor:
+        lines.append("\n設置基準:\n")
+        _format_items(lines, indoor["installation"])
 
-        if "heating_test" in test:
-            heat = test["heating_test"]
-            text += "\n暖房試運転:\n"
-            for key, value in heat.items():
+    if "mounting_plate" in indoor:
+        lines.append("\n据付板:\n")
+        _format_items(lines, indoor["mounting_plate"])
+
+    return "".join(lines)
+
+
+def _format_outdoor_unit(outdoor: dict) -> str:
+    """室外機仕様"""
+    lines = ["■ 室外機仕様\n"]
+
+    if "dimensions" in outdoor:
+        _format_dimensions(lines, outdoor["dimensions"])
+
+    if "installation" in outdoor:
+        inst = outdoor["installation"]
+        if "clearances" in inst:
+            lines.append("\n離隔距離:\n")
+            for direction, distance in inst["clearances"].items():
+                lines.append(f"- {direction}: {distance}\n")
+
+        if "foundation" in inst:
+            lines.append("\n基礎:\n")
+            _format_items(lines, inst["foundation"])
+
+    return "".join(lines)
+
+
+def _format_piping(piping: dict) -> str:
+    """配管仕様"""
+    lines = ["■ 配管仕様\n"]
+
+    if "refrigerant_pipe" in piping:
+        ref = piping["refrigerant_pipe"]
+        lines.append("冷媒配管:\n")
+        lines.append(f"- 液管サイズ: {ref.get('size_liquid')}\n")
+        lines.append(f"- ガス管サイズ: {ref.get('size_gas')}\n")
+        lines.append(f"- 最大配管長: {ref.get('max_length')}\n")
+
+        if "flare_nut_torque" in ref:
+            lines.append("- フレアナット締付トルク:\n")
+            for size, torque in ref["flare_nut_torque"].items():
+                lines.append(f"  - {size}: {torque}\n")
+
+        if "flare_processing" in ref:
+            lines.append("\nフレア加工手順:\n")
+            for key, value in ref["flare_processing"].items():
                 if isinstance(value, str):
-                    text += f"- {key}: {value}\n"
+                    lines.append(f"- {key}: {value}\n")
+                elif key == "flare_dimensions" and isinstance(value, dict):
+                    lines.append("- フレア寸法:\n")
+                    for size, dim in value.items():
+                        lines.append(f"  - {size}: {dim}\n")
+
+    if "drain_pipe" in piping:
+        lines.append("\nドレン配管:\n")
+        _format_items(lines, piping["drain_pipe"])
+
+    if "electrical_wiring" in piping:
+        lines.append("\n電気配線:\n")
+        _format_items(lines, piping["electrical_wiring"])
+
+    return "".join(lines)
+
+
+def _format_vacuum_pump(vacuum: dict) -> str:
+    """真空引き手順"""
+    lines = [
+        "■ 真空引き手順\n",
+        f"目標真空度: {vacuum.get('target_vacuum')}\n",
+        f"保持時間: {vacuum.get('hold_time')}\n"
+    ]
+
+    if "procedure" in vacuum:
+        lines.append("\n手順:\n")
+        for step_num, step_desc in sorted(vacuum["procedure"].items()):
+            lines.append(f"{step_num}. {step_desc}\n")
 
-        sections.append(text)
+    return "".join(lines)
 
-    # 安全警告
-    if "safety_warnings" in manual_data:
-        warnings = manual_data["safety_warnings"]
-        text = "■ ⚠️ 安全警告\n"
 
-        for category, items in warnings.items():
-            text += f"\n【{category}】\n"
-            for item in items:
-                text += f"- {item}\n"
+def _format_test_run(test: dict) -> str:
+    """試運転手順"""
+    lines = ["■ 試運転手順\n"]
 
-        sections.append(text)
+    if "preparation" in test:
+        lines.append("準備:\n")
+        for key, value in test["preparation"].items():
+            lines.append(f"- {key}: {value}\n")
 
-    # トラブルシューティング
-    if "troubleshooting" in manual_data:
-        troubleshooting = manual_data["troubleshooting"]
-        text = "■ トラブルシューティング\n"
+    if "cooling_test" in test:
+        lines.append("\n冷房試運転:\n")
+        _format_items(lines, test["cooling_test"])
 
-        for symptom, details in troubleshooting.items():
-            text += f"\n【{symptom}】\n"
+    if "heating_test" in test:
+        lines.append("\n暖房試運転:\n")
+        _format_items(lines, test["heating_test"])
 
-            if "原因" in details:
-                text += "原因:\n"
-                for cause in details["原因"]:
-                    text += f"- {cause}\n"
+    return "".join(lines)
 
-            if "対処" in details:
-                text += "対処:\n"
-                for action in details["対処"]:
-                    text += f"- {action}\n"
 
-        sections.append(text)
+def _format_safety_warnings(warnings: dict) -> str:
+    """安全警告"""
+    lines = ["■ ⚠️ 安全警告\n"]
 
-    # 特記事項
-    if "special_notes" in manual_data:
-        notes = manual_data["special_notes"]
-        text = "■ 特記事項\n"
-        for key, value in notes.items():
-            text += f"- {key}: {value}\n"
-        sections.append(text)
+    for category, items in warnings.items():
+        lines.append(f"\n【{category}】\n")
+        for item in items:
+            lines.append(f"- {item}\n")
 
-    return "\n\n".join(sections)
+    return "".join(lines)
+
+
+def _format_troubleshooting(troubleshooting: dict) -> str:
+    """トラブルシューティング"""
+    lines = ["■ トラブルシューティング\n"]
+
+    for symptom, details in troubleshooting.items():
+        lines.append(f"\n【{symptom}】\n")
+
+        if "原因" in details:
+            lines.append("原因:\n")
+            for cause in details["原因"]:
+                lines.append(f"- {cause}\n")
+
+        if "対処" in details:
+            lines.append("対処:\n")
+            for action in details["対処"]:
+                lines.append(f"- {action}\n")
+
+    return "".join(lines)
+
+
+def _format_special_notes(notes: dict) -> str:
+    """特記事項"""
+    lines = ["■ 特記事項\n"]
+    for key, value in notes.items():
+        lines.append(f"- {key}: {value}\n")
+    return "".join(lines)
+
+
+# マニュアルのセクションキーと整形関数（プロンプト上の掲載順）
+MANUAL_SECTION_FORMATTERS: Dict[str, Callable[[dict], str]] = {
+    "indoor_unit": _format_indoor_unit,
+    "outdoor_unit": _format_outdoor_unit,
+    "piping": _format_piping,
+    "vacuum_pump": _format_vacuum_pump,
+    "test_run": _format_test_run,
+    "safety_warnings": _format_safety_warnings,
+    "troubleshooting": _format_troubleshooting,
+    "special_notes": _format_special_notes,
+}
 
 
 def build_chat_prompt(
     system_prompt: str,
     chat_history: List[Dict[str, str]],
-    user_message: str
+    user_message: str,
+    reference_context: Optional[str] = None,
+    history_summary: Optional[str] = None
 ) -> List[Dict[str, str]]:
     """
     OpenAI Chat Completion用のメッセージリストを構築
@@ -302,6 +384,8 @@ def build_chat_prompt(
         system_prompt: システムプロンプト
         chat_history: 対話履歴 [{"role": "user", "content": "..."}, {"role": "assistant", "content": "..."}]
         user_message: ユーザーの新しいメッセージ
+        reference_context: 質問に関連するマニュアル検索結果（app.core.retrieval）
+        history_summary: 古い対話の要約（app.core.history）
 
     Returns:
         OpenAI APIに渡すメッセージリスト
@@ -310,9 +394,17 @@ def build_chat_prompt(
         {"role": "system", "content": system_prompt}
     ]
 
-    # 対話履歴を追加（最新10件まで）
+    # 古い対話の要約と、トークン予算内の直近の対話を追加
+    budget = HISTORY_TOKEN_BUDGET
+    if history_summary:
+        messages.append(summary_message(history_summary))
+        budget -= history_tokens(messages[-1:])
     if chat_history:
-        messages.extend(chat_history[-10:])
+        messages.extend(select_recent_history(chat_history, budget))
+
+    # 検索結果は質問の直前に置く（システムプロンプト・履歴の先頭部分を共通に保つ）
+    if reference_context:
+        messages.append({"role": "system", "content": reference_context})
 
     # 新しいユーザーメッセージを追加
     messages.append({"role": "user", "content": user_message})
@@ -320,33 +412,26 @@ def build_chat_prompt(
     return messages
 
 
+# 安全カテゴリ毎のリマインダー（固定文のため音声は起動時に事前合成する）
+SAFETY_REMINDERS = {
+    "高所": "\n\n⚠️ 安全リマインダー: 高所作業時は必ず安全帯を着用してください。",
+    "電気": "\n\n⚠️ 安全リマインダー: 電気工事前に必ずブレーカーをOFFにして電圧確認してください。",
+    "冷媒": "\n\n⚠️ 安全リマインダー: R32冷媒は微燃性です。火気厳禁で作業してください。",
+    "重量物": "\n\n⚠️ 安全リマインダー: 室外機は2名以上で運搬し、腰を落として持ち上げてください。"
+}
+
+
 def extract_safety_keywords(text: str) -> List[str]:
     """
-    安全に関するキーワードを抽出
+    安全に関するキーワードを抽出（コンパイル済みの正規表現で1回走査、app.core.safety）
 
     Args:
-        text: ユーザーの質問文
+        text: ユーザーの質問文・AIの回答
 
     Returns:
-        検出されたキーワードリスト
+        検出された安全カテゴリのリスト（高所・電気・冷媒・重量物の順）
     """
-    safety_keywords = {
-        "高所": ["屋根", "はしご", "脚立", "高所", "2階", "ベランダ"],
-        "電気": ["電気", "配線", "ブレーカー", "感電", "電源", "コンセント"],
-        "冷媒": ["冷媒", "ガス", "R32", "フロン", "真空引き"],
-        "重量物": ["室外機", "持ち上げ", "運搬", "重い"]
-    }
-
-    detected = []
-    text_lower = text.lower()
-
-    for category, keywords in safety_keywords.items():
-        for keyword in keywords:
-            if keyword in text_lower:
-                detected.append(category)
-                break
-
-    return detected
+    return get_safety_scanner().categories(text)
 
 
 def add_safety_reminder(response: str, safety_keywords: List[str]) -> str:
@@ -360,15 +445,8 @@ def add_safety_reminder(response: str, safety_keywords: List[str]) -> str:
     Returns:
         安全リマインダーを追加した回答
     """
-    reminders = {
-        "高所": "\n\n⚠️ 安全リマインダー: 高所作業時は必ず安全帯を着用してください。",
-        "電気": "\n\n⚠️ 安全リマインダー: 電気工事前に必ずブレーカーをOFFにして電圧確認してください。",
-        "冷媒": "\n\n⚠️ 安全リマインダー: R32冷媒は微燃性です。火気厳禁で作業してください。",
-        "重量物": "\n\n⚠️ 安全リマインダー: 室外機は2名以上で運搬し、腰を落として持ち上げてください。"
-    }
-
     for keyword in safety_keywords:
-        if keyword in reminders and reminders[keyword] not in response:
-            response += reminders[keyword]
+        if keyword in SAFETY_REMINDERS and SAFETY_REMINDERS[keyword] not in response:
+            response += SAFETY_REMINDERS[keyword]
 
     return response
@@ -0,0 +1,314 @@
+"""
+マニュアル検索（文字n-gram転置インデックス + BM25）
+日本語形態素解析器を使わず、文字バイグラム・トライグラムでマニュアル・トラブル事例・
+法規制・工具リストを検索し、質問に関連するチャンクのみをプロンプトに含める
+"""
+
+import heapq
+import logging
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+
+from app.core.prompts import render_manual_sections
+from app.data.aircon_manuals import (
+    AIRCON_MANUALS,
+    COMMON_TROUBLESHOOTING,
+    REQUIRED_TOOLS,
+    SAFETY_REGULATIONS
+)
+
+logger = logging.getLogger(__name__)
+
+# プロンプトに含める検索結果の件数（0で無効）
+DEFAULT_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+
+# 検索方式（bm25 / dense / hybrid）
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+
+# 作業中の機種のチャンクに掛けるスコア倍率
+CURRENT_MODEL_BOOST = 1.2
+
+# Reciprocal Rank Fusion の順位平滑化定数
+RRF_K = 60
+
+# n-gram化の単位（記号・空白で区切った文字列）
+_TERM_RUN = re.compile(r"\w+")
+
+
+class Chunk(BaseModel):
+    """検索対象のチャンク"""
+    id: int
+    source: str  # manual | troubleshooting | regulation | tools
+    model: Optional[str] = None
+    section: Optional[str] = None
+    text: str
+
+
+class SearchResult(BaseModel):
+    """検索結果"""
+    chunk: Chunk
+    score: float
+
+
+def normalize_text(text: str) -> str:
+    """全角・半角の統一（NFKC）と小文字化"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    文字バイグラム・トライグラムに分割
+
+    Args:
+        text: 対象テキスト
+
+    Returns:
+        n-gram のリスト（1文字だけの語はそのまま）
+    """
+    terms = []
+    for run in _TERM_RUN.findall(normalize_text(text)):
+        if len(run) == 1:
+            terms.append(run)
+            continue
+        terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+        terms.extend(run[i:i + 3] for i in range(len(run) - 2))
+    return terms
+
+
+def build_chunks() -> List[Chunk]:
+    """
+    マニュアルデータを検索用チャンクに分割
+
+    Returns:
+        チャンクのリスト
+    """
+    chunks: List[Chunk] = []
+
+    def add(source: str, text: str, model: Optional[str] = None, section: Optional[str] = None):
+        chunks.append(Chunk(id=len(chunks), source=source, model=model, section=section, text=text))
+
+    # 機種別マニュアル（セクション内の小見出し単位）
+    for model, manual in AIRCON_MANUALS.items():
+        label = f"{model}（{manual.get('manufacturer', '')} {manual.get('series', '')}）"
+        for section, text in render_manual_sections(manual).items():
+            heading, _, body = text.partition("\n")
+            for block in body.split("\n\n"):
+                block = block.strip()
+                if block:
+                    add("manual", f"{label} {heading}\n{block}", model=model, section=section)
+
+    # 共通トラブルシューティング（エラーコード）
+    for title, codes in COMMON_TROUBLESHOOTING.items():
+        for code, description in codes.items():
+            add("troubleshooting", f"{title} {code}: {description}", section=title)
+
+    # 法規制
+    for law, items in SAFETY_REGULATIONS.items():
+        lines = [f"{law}"] + [f"- {key}: {value}" for key, value in items.items()]
+        add("regulation", "\n".join(lines), section=law)
+
+    # 工具リスト
+    for category, tools in REQUIRED_TOOLS.items():
+        lines = [f"必要工具（{category}）"] + [f"- {tool}" for tool in tools]
+        add("tools", "\n".join(lines), section=category)
+
+    return chunks
+
+
+class BM25Index:
+    """文字n-gramの転置インデックスによるBM25検索"""
+
+    def __init__(self, chunks: Sequence[Chunk], k1: float = 1.2, b: float = 0.75):
+        """
+        インデックスを構築
+
+        Args:
+            chunks: 検索対象のチャンク
+            k1: 語頻度の飽和パラメータ
+            b: 文書長の正規化パラメータ
+        """
+        self.chunks = list(chunks)
+        self.k1 = k1
+        self.b = b
+
+        # 語 → [(チャンク番号, 語頻度の重み)]（BM25の文書側の項を事前計算）
+        self._postings: Dict[str, List[Tuple[int, float]]] = {}
+        self._idf: Dict[str, float] = {}
+
+        lengths = []
+        term_counts = []
+        for chunk in self.chunks:
+            counts = Counter(tokenize(chunk.text))
+            term_counts.append(counts)
+            lengths.append(sum(counts.values()))
+
+        doc_count = len(self.chunks)
+        avg_length = (sum(lengths) / doc_count) if doc_count else 0.0
+
+        for doc_id, counts in enumerate(term_counts):
+            norm = k1 * (1 - b + b * lengths[doc_id] / avg_length) if avg_length else k1
+            for term, tf in counts.items():
+                weight = tf * (k1 + 1) / (tf + norm)
+                self._postings.setdefault(term, []).append((doc_id, weight))
+
+        for term, postings in self._postings.items():
+            df = len(postings)
+            self._idf[term] = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+
+    def search(
+        self,
+        query: str,
+        top_k: int = DEFAULT_TOP_K,
+        model: Optional[str] = None,
+        exclude: Iterable[Tuple[Optional[str], Optional[str]]] = ()
+    ) -> List[SearchResult]:
+        """
+        質問に関連するチャンクを検索
+
+        Args:
+            query: 質問文
+            top_k: 返す件数
+            model: 作業中の機種（該当チャンクのスコアを優遇）
+            exclude: 除外する (機種, セクション) の組（プロンプトに含め済みのセクション等）
+
+        Returns:
+            スコア順の検索結果
+        """
+        if top_k <= 0:
+            return []
+
+        scores: Dict[int, float] = {}
+        for term, query_tf in Counter(tokenize(query)).items():
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf[term] * query_tf
+            for doc_id, weight in postings:
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * weight
+
+        excluded = set(exclude)
+        if model or excluded:
+            for doc_id in list(scores):
+                chunk = self.chunks[doc_id]
+                if (chunk.model, chunk.section) in excluded:
+                    del scores[doc_id]
+                elif model and chunk.model == model:
+                    scores[doc_id] *= CURRENT_MODEL_BOOST
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [SearchResult(chunk=self.chunks[doc_id], score=score) for doc_id, score in best]
+
+
+def format_search_results(results: List[SearchResult]) -> Optional[str]:
+    """
+    検索結果をプロンプト用に整形
+
+    Args:
+        results: 検索結果
+
+    Returns:
+        【参考情報】セクション文字列（結果がない場合はNone）
+    """
+    if not results:
+        return None
+
+    blocks = "\n\n".join(result.chunk.text for result in results)
+    return f"""【参考情報（マニュアル検索結果）】
+以下は質問に関連するマニュアル・規定の抜粋です。回答の根拠として使用してください。
+
+{blocks}
+"""
+
+
+# シングルトンインスタンス
+_bm25_index: Optional[BM25Index] = None
+
+
+def get_bm25_index() -> BM25Index:
+    """BM25Indexのシングルトンインスタンスを取得（初回呼び出し時に構築）"""
+    global _bm25_index
+    if _bm25_index is None:
+        _bm25_index = BM25Index(build_chunks())
+    return _bm25_index
+
+
+async def build_reference_context(
+    query: str,
+    model: Optional[str] = None,
+    included_sections: Iterable[str] = (),
+    top_k: int = DEFAULT_TOP_K
+) -> Optional[str]:
+    """
+    質問に関連するマニュアル抜粋をプロンプト用に取得
+
+    RETRIEVAL_MODE が hybrid の場合、BM25と密ベクトル検索の結果を Reciprocal Rank Fusion で統合する
+    （密ベクトルインデックス未構築の場合はBM25のみ）
+
+    Args:
+        query: 質問文
+        model: 作業中の機種
+        included_sections: システムプロンプトに含め済みの機種別セクション（重複を避ける）
+        top_k: 含める件数
+
+    Returns:
+        【参考情報】セクション文字列（該当なしの場合はNone）
+    """
+    if top_k <= 0:
+        return None
+
+    from app.core.vector_index import get_dense_index
+
+    exclude = {(model, section) for section in included_sections} if model else set()
+    dense_index = get_dense_index() if RETRIEVAL_MODE in ("dense", "hybrid") else None
+
+    rankings: List[List[SearchResult]] = []
+    if RETRIEVAL_MODE != "dense" or dense_index is None:
+        rankings.append(get_bm25_index().search(query, top_k=top_k, model=model, exclude=exclude))
+
+    if dense_index is not None:
+        # 除外分を見込んで多めに取得
+        try:
+            (hits,) = await dense_index.search_batch([query], top_k + len(exclude))
+        except Exception as e:
+            # 埋め込みAPIの失敗等ではBM25の結果のみで回答する
+            logger.warning("密ベクトル検索に失敗しました（BM25のみで検索）: %s", e)
+            if not rankings:
+                rankings.append(get_bm25_index().search(query, top_k=top_k, model=model, exclude=exclude))
+        else:
+            dense_results = []
+            for doc_id, score in hits:
+                chunk = dense_index.chunks[doc_id]
+                if (chunk.model, chunk.section) not in exclude:
+                    dense_results.append(SearchResult(chunk=chunk, score=score))
+            rankings.append(dense_results[:top_k])
+
+    return format_search_results(fuse_rankings(rankings, top_k))
+
+
+def fuse_rankings(rankings: List[List[SearchResult]], top_k: int) -> List[SearchResult]:
+    """
+    複数の検索結果を Reciprocal Rank Fusion で統合
+
+    Args:
+        rankings: 検索方式毎のスコア順の結果
+        top_k: 返す件数
+
+    Returns:
+        統合スコア順の検索結果
+    """
+    if len(rankings) == 1:
+        return rankings[0][:top_k]
+
+    fused: Dict[int, SearchResult] = {}
+    for results in rankings:
+        for rank, result in enumerate(results):
+            entry = fused.setdefault(result.chunk.id, SearchResult(chunk=result.chunk, score=0.0))
+            entry.score += 1.0 / (RRF_K + rank + 1)
+
+    return heapq.nlargest(top_k, fused.values(), key=lambda result: result.score)
@@ -0,0 +1,428 @@
+"""
+安全キーワードの検出
+安全カテゴリ（高所・電気・冷媒・重量物）毎のキーワードを長い順に並べた1つの正規表現を起動時に1回だけコンパイルし、
+作業者の質問・AIの回答を1回の走査で照合して、カテゴリと一致位置を返す。
+ストリーミング応答は届いた断片毎に照合を続ける（断片の境目をまたぐキーワードも検出する）。
+
+キーワードは全角・半角、大文字・小文字、カタカナ・ひらがなの違いを吸収して照合する。
+語彙は固定の辞書に加え、マニュアルの安全上の注意（safety_warnings）と安全規定（SAFETY_REGULATIONS）から抽出する
+"""
+
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.data.aircon_manuals import AIRCON_MANUALS, SAFETY_REGULATIONS
+
+
+# 安全カテゴリ毎のキーワード（カテゴリの順序は安全リマインダーを追加する順序）
+SAFETY_KEYWORDS: Dict[str, List[str]] = {
+    "高所": ["屋根", "はしご", "脚立", "高所", "2階", "ベランダ"],
+    "電気": ["電気", "配線", "ブレーカー", "感電", "電源", "コンセント"],
+    "冷媒": ["冷媒", "ガス", "R32", "フロン", "真空引き"],
+    "重量物": ["室外機", "持ち上げ", "運搬", "重い"]
+}
+
+# マニュアルの safety_warnings の項目名と安全カテゴリの対応
+MANUAL_SECTION_CATEGORIES = {
+    "height": "高所",
+    "electrical": "電気",
+    "refrigerant": "冷媒",
+    "weight": "重量物"
+}
+
+# 安全規定と安全カテゴリの対応（法令単位、または法令内の項目単位）
+REGULATION_CATEGORIES: Dict[str, object] = {
+    "電気工事士法": "電気",
+    "フロン排出抑制法": "冷媒",
+    "労働安全衛生法": {"高所作業": "高所", "足場": "高所"}
+}
+
+# 抽出した語から除く一般的な語（どの作業でも使うため、安全カテゴリの判定に使えない）
+GENERIC_TERMS = {
+    "作業", "実施", "確認", "安全確認", "動作確認", "必須", "設置", "防止", "十分", "確実", "注意", "専用",
+    "定期", "定期交換", "定期点検", "点検", "交換", "接続", "対象", "対象外", "義務", "推奨", "管理",
+    "以上", "以下", "資格", "有資格者", "範囲", "作業範囲", "罰則", "罰金", "懲役", "万円", "新設", "増設", "廃棄",
+    "適正管理", "エアコン", "ロック", "オイル", "家庭用", "業務用"
+}
+
+# 抽出した語のうち、通常の据付手順の質問にも頻出するため安全リマインダーの対象にしない語
+# （例: 「フレア加工の手順」「真空ポンプの使い方」に冷媒のリマインダーを付けない）
+ROUTINE_TERMS = {"室内機取付", "フレア", "換気", "真空", "電圧", "ポンプオイル", "圧力計"}
+
+# 抽出した語の末尾から除く語（「漏洩時」→「漏洩」等）
+TRAILING_TERMS = ("必須", "実施", "着用", "義務", "防止", "予防", "推奨", "以上", "以下", "時", "前", "後", "部")
+
+# 抽出する語（漢字の連続・3文字以上のカタカナの連続・英字で始まる型番等）
+_TERM_PATTERN = re.compile(r"[一-鿿々]{2,}|[ァ-ヺー]{3,}|[A-Za-z][A-Za-z0-9]*[0-9][A-Za-z0-9]*")
+
+# カタカナ→ひらがな・ひらがな→カタカナ（キーワードを両方の表記で登録し、照合する文字列は変換しない）
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(0x30A1, 0x30F7)}
+_HIRAGANA_TO_KATAKANA = {code: code + 0x60 for code in range(0x3041, 0x3097)}
+
+# 半角カタカナと、直後に続けて1文字に正規化する濁点・半濁点
+_HALFWIDTH_KANA = re.compile(r"[ｦ-ﾝ]")
+_HALFWIDTH_SOUND_MARKS = "ﾞﾟ"
+
+
+def normalize_keyword(text: str) -> str:
+    """キーワードの正規化（全角・半角、大文字・小文字、カタカナ・ひらがなの統一、重複の判定用）"""
+    return _normalize_text(text).translate(_KATAKANA_TO_HIRAGANA)
+
+
+def _normalize_text(text: str) -> str:
+    """照合する文字列の正規化（全角・半角、大文字・小文字の統一）"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def _normalize_with_offsets(text: str) -> Tuple[str, Optional[List[int]], Optional[List[int]]]:
+    """
+    照合用に正規化し、正規化後の各文字に対応する元の文字列の位置を返す
+
+    Args:
+        text: 元の文字列
+
+    Returns:
+        (正規化した文字列, 各文字の元の開始位置, 各文字の元の終了位置)
+        （1文字ずつ対応する場合、位置はNone）
+    """
+    lowered = text.lower()
+    if len(lowered) == len(text) and unicodedata.is_normalized("NFKC", text):
+        # 大半の文字列は1文字ずつ対応する（位置の変換が不要）
+        return lowered, None, None
+
+    chars: List[str] = []
+    starts: List[int] = []
+    ends: List[int] = []
+    index = 0
+    while index < len(text):
+        end = index + 1
+        # 半角カタカナの濁点・半濁点は直前の文字と合わせて1文字にする（ｶﾞ→ガ）
+        if end < len(text) and text[end] in _HALFWIDTH_SOUND_MARKS and _HALFWIDTH_KANA.match(text[index]):
+            end += 1
+        for char in _normalize_text(text[index:end]):
+            chars.append(char)
+            starts.append(index)
+            ends.append(end)
+        index = end
+    return "".join(chars), starts, ends
+
+
+class SafetyMatch:
+    """安全キーワードの一致1件"""
+
+    __slots__ = ("category", "keyword", "start", "end")
+
+    def __init__(self, category: str, keyword: str, start: int, end: int):
+        """
+        初期化
+
+        Args:
+            category: 安全カテゴリ
+            keyword: 一致したキーワード（辞書の表記）
+            start: 一致した部分の開始位置（元の文字列の位置）
+            end: 一致した部分の終了位置（この位置を含まない）
+        """
+        self.category = category
+        self.keyword = keyword
+        self.start = start
+        self.end = end
+
+    def __repr__(self) -> str:
+        return f"SafetyMatch({self.category!r}, {self.keyword!r}, {self.start}, {self.end})"
+
+
+class SafetyScanner:
+    """全キーワードを1つの正規表現にまとめて照合する（照合は re モジュールのC実装で1回走査）"""
+
+    def __init__(self, keywords: Dict[str, Iterable[str]]):
+        """
+        初期化（正規表現は起動時に1回だけコンパイル）
+
+        Args:
+            keywords: {安全カテゴリ: キーワードのリスト}（カテゴリの順序は categories() の順序）
+        """
+        self.category_order = list(keywords)
+        # 正規化後のキーワード（ひらがな・カタカナ、小文字・大文字・先頭のみ大文字の表記）→ (辞書の表記, カテゴリ)
+        # （categories() は小文字に変換した文字列を確保せずに照合する）
+        # （同じキーワードは先に登録したカテゴリ）
+        self._entries: Dict[str, Tuple[str, str]] = {}
+        keyword_count = 0
+        for category, words in keywords.items():
+            for word in words:
+                normalized = normalize_keyword(word)
+                if not normalized or normalized in self._entries:
+                    continue
+                keyword_count += 1
+                for form in (normalized, normalized.translate(_HIRAGANA_TO_KATAKANA)):
+                    for variant in (form, form.upper(), form.capitalize()):
+                        self._entries.setdefault(variant, (word, category))
+        self.keyword_count = keyword_count
+        self.max_length = max((len(normalized) for normalized in self._entries), default=0)
+        # 長いキーワードを先に並べ、同じ位置から始まる一致は最長のものを採る（「真空引き」＞「真空」）
+        alternatives = sorted(self._entries, key=len, reverse=True)
+        self._pattern = re.compile("|".join(map(re.escape, alternatives))) if alternatives else None
+
+    def _match(self, normalized: str, start: int, end: int, starts: Optional[List[int]],
+               ends: Optional[List[int]], offset: int = 0) -> SafetyMatch:
+        """正規化後の一致範囲を元の文字列の位置の SafetyMatch に変換"""
+        word, category = self._entries[normalized]
+        if starts is None:
+            return SafetyMatch(category, word, offset + start, offset + end)
+        return SafetyMatch(category, word, offset + starts[start], offset + ends[end - 1])
+
+    def scan(self, text: str) -> List[SafetyMatch]:
+        """
+        文字列中の安全キーワードを全て検出
+
+        Args:
+            text: 作業者の質問・AIの回答等
+
+        Returns:
+            一致のリスト（出現順、重なる一致は最長のもののみ）
+        """
+        if self._pattern is None or not text:
+            return []
+        normalized, starts, ends = _normalize_with_offsets(text)
+        return [
+            self._match(match.group(), match.start(), match.end(), starts, ends)
+            for match in self._pattern.finditer(normalized)
+        ]
+
+    def categories(self, text: str) -> List[str]:
+        """
+        文字列中の安全カテゴリを検出
+
+        Args:
+            text: 作業者の質問・AIの回答等
+
+        Returns:
+            検出した安全カテゴリ（辞書のカテゴリ順）
+        """
+        if self._pattern is None or not text:
+            return []
+        entries = self._entries
+        words = self._pattern.findall(unicodedata.normalize("NFKC", text))
+        return self.order({entries[word][1] for word in words})
+
+    def order(self, categories: Iterable[str]) -> List[str]:
+        """安全カテゴリを重複を除いて辞書のカテゴリ順に並べる"""
+        found = set(categories)
+        return [category for category in self.category_order if category in found]
+
+    def stream(self) -> "SafetyStream":
+        """ストリーミング応答の照合を開始"""
+        return SafetyStream(self)
+
+
+class SafetyStream:
+    """断片毎に届くテキストの照合（断片の境目をまたぐキーワードも検出する）"""
+
+    def __init__(self, scanner: SafetyScanner):
+        """
+        初期化
+
+        Args:
+            scanner: SafetyScanner
+        """
+        self.scanner = scanner
+        self.matches: List[SafetyMatch] = []
+        # 未確定の末尾（キーワードの途中かもしれない部分）と、その元の文字列での開始位置
+        self._buffer = ""
+        self._offset = 0
+        self._pending = ""  # 次の断片の濁点・半濁点と合わせて正規化する末尾の半角カタカナ
+
+    @property
+    def categories(self) -> List[str]:
+        """これまでに検出した安全カテゴリ（辞書のカテゴリ順）"""
+        return self.scanner.order(match.category for match in self.matches)
+
+    def feed(self, chunk: str) -> List[SafetyMatch]:
+        """
+        テキスト断片を照合
+
+        Args:
+            chunk: LLMから届いたテキスト断片
+
+        Returns:
+            この断片で新たに確定した一致（位置はストリーム先頭からの位置）
+        """
+        text = self._pending + chunk
+        self._pending = ""
+        if text and _HALFWIDTH_KANA.match(text[-1]):
+            text, self._pending = text[:-1], text[-1]
+        return self._scan(text, final=False)
+
+    def finish(self) -> List[SafetyMatch]:
+        """
+        ストリームの終了（未確定の末尾を照合）
+
+        Returns:
+            新たに確定した一致
+        """
+        text, self._pending = self._pending, ""
+        return self._scan(text, final=True)
+
+    def _scan(self, text: str, final: bool) -> List[SafetyMatch]:
+        """
+        未確定の末尾に断片を連結して照合
+
+        後続の断片でより長いキーワードに伸びうる一致（一致の開始位置から最長のキーワード長に
+        満たない位置で終わっている）と、キーワードの途中かもしれない末尾は確定させずに次回に持ち越す
+        """
+        scanner = self.scanner
+        buffer = self._buffer + text
+        if scanner._pattern is None or not buffer:
+            self._buffer = ""
+            self._offset += len(buffer)
+            return []
+        normalized, starts, ends = _normalize_with_offsets(buffer)
+        size = len(normalized)
+        keep_from = size if final else max(size - scanner.max_length + 1, 0)
+        matches = []
+        last_end = 0
+        for match in scanner._pattern.finditer(normalized):
+            if not final and match.start() + scanner.max_length > size:
+                keep_from = match.start()
+                break
+            matches.append(scanner._match(match.group(), match.start(), match.end(), starts, ends, self._offset))
+            last_end = match.end()
+        keep_from = max(keep_from, last_end)
+        consumed = len(buffer) if keep_from >= size else (keep_from if starts is None else starts[keep_from])
+        self._buffer = buffer[consumed:]
+        self._offset += consumed
+        self.matches.extend(matches)
+        return matches
+
+
+def _strip_trailing(term: str) -> str:
+    """語の末尾の一般的な語を除く（複数重なる場合も全て除く）"""
+    stripped = True
+    while stripped:
+        stripped = False
+        for suffix in TRAILING_TERMS:
+            if term.endswith(suffix) and len(term) > len(suffix):
+                term = term[:-len(suffix)]
+                stripped = True
+    return term
+
+
+def _extract_terms(text: str) -> List[str]:
+    """文から安全キーワードの候補となる語を抽出"""
+    terms = []
+    for term in _TERM_PATTERN.findall(text):
+        term = _strip_trailing(term)
+        if len(term) >= 2 and term not in GENERIC_TERMS and term not in ROUTINE_TERMS:
+            terms.append(term)
+    return terms
+
+
+def harvest_keywords(
+    manuals: Optional[Dict[str, dict]] = None,
+    regulations: Optional[Dict[str, Dict[str, str]]] = None
+) -> Dict[str, List[str]]:
+    """
+    マニュアルの安全上の注意・安全規定から安全カテゴリ毎の語彙を抽出
+
+    複数のカテゴリに現れる語はカテゴリを判定できないため除き、同じカテゴリの他の語を含む語
+    （「冷媒漏洩」は「冷媒」で検出できる）は照合の対象を増やさないため除く
+
+    Args:
+        manuals: {機種名: マニュアル辞書}（省略時は AIRCON_MANUALS）
+        regulations: {法令名: {項目: 内容}}（省略時は SAFETY_REGULATIONS）
+
+    Returns:
+        {安全カテゴリ: 語のリスト}
+    """
+    manuals = AIRCON_MANUALS if manuals is None else manuals
+    regulations = SAFETY_REGULATIONS if regulations is None else regulations
+
+    sources: List[Tuple[str, str]] = []
+    for manual in manuals.values():
+        for section, warnings in manual.get("safety_warnings", {}).items():
+            category = MANUAL_SECTION_CATEGORIES.get(section)
+            if category:
+                sources.extend((category, warning) for warning in warnings)
+    for law, items in regulations.items():
+        mapping = REGULATION_CATEGORIES.get(law)
+        for item, content in items.items():
+            category = mapping.get(item) if isinstance(mapping, dict) else mapping
+            if category:
+                sources.append((category, f"{item} {content}"))
+        if isinstance(mapping, str):
+            sources.append((mapping, law))
+
+    found: Dict[str, Dict[str, None]] = {}
+    for category, text in sources:
+        for term in _extract_terms(text):
+            found.setdefault(term, {})[category] = None
+    candidates: Dict[str, List[str]] = {}
+    for term, categories in found.items():
+        if len(categories) == 1:
+            candidates.setdefault(next(iter(categories)), []).append(term)
+
+    harvested: Dict[str, List[str]] = {}
+    for category, terms in candidates.items():
+        known = [normalize_keyword(word) for word in terms + SAFETY_KEYWORDS.get(category, [])]
+        for term in terms:
+            normalized = normalize_keyword(term)
+            if not any(word != normalized and word in normalized for word in known):
+                harvested.setdefault(category, []).append(term)
+    return harvested
+
+
+# 追加登録されたキーワード（register_safety_keywords() で追加）
+_extra_keywords: Dict[str, List[str]] = {}
+
+
+def build_keyword_dictionary() -> Dict[str, List[str]]:
+    """
+    照合に使うキーワード辞書を生成（固定の辞書 → マニュアル・安全規定から抽出した語 → 追加登録した語）
+
+    Returns:
+        {安全カテゴリ: キーワードのリスト}
+    """
+    dictionary = {category: list(words) for category, words in SAFETY_KEYWORDS.items()}
+    for source in (harvest_keywords(), _extra_keywords):
+        for category, words in source.items():
+            dictionary.setdefault(category, []).extend(words)
+    return dictionary
+
+
+# シングルトンインスタンス
+_safety_scanner: Optional[SafetyScanner] = None
+
+
+def get_safety_scanner() -> SafetyScanner:
+    """SafetyScannerのシングルトンインスタンスを取得（初回に正規表現をコンパイル）"""
+    global _safety_scanner
+    if _safety_scanner is None:
+        _safety_scanner = SafetyScanner(build_keyword_dictionary())
+    return _safety_scanner
+
+
+def register_safety_keywords(category: str, keywords: Iterable[str]) -> None:
+    """
+    安全キーワードを追加（次の照合から正規表現をコンパイルし直す）
+
+    Args:
+        category: 安全カテゴリ（新しいカテゴリの場合は SAFETY_REMINDERS にもリマインダーを追加する）
+        keywords: キーワードのリスト
+    """
+    global _safety_scanner
+    _extra_keywords.setdefault(category, []).extend(keywords)
+    _safety_scanner = None
+
+
+def detect_safety_categories(*texts: str) -> List[str]:
+    """
+    複数の文字列（質問と回答等）の安全カテゴリをまとめて検出
+
+    Args:
+        texts: 作業者の質問・AIの回答等
+
+    Returns:
+        検出した安全カテゴリ（辞書のカテゴリ順）
+    """
+    scanner = get_safety_scanner()
+    return scanner.order(category for text in texts if text for category in scanner.categories(text))
@@ -0,0 +1,346 @@
+"""
+OpenAI API呼び出しの流量制御
+呼び出し種別（whisper / chat / tts / embedding）毎に同時実行数を制限し、
+空きを待つ呼び出しは優先度順（対話 > バッチ）に実行する。
+リクエスト毎の期限を過ぎた呼び出しは送信せずに破棄し、429 応答では Retry-After に従って待機する
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from openai import RateLimitError
+
+from app.core.tracing import add_span, span
+
+
+T = TypeVar("T")
+
+# 優先度（小さいほど先に実行）
+PRIORITY_INTERACTIVE = 0  # 利用者が応答を待っている呼び出し
+PRIORITY_BATCH = 1        # 起動時の事前合成・インデックス構築等
+
+# リクエストの期限（秒、フロントエンドのタイムアウトに合わせる）
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "30"))
+
+# 呼び出し種別毎の同時実行数
+DEFAULT_CONCURRENCY = {"whisper": 4, "chat": 8, "tts": 8, "embedding": 4}
+
+# 空きを待てる呼び出し数の上限（超えた分は即座に 503）
+MAX_QUEUE = int(os.getenv("OPENAI_MAX_QUEUE", "64"))
+
+# 429 応答の再試行回数・待機時間（Retry-After がない場合は指数バックオフ）
+MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 20.0
+
+# 期限（time.monotonic() の値）と優先度（リクエスト・タスク毎に保持）
+_deadline: ContextVar[Optional[float]] = ContextVar("openai_deadline", default=None)
+_priority: ContextVar[int] = ContextVar("openai_priority", default=PRIORITY_INTERACTIVE)
+
+
+class Overloaded(Exception):
+    """待機中の呼び出しが上限に達した（503）"""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """リクエストの期限までに呼び出しを完了できない（504）"""
+
+
+@contextmanager
+def request_context(timeout: Optional[float] = None, priority: Optional[int] = None) -> Iterator[None]:
+    """
+    以降のOpenAI API呼び出しの期限・優先度を設定
+
+    Args:
+        timeout: 期限までの秒数（Noneの場合は現在の期限を引き継ぐ）
+        priority: 優先度（Noneの場合は現在の優先度を引き継ぐ）
+    """
+    deadline_token = _deadline.set(time.monotonic() + timeout) if timeout is not None else None
+    priority_token = _priority.set(priority) if priority is not None else None
+    try:
+        yield
+    finally:
+        if priority_token is not None:
+            _priority.reset(priority_token)
+        if deadline_token is not None:
+            _deadline.reset(deadline_token)
+
+
+def remaining_time() -> Optional[float]:
+    """期限までの残り秒数（期限がない場合はNone）"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def current_priority() -> int:
+    """現在の優先度"""
+    return _priority.get()
+
+
+def retry_after_seconds(error: RateLimitError) -> Optional[float]:
+    """
+    429 応答の Retry-After（retry-after-ms / 秒数 / HTTP日付）を秒に変換
+
+    Args:
+        error: RateLimitError
+
+    Returns:
+        待機秒数（ヘッダーがない場合はNone）
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(float(value) / 1000, 0.0)
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class _Waiter:
+    """空きを待つ呼び出し（実行枠を引き渡されると future が完了する）"""
+
+    def __init__(self, future: "asyncio.Future"):
+        self.future = future
+
+
+class AdmissionScheduler:
+    """1種別のOpenAI API呼び出しの同時実行数・待ち行列を管理"""
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int = MAX_QUEUE, max_retries: int = MAX_RETRIES):
+        """
+        初期化
+
+        Args:
+            name: 呼び出し種別（統計表示用）
+            max_concurrency: 同時実行数
+            max_queue: 空きを待てる呼び出し数
+            max_retries: 429 応答の再試行回数
+        """
+        self.name = name
+        self.max_concurrency = max(max_concurrency, 1)
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+
+        self._running = 0
+        self._queue: List[Any] = []  # (優先度, 到着順, _Waiter) のヒープ
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self._waits: deque = deque(maxlen=1024)  # 直近の待ち時間（秒）
+
+    @property
+    def queued(self) -> int:
+        """空きを待っている呼び出し数"""
+        return sum(1 for _, _, waiter in self._queue if not waiter.future.done())
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        実行枠を確保（空きがなければ優先度順に待つ）
+
+        Raises:
+            Overloaded: 待ち行列が上限に達している場合
+            DeadlineExceeded: 期限までに実行枠を確保できない場合
+        """
+        remaining = remaining_time()
+        if remaining is not None and remaining <= 0:
+            self.expired += 1
+            raise DeadlineExceeded(f"{self.name}: リクエストの期限を過ぎています")
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+
+        if self._running < self.max_concurrency and not self.queued:
+            self._running += 1
+        else:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise Overloaded(
+                    f"{self.name}: 混雑しています。しばらくしてから再度お試しください",
+                    retry_after=max(self._paused_until - time.monotonic(), 1.0)
+                )
+
+            waiter = _Waiter(loop.create_future())
+            heapq.heappush(self._queue, (current_priority(), next(self._sequence), waiter))
+            queued_at = time.perf_counter()
+            try:
+                # 実行枠は _release() から引き渡される（_running は引き渡し時に加算済み）
+                await asyncio.wait_for(asyncio.shield(waiter.future), remaining)
+                add_span(f"openai_{self.name}_queue", queued_at)
+            except asyncio.TimeoutError:
+                self._abandon(waiter)
+                self.expired += 1
+                raise DeadlineExceeded(f"{self.name}: 期限までに実行できませんでした") from None
+            except asyncio.CancelledError:
+                self._abandon(waiter)
+                raise
+
+        self.admitted += 1
+        self._waits.append(loop.time() - started)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        """待機をやめた呼び出しの後始末（引き渡し済みの実行枠は次へ回す）"""
+        if waiter.future.done() and not waiter.future.cancelled():
+            self._release()
+        else:
+            waiter.future.cancel()
+
+    def _release(self) -> None:
+        """実行枠を返却し、待っている呼び出しのうち最も優先度の高いものへ引き渡す"""
+        while self._queue:
+            _, _, waiter = heapq.heappop(self._queue)
+            if not waiter.future.done():
+                waiter.future.set_result(None)
+                return
+        self._running -= 1
+
+    async def _wait_pause(self) -> None:
+        """429 応答による一時停止が明けるまで待つ（期限内に明けない場合は DeadlineExceeded）"""
+        delay = self._paused_until - time.monotonic()
+        if delay <= 0:
+            return
+        remaining = remaining_time()
+        if remaining is not None and delay >= remaining:
+            self.expired += 1
+            raise DeadlineExceeded(f"{self.name}: レート制限の解除が期限に間に合いません")
+        await asyncio.sleep(delay)
+
+    async def retrying(self, factory: Callable[[], Awaitable[T]]) -> T:
+        """
+        期限内で上流呼び出しを実行（429 応答は Retry-After に従って再試行）
+
+        実行枠は確保済みであること（slot() の中で呼ぶ）
+
+        Args:
+            factory: 上流呼び出しのコルーチンを生成する関数
+
+        Returns:
+            上流呼び出しの結果
+
+        Raises:
+            DeadlineExceeded: 期限までに完了しない場合
+            RateLimitError: 再試行回数を超えて 429 応答が続いた場合
+        """
+        attempt = 0
+        while True:
+            await self._wait_pause()
+            remaining = remaining_time()
+            if remaining is not None and remaining <= 0:
+                self.expired += 1
+                raise DeadlineExceeded(f"{self.name}: リクエストの期限を過ぎています")
+
+            try:
+                # 上流呼び出しの所要時間をリクエストのトレースに記録（再試行毎に1スパン）
+                with span(f"openai_{self.name}"):
+                    return await asyncio.wait_for(factory(), remaining)
+            except asyncio.TimeoutError:
+                self.expired += 1
+                raise DeadlineExceeded(f"{self.name}: 期限までに応答がありませんでした") from None
+            except RateLimitError as e:
+                self.rate_limited += 1
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = min(BACKOFF_BASE_SECONDS * 2 ** attempt, BACKOFF_MAX_SECONDS)
+                    delay *= random.uniform(0.8, 1.2)
+                # 同じ種別の他の呼び出しも一時停止させる
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+                remaining = remaining_time()
+                if attempt >= self.max_retries or (remaining is not None and delay >= remaining):
+                    raise
+                attempt += 1
+                self.retries += 1
+
+    async def call(self, factory: Callable[[], Awaitable[T]]) -> T:
+        """
+        実行枠を確保して上流呼び出しを実行
+
+        Args:
+            factory: 上流呼び出しのコルーチンを生成する関数
+
+        Returns:
+            上流呼び出しの結果
+        """
+        async with self.slot():
+            return await self.retrying(factory)
+
+    def stats(self) -> Dict[str, Any]:
+        """同時実行数・待ち行列・待ち時間の統計を取得"""
+        waits = sorted(self._waits)
+        queued_by_priority: Dict[str, int] = {}
+        for priority, _, waiter in self._queue:
+            if not waiter.future.done():
+                label = "interactive" if priority == PRIORITY_INTERACTIVE else "batch"
+                queued_by_priority[label] = queued_by_priority.get(label, 0) + 1
+
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self._running,
+            "queued": sum(queued_by_priority.values()),
+            "queued_by_priority": queued_by_priority,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+            "paused_seconds": round(max(self._paused_until - time.monotonic(), 0.0), 3),
+            "wait_ms_avg": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+            "wait_ms_p95": round(waits[min(int(len(waits) * 0.95), len(waits) - 1)] * 1000, 1) if waits else 0.0,
+            "wait_ms_max": round(waits[-1] * 1000, 1) if waits else 0.0
+        }
+
+
+# 呼び出し種別毎のインスタンス
+_schedulers: Dict[str, AdmissionScheduler] = {}
+
+
+def get_scheduler(kind: str) -> AdmissionScheduler:
+    """
+    呼び出し種別毎の AdmissionScheduler インスタンスを取得
+
+    同時実行数は環境変数 OPENAI_CONCURRENCY_<種別>（例: OPENAI_CONCURRENCY_CHAT）で変更できる
+    """
+    scheduler = _schedulers.get(kind)
+    if scheduler is None:
+        concurrency = int(os.getenv(f"OPENAI_CONCURRENCY_{kind.upper()}", str(DEFAULT_CONCURRENCY.get(kind, 4))))
+        scheduler = _schedulers[kind] = AdmissionScheduler(kind, concurrency)
+    return scheduler
+
+
+def scheduler_stats() -> Dict[str, Dict[str, Any]]:
+    """全呼び出し種別の統計"""
+    return {kind: scheduler.stats() for kind, scheduler in _schedulers.items()}
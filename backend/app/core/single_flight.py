@@ -0,0 +1,121 @@
+"""
+同一リクエストの合流（シングルフライト）
+同じ入力で同時に実行中の上流API呼び出しがあれば新たに呼び出さず、その結果を共有する
+"""
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+
+T = TypeVar("T")
+
+
+class _Flight:
+    """実行中の上流呼び出しと待機中の呼び出し元の数"""
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """キー毎に実行中の呼び出しを1つにまとめる"""
+
+    def __init__(self, name: str):
+        """
+        初期化
+
+        Args:
+            name: 統計表示用の名前（chat / tts 等）
+        """
+        self.name = name
+        self._flights: Dict[str, _Flight] = {}
+
+        self.calls = 0
+        self.leaders = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """
+        上流呼び出しを実行（同じキーの呼び出しが実行中なら、その結果を待つ）
+
+        呼び出し元がキャンセルされても他の呼び出し元が待っている間は上流呼び出しを続け、
+        全員がキャンセルされた場合のみ上流呼び出しを中止する
+
+        Args:
+            key: 入力を識別するキー（make_key() 等）
+            factory: 上流呼び出しのコルーチンを生成する関数
+
+        Returns:
+            上流呼び出しの結果（例外も全員に伝播）
+        """
+        self.calls += 1
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._release(key, flight))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            # 1人のキャンセルが共有タスクに波及しないよう shield で待つ
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+                self.abandoned += 1
+                self._release(key, flight)
+
+    def _release(self, key: str, flight: _Flight) -> None:
+        """完了・中止した呼び出しを登録から外す（同じキーの新しい呼び出しは残す）"""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """合流の統計を取得"""
+        return {
+            "calls": self.calls,
+            "upstream_calls": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_rate": self.coalesced / self.calls if self.calls else 0.0,
+            "abandoned": self.abandoned,
+            "in_flight": len(self._flights)
+        }
+
+
+def make_key(*parts: Any) -> str:
+    """
+    入力（JSON化可能な値）からキーを生成
+
+    Args:
+        parts: メッセージリスト・パラメータ等
+
+    Returns:
+        SHA-256 の16進文字列
+    """
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# 呼び出し種別毎のインスタンス
+_single_flights: Dict[str, SingleFlight] = {}
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """呼び出し種別毎の SingleFlight インスタンスを取得"""
+    flight = _single_flights.get(name)
+    if flight is None:
+        flight = _single_flights[name] = SingleFlight(name)
+    return flight
+
+
+def single_flight_stats() -> Dict[str, Dict[str, Any]]:
+    """全呼び出し種別の合流統計"""
+    return {name: flight.stats() for name, flight in _single_flights.items()}
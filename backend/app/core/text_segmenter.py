@@ -0,0 +1,78 @@
+"""
+ストリーミングテキストの文分割
+LLMのトークンストリームを日本語の文末（。！？）で区切り、音声合成単位に分割する
+"""
+
+from typing import List, Optional
+
+
+# 文末記号（全角・半角、改行も区切りとして扱う）
+SENTENCE_TERMINATORS = "。！？!?\n"
+
+# 文末記号の直後に続く閉じ括弧類（文に含める）
+CLOSING_BRACKETS = "」』）)】"
+
+
+class SentenceSplitter:
+    """トークン単位で届くテキストを文単位に切り出す"""
+
+    def __init__(self, min_chars: int = 6):
+        """
+        初期化
+
+        Args:
+            min_chars: これより短い文は次の文と結合する（TTS呼び出し回数の削減）
+        """
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        """
+        テキスト断片を追加し、確定した文を返す
+
+        Args:
+            text: LLMから届いたテキスト断片
+
+        Returns:
+            確定した文のリスト（まだ文末が来ていない部分はバッファに残る）
+        """
+        self._buffer += text
+        sentences = []
+
+        start = 0
+        i = 0
+        length = len(self._buffer)
+        while i < length:
+            if self._buffer[i] in SENTENCE_TERMINATORS:
+                end = i + 1
+                # 連続する文末記号・閉じ括弧は同じ文に含める
+                while end < length and (
+                    self._buffer[end] in SENTENCE_TERMINATORS
+                    or self._buffer[end] in CLOSING_BRACKETS
+                ):
+                    end += 1
+                # バッファ末尾の文末記号は後続の閉じ括弧を待つ
+                if end == length and self._buffer[i] != "\n":
+                    break
+
+                sentence = self._buffer[start:end].strip()
+                if len(sentence) >= self.min_chars:
+                    sentences.append(sentence)
+                    start = end
+                i = end
+            else:
+                i += 1
+
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        """
+        残りのテキストを最後の文として返す
+
+        Returns:
+            残りの文（空の場合はNone）
+        """
+        sentence = self._buffer.strip()
+        self._buffer = ""
+        return sentence or None
@@ -0,0 +1,312 @@
+"""
+リクエスト毎の処理時間の内訳（スパン）
+アップロード受信・音声の前処理・Whisper・GPT・TTS・音声の保存・DBクエリ等の所要時間をリクエスト毎に記録し、
+Server-Timing レスポンスヘッダーで返す（ブラウザの開発者ツールの Timing に表示される）。
+処理時間が TRACE_SLOW_MS 以上のリクエストは直近 TRACE_BUFFER_SIZE 件をメモリ上に保持し、
+GET /api/v1/admin/traces で確認できる（外部の収集サーバーは不要）。
+
+記録はイベントループのスレッドからのみ行うため、ロックを取らずに追加する
+"""
+
+import os
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+
+# 処理時間の内訳を記録するか
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# 保持する遅いリクエストの件数・遅いとみなす処理時間（ミリ秒）
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "100"))
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))
+
+# 1リクエストで記録するスパンの上限（WebSocket・ストリーミング応答で際限なく増えないように）
+MAX_SPANS_PER_TRACE = 256
+
+
+class Span:
+    """処理1件の所要時間"""
+
+    __slots__ = ("name", "start_ms", "duration_ms", "error")
+
+    def __init__(self, name: str, start_ms: float, duration_ms: float, error: Optional[str] = None):
+        """
+        初期化
+
+        Args:
+            name: 処理名（whisper / chat / tts / db 等）
+            start_ms: リクエスト開始からの経過時間（ミリ秒）
+            duration_ms: 所要時間（ミリ秒）
+            error: 例外で終了した場合の例外名
+        """
+        self.name = name
+        self.start_ms = start_ms
+        self.duration_ms = duration_ms
+        self.error = error
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "start_ms": round(self.start_ms, 1),
+            "duration_ms": round(self.duration_ms, 1),
+            "error": self.error,
+        }
+
+
+class Trace:
+    """リクエスト（WebSocketでは1発話）毎のスパンの記録"""
+
+    def __init__(self, method: str, path: str):
+        """
+        初期化
+
+        Args:
+            method: HTTPメソッド（WebSocketは WS）
+            path: リクエストのパス
+        """
+        self.trace_id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.route: Optional[str] = None
+        self.status: Optional[int] = None
+        self.started_at = datetime.now()
+        self.started = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.spans: List[Span] = []
+        self.dropped_spans = 0
+
+    def elapsed_ms(self) -> float:
+        """リクエスト開始からの経過時間（ミリ秒）"""
+        return (time.perf_counter() - self.started) * 1000
+
+    def add(self, name: str, started: float, ended: Optional[float] = None, error: Optional[str] = None) -> None:
+        """
+        計測済みのスパンを追加
+
+        Args:
+            name: 処理名
+            started: 開始時刻（time.perf_counter() の値）
+            ended: 終了時刻（省略時は現在）
+            error: 例外で終了した場合の例外名
+        """
+        if len(self.spans) >= MAX_SPANS_PER_TRACE:
+            self.dropped_spans += 1
+            return
+        ended = time.perf_counter() if ended is None else ended
+        self.spans.append(Span(name, (started - self.started) * 1000, (ended - started) * 1000, error))
+
+    def finish(self, status: Optional[int] = None) -> None:
+        """リクエストの終了を記録"""
+        self.status = status
+        self.duration_ms = self.elapsed_ms()
+
+    def server_timing(self) -> str:
+        """
+        Server-Timing ヘッダーの値を生成
+
+        同じ処理名のスパンは所要時間を合計し、複数回の場合は回数を desc に記載する
+        （並行して実行した処理の合計はリクエスト全体の時間を超えることがある）。
+        ヘッダーの送信時点で終了しているスパンのみを含み、total はヘッダー送信までの時間
+
+        Returns:
+            "whisper;dur=812.3, tts;dur=420.5;desc=\"3 spans\", total;dur=1290.1" 形式の文字列
+        """
+        totals: Dict[str, float] = {}
+        counts: Dict[str, int] = {}
+        for span in self.spans:
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration_ms
+            counts[span.name] = counts.get(span.name, 0) + 1
+        entries = []
+        for name, duration in totals.items():
+            entry = f"{name};dur={duration:.1f}"
+            if counts[name] > 1:
+                entry += f';desc="{counts[name]} spans"'
+            entries.append(entry)
+        entries.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(entries)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration_ms or self.elapsed_ms(), 1),
+            "spans": [span.to_dict() for span in sorted(self.spans, key=lambda span: span.start_ms)],
+            "dropped_spans": self.dropped_spans,
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    """処理中のリクエストのトレース（リクエスト外・無効時はNone）"""
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_request(method: str, path: str) -> Iterator[Optional[Trace]]:
+    """
+    以降の処理のスパンをリクエストに紐付ける（終了の記録・保持は呼び出し側で finish_trace() を呼ぶ）
+
+    Args:
+        method: HTTPメソッド（WebSocketは WS）
+        path: リクエストのパス
+
+    Yields:
+        Trace（TRACING_ENABLED が無効の場合はNone）
+    """
+    if not TRACING_ENABLED:
+        yield None
+        return
+    trace = Trace(method, path)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    ブロックの所要時間をスパンとして記録（リクエスト外では何もしない）
+
+    Args:
+        name: 処理名（Server-Timing の名前に使うため英数字と _ のみ）
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        trace.add(name, started, error=type(e).__name__)
+        raise
+    trace.add(name, started)
+
+
+def add_span(name: str, started: float, ended: Optional[float] = None) -> None:
+    """
+    計測済みの所要時間をスパンとして記録（SQLAlchemyのイベント等、with で囲めない処理用）
+
+    Args:
+        name: 処理名
+        started: 開始時刻（time.perf_counter() の値）
+        ended: 終了時刻（省略時は現在）
+    """
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, started, ended)
+
+
+class TraceBuffer:
+    """遅いリクエストのトレースを直近の一定件数だけ保持するリングバッファ"""
+
+    def __init__(self, max_traces: int = TRACE_BUFFER_SIZE, slow_ms: float = TRACE_SLOW_MS):
+        """
+        初期化
+
+        Args:
+            max_traces: 保持する件数（超えた分は古いものから破棄）
+            slow_ms: 保持する処理時間の下限（ミリ秒）
+        """
+        self.slow_ms = slow_ms
+        self._traces: Deque[Trace] = deque(maxlen=max_traces)
+        self.finished = 0
+        self.recorded = 0
+
+    def record(self, trace: Trace) -> bool:
+        """
+        終了したトレースを記録（遅いリクエスト・サーバーエラーのみ保持）
+
+        Args:
+            trace: 終了したトレース
+
+        Returns:
+            保持したか
+        """
+        self.finished += 1
+        if (trace.duration_ms or 0.0) < self.slow_ms and (trace.status or 0) < 500:
+            return False
+        self._traces.append(trace)
+        self.recorded += 1
+        return True
+
+    def list(self, limit: int = 20, min_ms: float = 0.0, path: Optional[str] = None) -> List[Trace]:
+        """
+        保持しているトレースを新しい順に取得
+
+        Args:
+            limit: 最大件数
+            min_ms: 処理時間の下限（ミリ秒）
+            path: パスに含む文字列
+
+        Returns:
+            トレースのリスト
+        """
+        traces = []
+        for trace in reversed(self._traces):
+            if (trace.duration_ms or 0.0) < min_ms or (path and path not in trace.path):
+                continue
+            traces.append(trace)
+            if len(traces) >= limit:
+                break
+        return traces
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        """トレースIDで取得（破棄済み・未保持はNone）"""
+        for trace in self._traces:
+            if trace.trace_id == trace_id:
+                return trace
+        return None
+
+    def clear(self) -> None:
+        self._traces.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """保持状況を取得"""
+        return {
+            "enabled": TRACING_ENABLED,
+            "slow_ms": self.slow_ms,
+            "buffered": len(self._traces),
+            "capacity": self._traces.maxlen,
+            "finished": self.finished,
+            "recorded": self.recorded,
+        }
+
+
+# シングルトンインスタンス
+_trace_buffer: Optional[TraceBuffer] = None
+
+
+def get_trace_buffer() -> TraceBuffer:
+    """TraceBufferのシングルトンインスタンスを取得"""
+    global _trace_buffer
+    if _trace_buffer is None:
+        _trace_buffer = TraceBuffer()
+    return _trace_buffer
+
+
+def finish_trace(trace: Optional[Trace], status: Optional[int] = None) -> None:
+    """
+    トレースの終了を記録し、遅いリクエストであればリングバッファに保持
+
+    Args:
+        trace: trace_request() のトレース（Noneの場合は何もしない）
+        status: HTTPステータス（WebSocketの発話は成功時200・失敗時500）
+    """
+    if trace is None or trace.duration_ms is not None:
+        return
+    trace.finish(status)
+    get_trace_buffer().record(trace)
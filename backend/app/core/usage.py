@@ -0,0 +1,216 @@
+"""
+API使用量の記録
+Whisper・GPT・TTS・埋め込みの呼び出し毎にトークン数・音声の長さ・読み上げ文字数・応答時間・モデルを
+リクエストの作業者・作業案件と紐付けて usage_records テーブルにまとめて書き込む（応答を待たせない）
+"""
+
+import os
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from app.core.batch_writer import BatchWriter
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import record_api_call
+from app.models.database import UsageRecord
+
+
+# 書き込みの間隔（秒）・1回の INSERT で書き込む最大件数
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "5.0"))
+USAGE_FLUSH_BATCH = int(os.getenv("USAGE_FLUSH_BATCH", "500"))
+
+# モデル毎の料金（USD、トークンは100万あたり・音声は1分あたり・読み上げは100万文字あたり）
+MODEL_PRICES: Dict[str, Dict[str, float]] = {
+    "gpt-4o": {"input": 2.50, "output": 10.00},
+    "gpt-4o-mini": {"input": 0.15, "output": 0.60},
+    "claude-3-5-sonnet-latest": {"input": 3.00, "output": 15.00},
+    "whisper-1": {"audio_minute": 0.006},
+    "tts-1": {"characters": 15.00},
+    "tts-1-hd": {"characters": 30.00},
+    "text-embedding-3-small": {"input": 0.02},
+}
+
+
+class UsageContext:
+    """リクエスト（WebSocketでは1発話）毎の記録先（作業案件は処理中に判明した時点で設定）"""
+
+    def __init__(self, worker_id: Optional[str] = None, endpoint: Optional[str] = None):
+        """
+        初期化
+
+        Args:
+            worker_id: 作業者ID（X-Worker-Id ヘッダー、UUID形式でない場合は記録しない）
+            endpoint: エンドポイントのパス
+        """
+        self.request_id = uuid.uuid4()
+        self.worker_id = _parse_uuid(worker_id)
+        self.work_order_id: Optional[uuid.UUID] = None
+        self.endpoint = endpoint
+
+
+_usage_context: ContextVar[Optional[UsageContext]] = ContextVar("usage_context", default=None)
+
+
+def _parse_uuid(value: Any) -> Optional[uuid.UUID]:
+    """UUIDに変換（形式不正・未指定の場合はNone）"""
+    if not value:
+        return None
+    if isinstance(value, uuid.UUID):
+        return value
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+@contextmanager
+def usage_context(worker_id: Optional[str] = None, endpoint: Optional[str] = None) -> Iterator[UsageContext]:
+    """
+    以降のAPI呼び出しの使用量をリクエストに紐付ける
+
+    Args:
+        worker_id: 作業者ID
+        endpoint: エンドポイントのパス
+
+    Yields:
+        UsageContext（bind_work_order() で作業案件を設定できる）
+    """
+    context = UsageContext(worker_id, endpoint)
+    token = _usage_context.set(context)
+    try:
+        yield context
+    finally:
+        _usage_context.reset(token)
+
+
+def bind_work_order(work_order_id: Any) -> None:
+    """現在のリクエストの使用量を作業案件に紐付ける（リクエスト外では何もしない）"""
+    context = _usage_context.get()
+    if context is not None:
+        context.work_order_id = _parse_uuid(work_order_id)
+
+
+def estimate_cost(
+    model: str,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    audio_seconds: float = 0.0,
+    tts_characters: int = 0
+) -> float:
+    """
+    使用量から料金を概算
+
+    Args:
+        model: モデル名（MODEL_PRICES にない場合は0）
+        prompt_tokens: 入力トークン数
+        completion_tokens: 出力トークン数
+        audio_seconds: 音声の長さ（秒）
+        tts_characters: 読み上げ文字数
+
+    Returns:
+        料金（USD）
+    """
+    prices = MODEL_PRICES.get(model, {})
+    return (
+        prompt_tokens * prices.get("input", 0.0) / 1_000_000
+        + completion_tokens * prices.get("output", 0.0) / 1_000_000
+        + audio_seconds / 60 * prices.get("audio_minute", 0.0)
+        + tts_characters * prices.get("characters", 0.0) / 1_000_000
+    )
+
+
+class UsageLedger:
+    """API呼び出し毎の使用量を usage_records に書き込む"""
+
+    def __init__(self, session_factory: Callable[[], Any] = AsyncSessionLocal, flush_batch: int = USAGE_FLUSH_BATCH):
+        """
+        初期化
+
+        Args:
+            session_factory: DBセッションを生成する関数
+            flush_batch: 1回の INSERT で書き込む最大件数
+        """
+        self.writer = BatchWriter(UsageRecord, session_factory, flush_batch=flush_batch)
+
+        self.recorded = 0
+        self._cost_by_kind: Dict[str, float] = defaultdict(float)
+
+    def record(
+        self,
+        kind: str,
+        model: str,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        audio_seconds: float = 0.0,
+        tts_characters: int = 0,
+        latency_ms: float = 0.0,
+        cached: bool = False
+    ) -> None:
+        """
+        1回の呼び出しの使用量を記録（書き込みはバックグラウンド、/metrics のメトリクスも更新）
+
+        Args:
+            kind: 呼び出し種別（whisper / chat / tts / embedding / summary）
+            model: モデル名
+            prompt_tokens: 入力トークン数
+            completion_tokens: 出力トークン数
+            audio_seconds: 認識した音声の長さ（秒）
+            tts_characters: 読み上げ文字数
+            latency_ms: 応答時間（ミリ秒）
+            cached: キャッシュから返したか（上流の呼び出しなし）
+        """
+        record_api_call(
+            kind, model, prompt_tokens or 0, completion_tokens or 0, audio_seconds or 0.0, tts_characters,
+            latency_seconds=latency_ms / 1000, cached=cached
+        )
+
+        context = _usage_context.get() or UsageContext()
+        self.recorded += 1
+        self._cost_by_kind[kind] += estimate_cost(model, prompt_tokens, completion_tokens, audio_seconds, tts_characters)
+        self.writer.add([{
+            "id": uuid.uuid4(),
+            "request_id": context.request_id,
+            "worker_id": context.worker_id,
+            "work_order_id": context.work_order_id,
+            "endpoint": context.endpoint,
+            "kind": kind,
+            "model": model,
+            "prompt_tokens": prompt_tokens or 0,
+            "completion_tokens": completion_tokens or 0,
+            "audio_seconds": float(audio_seconds or 0.0),
+            "tts_characters": tts_characters,
+            "latency_ms": round(latency_ms, 1),
+            "cached": cached,
+            "created_at": datetime.now()
+        }])
+
+    async def flush(self) -> int:
+        """書き込み待ちの使用量を書き込む（終了時に呼び出す）"""
+        return await self.writer.flush()
+
+    async def run_writer(self, interval_seconds: float = USAGE_FLUSH_INTERVAL) -> None:
+        """一定間隔で使用量を書き込む（起動時にバックグラウンドタスクとして開始）"""
+        await self.writer.run(interval_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        """記録・書き込みの統計を取得（料金は起動後の概算）"""
+        return {
+            "recorded": self.recorded,
+            "cost_usd_by_kind": {kind: round(cost, 6) for kind, cost in self._cost_by_kind.items()},
+            **self.writer.stats()
+        }
+
+
+# シングルトンインスタンス
+_usage_ledger: Optional[UsageLedger] = None
+
+
+def get_usage_ledger() -> UsageLedger:
+    """UsageLedgerのシングルトンインスタンスを取得"""
+    global _usage_ledger
+    if _usage_ledger is None:
+        _usage_ledger = UsageLedger()
+    return _usage_ledger
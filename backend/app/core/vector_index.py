@@ -0,0 +1,327 @@
+"""
+ベクトル検索（密ベクトルインデックス）
+マニュアルチャンクの埋め込みを1つの連続した float32 行列として保持し、
+行列積 + argpartition で Top-K を求める。行列はディスクに保存し、起動時にメモリマップで読み込む
+"""
+
+import hashlib
+import json
+import os
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.retrieval import Chunk, get_bm25_index, tokenize
+from app.data.aircon_manuals import MANUAL_VERSION
+
+
+# インデックスの保存先
+DEFAULT_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "/tmp/aircon_vector_index")
+
+# OpenAI埋め込みモデルの次元数
+EMBEDDING_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+
+class Embedder:
+    """埋め込みモデルの共通インターフェース"""
+
+    name: str = "base"
+    dim: int = 0
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        テキストを埋め込みベクトルに変換
+
+        Args:
+            texts: テキストのリスト
+
+        Returns:
+            L2正規化済みの (len(texts), dim) float32 行列
+        """
+        raise NotImplementedError
+
+    async def embed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        """インデックス構築用の埋め込み（既定は embed と同じ）"""
+        return await self.embed(texts)
+
+
+class HashingEmbedder(Embedder):
+    """文字n-gramのハッシュによるローカル埋め込み（決定的・API不要）"""
+
+    def __init__(self, dim: int = 512):
+        """
+        初期化
+
+        Args:
+            dim: 埋め込み次元数
+        """
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed_sync(self, texts: Sequence[str]) -> np.ndarray:
+        """埋め込みを同期的に計算"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term in tokenize(text):
+                # プロセス間で値が変わらないよう crc32 を使用（組み込みhashはソルト付き）
+                h = zlib.crc32(term.encode("utf-8"))
+                matrix[row, h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        # 語頻度の影響を抑える（サブリニア）
+        np.copysign(np.log1p(np.abs(matrix)), matrix, out=matrix)
+        return _normalize_rows(matrix)
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        return self.embed_sync(texts)
+
+
+class OpenAIEmbedder(Embedder):
+    """OpenAI Embeddings API による埋め込み（質問の埋め込みはLRUキャッシュ）"""
+
+    def __init__(self, openai_service, model: str = "text-embedding-3-small", cache_size: int = 1024):
+        """
+        初期化
+
+        Args:
+            openai_service: OpenAIService インスタンス
+            model: 埋め込みモデル名
+            cache_size: 埋め込みキャッシュの最大件数
+        """
+        self.openai_service = openai_service
+        self.model = model
+        self.name = f"openai-{model}"
+        self.dim = EMBEDDING_DIMENSIONS.get(model, 1536)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.empty((len(texts), self.dim), dtype=np.float32)
+
+        missing: List[int] = []
+        for row, text in enumerate(texts):
+            vector = self._cache.get(text)
+            if vector is None:
+                missing.append(row)
+            else:
+                self._cache.move_to_end(text)
+                matrix[row] = vector
+        self.cache_hits += len(texts) - len(missing)
+        self.cache_misses += len(missing)
+
+        if missing:
+            vectors = await self.openai_service.create_embeddings(
+                [texts[row] for row in missing],
+                model=self.model
+            )
+            fetched = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+            for row, vector in zip(missing, fetched):
+                matrix[row] = vector
+                self._cache[texts[row]] = vector
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return matrix
+
+    async def embed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        # チャンクの埋め込みは保存されるため質問用キャッシュに入れない
+        vectors = await self.openai_service.create_embeddings(list(texts), model=self.model)
+        return _normalize_rows(np.asarray(vectors, dtype=np.float32))
+
+
+class DenseIndex:
+    """埋め込み行列によるTop-K検索"""
+
+    def __init__(self, matrix: np.ndarray, chunks: Sequence[Chunk], embedder: Embedder):
+        """
+        初期化
+
+        Args:
+            matrix: (チャンク数, 次元数) のL2正規化済み float32 行列（メモリマップ可）
+            chunks: 行に対応するチャンク
+            embedder: 質問の埋め込みに使う埋め込みモデル
+        """
+        self.matrix = matrix
+        self.chunks = list(chunks)
+        self.embedder = embedder
+
+    def search_matrix(self, queries: np.ndarray, top_k: int) -> List[List[Tuple[int, float]]]:
+        """
+        埋め込み済みの質問行列で一括検索
+
+        Args:
+            queries: (質問数, 次元数) の行列
+            top_k: 質問毎に返す件数
+
+        Returns:
+            質問毎の [(チャンク番号, コサイン類似度)]（スコア順）
+        """
+        if top_k <= 0 or not len(self.chunks):
+            return [[] for _ in range(len(queries))]
+
+        scores = queries @ self.matrix.T
+        k = min(top_k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+        results = []
+        for row, candidates in enumerate(top):
+            ordered = candidates[np.argsort(-scores[row, candidates])]
+            results.append([(int(i), float(scores[row, i])) for i in ordered])
+        return results
+
+    async def search_batch(self, queries: Sequence[str], top_k: int) -> List[List[Tuple[int, float]]]:
+        """
+        複数の質問をまとめて検索（埋め込み・行列積とも1回）
+
+        Args:
+            queries: 質問文のリスト
+            top_k: 質問毎に返す件数
+
+        Returns:
+            質問毎の [(チャンク番号, コサイン類似度)]（スコア順）
+        """
+        if not queries:
+            return []
+        return self.search_matrix(await self.embedder.embed(queries), top_k)
+
+    def save(self, index_dir: str) -> None:
+        """
+        行列とメタデータをディスクに保存
+
+        Args:
+            index_dir: 保存先ディレクトリ
+        """
+        path = Path(index_dir)
+        path.mkdir(parents=True, exist_ok=True)
+        # 一時ファイルに書いてから置き換える（書き込み途中のファイルを読み込ませない）
+        # メタデータは最後に置き換え、行列と食い違う組み合わせを互換ありと判定させない
+        suffix = f".{os.getpid()}.tmp"
+        matrix_temp = path / f".embeddings.npy{suffix}"
+        meta_temp = path / f".meta.json{suffix}"
+        with open(matrix_temp, "wb") as f:
+            np.save(f, np.ascontiguousarray(self.matrix, dtype=np.float32))
+        meta_temp.write_text(
+            json.dumps(_index_meta(self.chunks, self.embedder), ensure_ascii=False),
+            encoding="utf-8"
+        )
+        os.replace(matrix_temp, path / "embeddings.npy")
+        os.replace(meta_temp, path / "meta.json")
+
+    @classmethod
+    def load(cls, index_dir: str, chunks: Sequence[Chunk], embedder: Embedder) -> Optional["DenseIndex"]:
+        """
+        保存済みのインデックスをメモリマップで読み込む
+
+        Args:
+            index_dir: 保存先ディレクトリ
+            chunks: 現在のチャンク
+            embedder: 現在の埋め込みモデル
+
+        Returns:
+            DenseIndex（未保存またはチャンク・埋め込みモデルが変わっている場合はNone）
+        """
+        path = Path(index_dir)
+        try:
+            meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+        if meta != _index_meta(chunks, embedder):
+            return None
+
+        matrix = np.load(path / "embeddings.npy", mmap_mode="r")
+        return cls(matrix, chunks, embedder)
+
+    @classmethod
+    async def build(cls, chunks: Sequence[Chunk], embedder: Embedder, batch_size: int = 256) -> "DenseIndex":
+        """
+        チャンクを埋め込んでインデックスを構築
+
+        Args:
+            chunks: 検索対象のチャンク
+            embedder: 埋め込みモデル
+            batch_size: 1回の埋め込み呼び出しで処理する件数
+
+        Returns:
+            DenseIndex
+        """
+        matrix = np.empty((len(chunks), embedder.dim), dtype=np.float32)
+        for start in range(0, len(chunks), batch_size):
+            batch = [chunk.text for chunk in chunks[start:start + batch_size]]
+            matrix[start:start + len(batch)] = await embedder.embed_documents(batch)
+        return cls(matrix, chunks, embedder)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """行毎にL2正規化（ゼロベクトルはそのまま）"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.maximum(norms, 1e-12, out=norms)
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+def _index_meta(chunks: Sequence[Chunk], embedder: Embedder) -> dict:
+    """インデックスの互換性判定に使うメタデータ"""
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk.text.encode("utf-8"))
+        digest.update(b"\0")
+    return {
+        "embedder": embedder.name,
+        "dim": embedder.dim,
+        "manual_version": MANUAL_VERSION,
+        "chunk_count": len(chunks),
+        "chunk_digest": digest.hexdigest()
+    }
+
+
+# シングルトンインスタンス（起動時に init_dense_index() で構築）
+_dense_index: Optional[DenseIndex] = None
+
+
+def get_dense_index() -> Optional[DenseIndex]:
+    """DenseIndexのシングルトンインスタンスを取得（未構築の場合はNone）"""
+    return _dense_index
+
+
+def create_embedder() -> Embedder:
+    """環境変数 EMBEDDER（hashing / openai）に応じた埋め込みモデルを生成"""
+    if os.getenv("EMBEDDER", "hashing") == "openai":
+        from app.services.openai_service import get_openai_service
+
+        return OpenAIEmbedder(
+            get_openai_service(),
+            model=os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+        )
+    return HashingEmbedder(dim=int(os.getenv("HASHING_EMBEDDER_DIM", "512")))
+
+
+async def init_dense_index(index_dir: str = DEFAULT_INDEX_DIR) -> DenseIndex:
+    """
+    密ベクトルインデックスを初期化（保存済みならメモリマップで読み込み、なければ構築して保存）
+
+    Args:
+        index_dir: 保存先ディレクトリ
+
+    Returns:
+        DenseIndex
+    """
+    global _dense_index
+    # BM25インデックスと同じチャンク（行番号 = チャンク番号）
+    chunks = get_bm25_index().chunks
+    embedder = create_embedder()
+
+    index = DenseIndex.load(index_dir, chunks, embedder)
+    if index is None:
+        built = await DenseIndex.build(chunks, embedder)
+        built.save(index_dir)
+        index = DenseIndex.load(index_dir, chunks, embedder) or built
+
+    _dense_index = index
+    return index
@@ -0,0 +1,81 @@
+"""
+WAV（RIFF）ヘッダー解析
+"""
+
+import struct
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+# fmt チャンクの形式コード
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class WavInfo(BaseModel):
+    """WAVファイルの形式情報"""
+    audio_format: int
+    channels: int
+    sample_rate: int
+    bits_per_sample: int
+    data_offset: int
+    data_size: int
+
+    @property
+    def block_align(self) -> int:
+        """1サンプル（全チャンネル分）のバイト数"""
+        return self.channels * self.bits_per_sample // 8
+
+    @property
+    def duration(self) -> float:
+        """再生時間（秒）"""
+        if not self.block_align or not self.sample_rate:
+            return 0.0
+        return self.data_size / self.block_align / self.sample_rate
+
+
+def parse_wav(data: bytes) -> Optional[WavInfo]:
+    """
+    WAVファイルのヘッダーを解析
+
+    Args:
+        data: ファイル全体（または data チャンク開始位置までを含む先頭部分）
+
+    Returns:
+        WavInfo（WAVでない・fmt/data チャンクがない場合はNone）
+    """
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+
+    fmt = None
+    position = 12
+    while position + 8 <= len(data):
+        chunk_id = data[position:position + 4]
+        (chunk_size,) = struct.unpack_from("<I", data, position + 4)
+        body = position + 8
+
+        if chunk_id == b"fmt " and body + 16 <= len(data):
+            audio_format, channels, sample_rate, _, _, bits = struct.unpack_from("<HHIIHH", data, body)
+            if audio_format == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 26 and body + 26 <= len(data):
+                # サブフォーマットGUIDの先頭2バイトが実際の形式コード
+                (audio_format,) = struct.unpack_from("<H", data, body + 24)
+            fmt = (audio_format, channels, sample_rate, bits)
+        elif chunk_id == b"data" and fmt is not None:
+            # 録音中に書き出されたWAVはサイズが未確定（0 / 0xFFFFFFFF）の場合がある
+            available = len(data) - body
+            size = chunk_size if 0 < chunk_size <= available else available
+            return WavInfo(
+                audio_format=fmt[0],
+                channels=fmt[1],
+                sample_rate=fmt[2],
+                bits_per_sample=fmt[3],
+                data_offset=body,
+                data_size=size
+            )
+
+        # チャンクは2バイト境界に揃えられる
+        position = body + chunk_size + (chunk_size & 1)
+
+    return None
@@ -3,6 +3,9 @@
 大手メーカーの主要機種の詳細な設置手順、仕様、トラブルシューティング情報を含む
 """
 
+# マニュアルデータのバージョン（データ更新時は必ず変更する。プロンプトキャッシュのキーに使用）
+MANUAL_VERSION = "2025.10.1"
+
 AIRCON_MANUALS = {
     # パナソニック Eoliaシリーズ
     "CS-X400D2": {
@@ -3,11 +3,40 @@ FastAPI メインアプリケーション
 エアコン設置作業支援Chatbot バックエンドAPI
 """
 
-from fastapi import FastAPI
+import asyncio
+import logging
+import math
+import os
+import time
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+
+from app.api.v1 import admin, chat, usage, work_orders
+from app.core.http_pool import close_http_pool, get_http_pool
+from app.core.metrics import (
+    CONTENT_TYPE,
+    HTTP_IN_FLIGHT,
+    HTTP_REQUEST_SECONDS,
+    HTTP_REQUESTS,
+    record_error,
+    render_metrics
+)
+from app.core.retrieval import RETRIEVAL_MODE, get_bm25_index
+from app.core.scheduler import PRIORITY_BATCH, REQUEST_DEADLINE_SECONDS, request_context
+from app.core.tracing import finish_trace, trace_request
+from app.core.usage import get_usage_ledger, usage_context
+from app.core.vector_index import init_dense_index
+from app.services.audio_clips import get_clip_library
+from app.services.audio_store import get_audio_store
+from app.services.conversation_store import get_conversation_store
+from app.services.openai_service import get_openai_service
+
+logger = logging.getLogger(__name__)
 
-from app.api.v1 import chat, work_orders
+# 起動中のバックグラウンドタスク（終了時にキャンセル）
+_background_tasks = []
 
 # FastAPIアプリケーション
 app = FastAPI(
@@ -28,6 +57,171 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def request_deadline(request: Request, call_next):
+    """
+    リクエスト毎にOpenAI API呼び出しの期限を設定
+
+    期限はクライアントのタイムアウト（X-Request-Timeout ヘッダー、秒）または
+    REQUEST_DEADLINE_SECONDS。期限を過ぎた呼び出しは送信せずに破棄する
+    （ヘッダーの値は REQUEST_DEADLINE_SECONDS を上限とし、不正な値・0以下・inf/nan は無視する）
+    """
+    try:
+        timeout = float(request.headers.get("x-request-timeout", REQUEST_DEADLINE_SECONDS))
+    except ValueError:
+        timeout = REQUEST_DEADLINE_SECONDS
+    if not math.isfinite(timeout) or timeout <= 0:
+        timeout = REQUEST_DEADLINE_SECONDS
+    timeout = min(timeout, REQUEST_DEADLINE_SECONDS)
+    with request_context(timeout=timeout):
+        return await call_next(request)
+
+
+@app.middleware("http")
+async def usage_attribution(request: Request, call_next):
+    """
+    リクエスト毎にAPI使用量の記録先を設定
+
+    作業者は X-Worker-Id ヘッダー（UUID）、作業案件は各エンドポイントで判明した時点で紐付ける
+    """
+    with usage_context(worker_id=request.headers.get("x-worker-id"), endpoint=request.url.path):
+        return await call_next(request)
+
+
+@app.middleware("http")
+async def request_metrics(request: Request, call_next):
+    """
+    リクエスト毎の応答時間・処理中のリクエスト数を /metrics に記録
+
+    ルートはパスのテンプレート（/api/v1/chat/audio/{audio_id} 等）で集計し、
+    ストリーミング応答は送信完了までを計測する
+    """
+    started = time.perf_counter()
+    HTTP_IN_FLIGHT.inc()
+
+    def finish(status: int) -> None:
+        HTTP_IN_FLIGHT.dec()
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        HTTP_REQUESTS.labels(request.method, path, status).inc()
+        HTTP_REQUEST_SECONDS.labels(request.method, path).observe(time.perf_counter() - started)
+
+    try:
+        response = await call_next(request)
+    except Exception as e:
+        record_error(e, "http")
+        finish(500)
+        raise
+
+    body = response.body_iterator
+
+    async def observed_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            finish(response.status_code)
+
+    response.body_iterator = observed_body()
+    return response
+
+
+@app.middleware("http")
+async def request_tracing(request: Request, call_next):
+    """
+    リクエスト毎の処理時間の内訳を Server-Timing ヘッダーで返し、遅いリクエストはトレースを保持
+
+    ヘッダーにはヘッダー送信時点で終了した処理のみを含む（ストリーミング応答の送信中の処理は
+    GET /api/v1/admin/traces で確認する）。X-Trace-Id でトレースを取得できる
+    """
+    with trace_request(request.method, request.url.path) as trace:
+        if trace is None:
+            return await call_next(request)
+
+        try:
+            response = await call_next(request)
+        except Exception:
+            finish_trace(trace, 500)
+            raise
+
+        route = request.scope.get("route")
+        trace.route = route.path if route is not None else None
+        response.headers["Server-Timing"] = trace.server_timing()
+        response.headers["X-Trace-Id"] = trace.trace_id
+        # 別オリジンのフロントエンドからも PerformanceResourceTiming.serverTiming で参照できるように
+        response.headers["Timing-Allow-Origin"] = "*"
+
+        body = response.body_iterator
+
+        async def traced_body():
+            try:
+                async for chunk in body:
+                    yield chunk
+            finally:
+                finish_trace(trace, response.status_code)
+
+        response.body_iterator = traced_body()
+        return response
+
+
+@app.on_event("startup")
+async def startup():
+    """
+    起動時処理
+    """
+    # マニュアル検索インデックスを構築（初回リクエストの遅延を避ける）
+    get_bm25_index()
+    # API への接続を事前に確立し、一定時間リクエストがなければ確立し直す（初回リクエストの DNS・TCP・TLS の待ち時間を避ける）
+    try:
+        openai_service = get_openai_service()
+        await openai_service.warm_connections()
+        keepalive_interval = float(os.getenv("HTTP_KEEPALIVE_INTERVAL", "0"))
+        if keepalive_interval > 0:
+            _background_tasks.append(asyncio.create_task(
+                get_http_pool().run_keepalive(openai_service.api_base_urls(), keepalive_interval)
+            ))
+    except Exception as e:
+        logger.warning("API への接続の事前確立に失敗しました: %s", e)
+    # 起動時のAPI呼び出しはバッチ扱い（利用者のリクエストを優先）
+    with request_context(priority=PRIORITY_BATCH):
+        # 密ベクトルインデックスを読み込み（未保存・マニュアル更新時は構築して保存）
+        # 埋め込みAPIの失敗等で構築できない場合は起動を続行し、BM25のみで検索する
+        if RETRIEVAL_MODE in ("dense", "hybrid"):
+            try:
+                await init_dense_index()
+            except Exception as e:
+                logger.warning("密ベクトルインデックスの構築に失敗しました（BM25のみで検索）: %s", e)
+        # 安全リマインダー・相槌の音声を事前合成（APIキー未設定等で失敗しても起動は続行）
+        try:
+            await get_clip_library().warm(get_openai_service())
+        except Exception as e:
+            logger.warning("音声クリップの事前合成に失敗しました: %s", e)
+    # 期限切れの応答音声を定期的に削除
+    _background_tasks.append(asyncio.create_task(
+        get_audio_store().run_sweeper(float(os.getenv("AUDIO_STORE_SWEEP_INTERVAL", "60")))
+    ))
+    # 対話履歴を chat_history にまとめて書き込む（応答を待たせない）
+    _background_tasks.append(asyncio.create_task(get_conversation_store().run_writer()))
+    # API使用量を usage_records にまとめて書き込む
+    _background_tasks.append(asyncio.create_task(get_usage_ledger().run_writer()))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    終了時処理
+    """
+    for task in _background_tasks:
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    _background_tasks.clear()
+    # 書き込み待ちの対話履歴・API使用量を書き込む
+    await get_conversation_store().flush()
+    await get_usage_ledger().flush()
+    # API との接続を閉じる（接続の事前確立のタスクは上で停止済み）
+    await close_http_pool()
+
+
 # ルーター登録
 app.include_router(
     chat.router,
@@ -41,6 +235,18 @@ app.include_router(
     tags=["work-orders"]
 )
 
+app.include_router(
+    usage.router,
+    prefix="/api/v1/usage",
+    tags=["usage"]
+)
+
+app.include_router(
+    admin.router,
+    prefix="/api/v1/admin",
+    tags=["admin"]
+)
+
 
 @app.get("/")
 async def root():
@@ -62,6 +268,14 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus 形式のメトリクス
+    """
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
+
+
 # エラーハンドリング
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
@@ -19,9 +19,18 @@ class TextChatRequest(BaseModel):
     message: str = Field(..., description="ユーザーのメッセージ", min_length=1)
     model: Optional[str] = Field(default=None, description="エアコン機種名（例: CS-X400D2）")
     current_step: Optional[str] = Field(default=None, description="現在の作業工程")
+    work_order_id: Optional[str] = Field(
+        default=None,
+        description="作業案件ID（指定時はサーバー側の対話履歴を使用し、chat_history は不要）"
+    )
     chat_history: Optional[List[Dict[str, str]]] = Field(
         default=[],
-        description="対話履歴 [{'role': 'user', 'content': '...'}, ...]"
+        description="対話履歴 [{'role': 'user', 'content': '...'}, ...]（work_order_id 未指定時のみ使用）"
+    )
+    conversation_id: Optional[str] = Field(
+        default=None,
+        description="会話の識別子（work_order_id 未指定時、古い対話の要約に使用。UUID等の推測されにくい値。未指定時は要約しない）",
+        max_length=128
     )
 
 
@@ -10,6 +10,8 @@ from sqlalchemy import (
     Column,
     String,
     Integer,
+    Float,
+    Boolean,
     Text,
     DateTime,
     Date,
@@ -155,3 +157,23 @@ class ChatHistory(Base):
     timestamp = Column(DateTime, server_default=func.now())
 
     work_order = relationship("WorkOrder", back_populates="chat_history")
+
+
+class UsageRecord(Base):
+    """API呼び出し毎の使用量（作業者・作業案件は参照先の削除後も集計できるよう外部キーにしない）"""
+    __tablename__ = "usage_records"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    request_id = Column(UUID(as_uuid=True), nullable=False)
+    worker_id = Column(UUID(as_uuid=True))
+    work_order_id = Column(UUID(as_uuid=True))
+    endpoint = Column(String(100))
+    kind = Column(String(20), nullable=False)  # whisper / chat / tts / embedding / summary
+    model = Column(String(100), nullable=False)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    audio_seconds = Column(Float, nullable=False, default=0.0)
+    tts_characters = Column(Integer, nullable=False, default=0)
+    latency_ms = Column(Float, nullable=False, default=0.0)
+    cached = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
@@ -0,0 +1,148 @@
+"""
+事前合成音声クリップ
+安全リマインダー・相槌などの固定文を起動時に音声合成しておき、
+応答音声では可変部分のみを合成してフレーム境界で連結する
+"""
+
+import asyncio
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.mp3 import audio_frames
+from app.core.prompts import SAFETY_REMINDERS
+
+
+# 応答生成中に先に再生する相槌
+FILLER_PHRASES = [
+    "確認します。",
+    "少々お待ちください。",
+    "お調べします。",
+]
+
+# 音声応答の冒頭で相槌を再生するか
+FILLER_ENABLED = os.getenv("VOICE_FILLER_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def split_spoken_segments(text: str) -> List[str]:
+    """
+    読み上げテキストを段落（安全リマインダー単位）に分割
+
+    Args:
+        text: add_safety_reminder() が追加した部分等
+
+    Returns:
+        前後の空白を除いた段落のリスト
+    """
+    return [segment.strip() for segment in text.split("\n\n") if segment.strip()]
+
+
+class ClipLibrary:
+    """固定文の合成済み音声（フレーム列）を保持"""
+
+    def __init__(self):
+        """初期化"""
+        self._clips: Dict[str, bytes] = {}
+        self._filler_turn = 0
+        self.hits = 0
+        self.chars_saved = 0
+
+    @staticmethod
+    def default_phrases() -> List[str]:
+        """事前合成する固定文（安全リマインダー + 相槌）"""
+        phrases = []
+        for reminder in SAFETY_REMINDERS.values():
+            phrases.extend(split_spoken_segments(reminder))
+        return phrases + FILLER_PHRASES
+
+    async def warm(self, openai_service, phrases: Optional[Iterable[str]] = None) -> int:
+        """
+        固定文を音声合成して保持
+
+        合成は synthesize_speech() 経由のため、2回目以降の起動では音声合成キャッシュから読み込まれる
+
+        Args:
+            openai_service: OpenAIService インスタンス
+            phrases: 合成する固定文（省略時は default_phrases()）
+
+        Returns:
+            保持しているクリップ数
+        """
+        texts = [text.strip() for text in (phrases or self.default_phrases()) if text.strip()]
+        results = await asyncio.gather(*(openai_service.synthesize_speech(text=text) for text in texts))
+        for text, result in zip(texts, results):
+            self._clips[text] = audio_frames(result.audio_data)
+        return len(self._clips)
+
+    def get(self, text: str) -> Optional[bytes]:
+        """
+        固定文の合成済み音声を取得
+
+        Args:
+            text: 読み上げるテキスト
+
+        Returns:
+            音声データ（フレーム列、未合成の場合はNone）
+        """
+        key = text.strip()
+        clip = self._clips.get(key)
+        if clip is not None:
+            self.hits += 1
+            self.chars_saved += len(key)
+        return clip
+
+    def next_filler(self) -> Optional[Tuple[str, bytes]]:
+        """
+        次に再生する相槌を取得（合成済みのものを順番に使う）
+
+        Returns:
+            (相槌テキスト, 音声データ)（無効または未合成の場合はNone）
+        """
+        if not FILLER_ENABLED:
+            return None
+
+        available = [text for text in FILLER_PHRASES if text in self._clips]
+        if not available:
+            return None
+
+        text = available[self._filler_turn % len(available)]
+        self._filler_turn += 1
+        return text, self._clips[text]
+
+    async def render(self, openai_service, segments: Sequence[str]) -> List[bytes]:
+        """
+        読み上げ段落を音声に変換（固定文はクリップ、それ以外は音声合成）
+
+        Args:
+            openai_service: OpenAIService インスタンス
+            segments: 読み上げる段落
+
+        Returns:
+            段落毎の音声データ
+        """
+        async def render_one(text: str) -> bytes:
+            clip = self.get(text)
+            if clip is not None:
+                return clip
+            return (await openai_service.synthesize_speech(text=text)).audio_data
+
+        return list(await asyncio.gather(*(render_one(text) for text in segments)))
+
+    def stats(self) -> Dict[str, Any]:
+        """クリップ利用統計を取得"""
+        return {
+            "clips": len(self._clips),
+            "hits": self.hits,
+            "chars_saved": self.chars_saved
+        }
+
+
+# シングルトンインスタンス
+_clip_library: Optional[ClipLibrary] = None
+
+
+def get_clip_library() -> ClipLibrary:
+    """ClipLibraryのシングルトンインスタンスを取得"""
+    global _clip_library
+    if _clip_library is None:
+        _clip_library = ClipLibrary()
+    return _clip_library
@@ -0,0 +1,361 @@
+"""
+応答音声ストア
+直近の応答音声をメモリ上のリングに保持し、ディレクトリ（複数ワーカーで共有可能）に
+TTL・合計サイズ上限付きで保存する。GET /audio/{id} の配信元
+"""
+
+import asyncio
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.core.tracing import span
+
+
+# 音声IDの形式（パス指定による任意ファイル読み出しを防ぐ）
+_AUDIO_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class StoredAudio(BaseModel):
+    """保存済みの応答音声"""
+    audio_id: str
+    data: bytes
+    created_at: float
+    content_type: str = "audio/mpeg"
+
+    @property
+    def etag(self) -> str:
+        """ETag（音声IDは内容毎に一意で、内容は変更されない）"""
+        return f'"{self.audio_id}"'
+
+
+class AudioBackend:
+    """音声の保存先の共通インターフェース"""
+
+    name: str = "base"
+
+    async def put(self, audio: StoredAudio) -> None:
+        raise NotImplementedError
+
+    async def get(self, audio_id: str) -> Optional[StoredAudio]:
+        raise NotImplementedError
+
+    async def sweep(self, ttl_seconds: float) -> int:
+        """期限切れ・容量超過分を削除し、削除件数を返す"""
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class MemoryBackend(AudioBackend):
+    """プロセス内のみの保存先（単一ワーカー・開発用）"""
+
+    name = "memory"
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[str, StoredAudio]" = OrderedDict()
+        self._bytes = 0
+
+    async def put(self, audio: StoredAudio) -> None:
+        self._items[audio.audio_id] = audio
+        self._bytes += len(audio.data)
+
+    async def get(self, audio_id: str) -> Optional[StoredAudio]:
+        return self._items.get(audio_id)
+
+    async def sweep(self, ttl_seconds: float) -> int:
+        removed = 0
+        deadline = time.time() - ttl_seconds
+        while self._items:
+            oldest = next(iter(self._items.values()))
+            if oldest.created_at > deadline and self._bytes <= self.max_bytes:
+                break
+            self._items.popitem(last=False)
+            self._bytes -= len(oldest.data)
+            removed += 1
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        return {"items": len(self._items), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+class FileSystemBackend(AudioBackend):
+    """ディレクトリへの保存（同じディレクトリを参照すれば複数ワーカー・複数台で共有可能）"""
+
+    name = "filesystem"
+
+    def __init__(self, directory: str, max_bytes: int):
+        """
+        初期化
+
+        Args:
+            directory: 保存先ディレクトリ
+            max_bytes: 保存する合計バイト数の上限
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, audio_id: str) -> Path:
+        return self.directory / f"{audio_id}.mp3"
+
+    async def put(self, audio: StoredAudio) -> None:
+        await asyncio.to_thread(self._write, audio)
+
+    async def get(self, audio_id: str) -> Optional[StoredAudio]:
+        return await asyncio.to_thread(self._read, audio_id)
+
+    async def sweep(self, ttl_seconds: float) -> int:
+        return await asyncio.to_thread(self._sweep, ttl_seconds)
+
+    def _write(self, audio: StoredAudio) -> None:
+        # 他ワーカーが書き込み途中のファイルを読まないよう一時ファイルから置き換える
+        temp_path = self.directory / f".{audio.audio_id}.tmp"
+        temp_path.write_bytes(audio.data)
+        os.utime(temp_path, (audio.created_at, audio.created_at))
+        os.replace(temp_path, self._path(audio.audio_id))
+
+    def _read(self, audio_id: str) -> Optional[StoredAudio]:
+        path = self._path(audio_id)
+        try:
+            created_at = path.stat().st_mtime
+            data = path.read_bytes()
+        except OSError:
+            return None
+        return StoredAudio(audio_id=audio_id, data=data, created_at=created_at)
+
+    def _sweep(self, ttl_seconds: float) -> int:
+        now = time.time()
+        entries: List[Tuple[float, int, Path]] = []
+        removed = 0
+        for path in self.directory.iterdir():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            # 期限切れ（書き込みが中断した一時ファイルを含む）
+            if stat.st_mtime < now - ttl_seconds:
+                removed += _unlink(path)
+            elif path.suffix == ".mp3":
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            removed += _unlink(path)
+            total -= size
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        return {"directory": str(self.directory), "max_bytes": self.max_bytes}
+
+
+def _unlink(path: Path) -> int:
+    """ファイルを削除（他ワーカーが削除済みの場合は0）"""
+    try:
+        path.unlink()
+        return 1
+    except OSError:
+        return 0
+
+
+class AudioStore:
+    """メモリリング（直近の音声）+ 保存先の2層構成の音声ストア"""
+
+    def __init__(
+        self,
+        backend: AudioBackend,
+        ttl_seconds: float = 3600,
+        hot_items: int = 64,
+        hot_max_bytes: int = 16 * 1024 * 1024
+    ):
+        """
+        初期化
+
+        Args:
+            backend: 保存先
+            ttl_seconds: 音声の保存期間（秒）
+            hot_items: メモリリングに保持する件数
+            hot_max_bytes: メモリリングの上限バイト数
+        """
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.hot_items = hot_items
+        self.hot_max_bytes = hot_max_bytes
+        self._hot: "OrderedDict[str, StoredAudio]" = OrderedDict()
+        self._hot_bytes = 0
+
+        self.stored = 0
+        self.hot_hits = 0
+        self.backend_hits = 0
+        self.misses = 0
+        self.swept = 0
+
+    @staticmethod
+    def is_valid_id(audio_id: str) -> bool:
+        """音声IDの形式チェック"""
+        return bool(_AUDIO_ID.match(audio_id))
+
+    async def put(self, data: bytes, content_type: str = "audio/mpeg") -> str:
+        """
+        応答音声を保存
+
+        Args:
+            data: 音声データ
+            content_type: MIMEタイプ
+
+        Returns:
+            音声ID
+        """
+        audio = StoredAudio(
+            audio_id=uuid.uuid4().hex,
+            data=data,
+            created_at=time.time(),
+            content_type=content_type
+        )
+        self._remember(audio)
+        with span("audio_store"):
+            await self.backend.put(audio)
+        self.stored += 1
+        return audio.audio_id
+
+    async def get(self, audio_id: str) -> Optional[StoredAudio]:
+        """
+        応答音声を取得（メモリリング → 保存先の順）
+
+        Args:
+            audio_id: 音声ID
+
+        Returns:
+            StoredAudio（未保存・期限切れの場合はNone）
+        """
+        if not self.is_valid_id(audio_id):
+            return None
+
+        deadline = time.time() - self.ttl_seconds
+        audio = self._hot.get(audio_id)
+        if audio is not None and audio.created_at > deadline:
+            self.hot_hits += 1
+            return audio
+
+        audio = await self.backend.get(audio_id)
+        if audio is not None and audio.created_at > deadline:
+            self.backend_hits += 1
+            return audio
+
+        self.misses += 1
+        return None
+
+    async def sweep(self) -> int:
+        """期限切れ・容量超過分を削除"""
+        deadline = time.time() - self.ttl_seconds
+        while self._hot and next(iter(self._hot.values())).created_at <= deadline:
+            _, old = self._hot.popitem(last=False)
+            self._hot_bytes -= len(old.data)
+
+        removed = await self.backend.sweep(self.ttl_seconds)
+        self.swept += removed
+        return removed
+
+    async def run_sweeper(self, interval_seconds: float = 60) -> None:
+        """定期的に sweep() を実行（起動時にバックグラウンドタスクとして開始）"""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.sweep()
+            except OSError:
+                # 共有ディレクトリの一時的な障害等は次回に再試行
+                pass
+
+    def _remember(self, audio: StoredAudio) -> None:
+        """メモリリングに追加し、件数・サイズ上限を超えた古いものから破棄"""
+        self._hot[audio.audio_id] = audio
+        self._hot_bytes += len(audio.data)
+        while self._hot and (len(self._hot) > self.hot_items or self._hot_bytes > self.hot_max_bytes):
+            _, old = self._hot.popitem(last=False)
+            self._hot_bytes -= len(old.data)
+
+    def stats(self) -> Dict[str, Any]:
+        """ストア統計を取得"""
+        return {
+            "backend": self.backend.name,
+            "stored": self.stored,
+            "hot_hits": self.hot_hits,
+            "backend_hits": self.backend_hits,
+            "misses": self.misses,
+            "swept": self.swept,
+            "hot_items": len(self._hot),
+            "hot_bytes": self._hot_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            **{f"backend_{key}": value for key, value in self.backend.stats().items()}
+        }
+
+
+def parse_byte_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Range ヘッダー（単一範囲のみ対応）を解析
+
+    Args:
+        header: Range ヘッダーの値（例: "bytes=0-1023", "bytes=-500"）
+        size: 全体のバイト数
+
+    Returns:
+        (開始位置, 終了位置)（終了位置を含む。ヘッダーなし・複数範囲等で全体を返す場合はNone）
+
+    Raises:
+        ValueError: 範囲が全体のバイト数を超える場合（416）
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+
+    start_text, separator, end_text = header[len("bytes="):].strip().partition("-")
+    if not separator or not (start_text or end_text) or not all(
+        text.isdigit() for text in (start_text, end_text) if text
+    ):
+        # 不正な形式は無視して全体を返す
+        return None
+
+    if not start_text:
+        # 末尾からの指定（bytes=-500）
+        length = int(end_text)
+        if length == 0 or size == 0:
+            raise ValueError("範囲が音声データの長さを超えています")
+        return max(size - length, 0), size - 1
+
+    start = int(start_text)
+    if end_text and int(end_text) < start:
+        return None
+    if start >= size:
+        raise ValueError("範囲が音声データの長さを超えています")
+    end = int(end_text) if end_text else size - 1
+    return start, min(end, size - 1)
+
+
+# シングルトンインスタンス
+_audio_store: Optional[AudioStore] = None
+
+
+def get_audio_store() -> AudioStore:
+    """AudioStoreのシングルトンインスタンスを取得"""
+    global _audio_store
+    if _audio_store is None:
+        max_bytes = int(os.getenv("AUDIO_STORE_MAX_MB", "512")) * 1024 * 1024
+        if os.getenv("AUDIO_STORE_BACKEND", "filesystem") == "memory":
+            backend: AudioBackend = MemoryBackend(max_bytes)
+        else:
+            backend = FileSystemBackend(os.getenv("AUDIO_STORE_DIR", "/tmp/aircon_audio"), max_bytes)
+        _audio_store = AudioStore(
+            backend,
+            ttl_seconds=float(os.getenv("AUDIO_STORE_TTL", "3600")),
+            hot_items=int(os.getenv("AUDIO_STORE_HOT_ITEMS", "64"))
+        )
+    return _audio_store
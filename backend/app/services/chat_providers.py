@@ -0,0 +1,580 @@
+"""
+チャット応答生成プロバイダー
+OpenAI・Azure OpenAI・Anthropic Claude を同じインターフェースで呼び出し、
+主プロバイダーが失敗した場合は副プロバイダーに切り替える（または応答が遅い場合に副プロバイダーと競わせる）
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from openai import AsyncAzureOpenAI, AsyncOpenAI, RateLimitError
+from pydantic import BaseModel
+
+from app.core.hedging import get_hedger
+from app.core.history import history_tokens
+from app.core.http_pool import get_http_pool
+from app.core.scheduler import get_scheduler, remaining_time
+from app.core.usage import get_usage_ledger
+
+
+logger = logging.getLogger(__name__)
+
+# 主プロバイダー・副プロバイダー（openai / azure / anthropic、副プロバイダーは空で無効）
+CHAT_PROVIDER = os.getenv("CHAT_PROVIDER", "openai")
+CHAT_SECONDARY_PROVIDER = os.getenv("CHAT_SECONDARY_PROVIDER", "")
+
+# 副プロバイダーの使い方
+#   fallback: 主プロバイダーが失敗した場合のみ呼び出す
+#   race:     主プロバイダーの応答がp95を過ぎても返らない場合に並行して呼び出す（ストリーミングは fallback と同じ）
+CHAT_PROVIDER_MODE = os.getenv("CHAT_PROVIDER_MODE", "fallback")
+
+# Anthropic Messages API のバージョン
+ANTHROPIC_VERSION = "2023-06-01"
+
+# Anthropic の終了理由 → OpenAI の finish_reason
+_ANTHROPIC_FINISH_REASONS = {
+    "end_turn": "stop",
+    "stop_sequence": "stop",
+    "max_tokens": "length"
+}
+
+
+class ChatCompletionResult(BaseModel):
+    """チャット応答結果"""
+    content: str
+    model: str
+    usage: Dict[str, int]
+    finish_reason: str
+    cached: bool = False  # 回答キャッシュから返した場合True
+
+
+class ChatStreamChunk(BaseModel):
+    """ストリーミング応答の断片"""
+    content: str = ""
+    model: Optional[str] = None
+    usage: Optional[Dict[str, int]] = None
+    finish_reason: Optional[str] = None
+    cached: bool = False
+
+
+class ProviderError(Exception):
+    """プロバイダーがエラーを返した"""
+
+
+class ChatProvider:
+    """チャット応答生成プロバイダーの基底クラス"""
+
+    def __init__(self, name: str, model: str):
+        """
+        初期化
+
+        Args:
+            name: プロバイダー名
+            model: モデル名（Azure OpenAI はデプロイ名）
+        """
+        self.name = name
+        self.model = model
+
+    @property
+    def base_url(self) -> str:
+        """APIのURL（起動時の接続確立に使用）"""
+        raise NotImplementedError
+
+    @property
+    def scheduler_kind(self) -> str:
+        """流量制御の呼び出し種別（プロバイダー毎にレート制限が異なるため分ける）"""
+        return "chat" if self.name == "openai" else f"chat_{self.name}"
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        timeout: float
+    ) -> ChatCompletionResult:
+        """
+        応答を生成
+
+        Args:
+            messages: メッセージリスト（OpenAI形式）
+            temperature: ランダム性
+            max_tokens: 最大トークン数
+            timeout: タイムアウト（秒）
+
+        Returns:
+            ChatCompletionResult
+        """
+        raise NotImplementedError
+
+    async def open_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        timeout: float
+    ) -> AsyncIterator[ChatStreamChunk]:
+        """
+        ストリーミング応答を開始（応答ヘッダーを受信した時点で返す）
+
+        Args:
+            messages: メッセージリスト（OpenAI形式）
+            temperature: ランダム性
+            max_tokens: 最大トークン数
+            timeout: 受信間隔のタイムアウト（秒）
+
+        Returns:
+            応答の断片を返す非同期イテレーター
+        """
+        raise NotImplementedError
+
+
+class OpenAIChatProvider(ChatProvider):
+    """OpenAI / Azure OpenAI（Chat Completions API）"""
+
+    def __init__(self, client: AsyncOpenAI, model: str, name: str = "openai", stream_usage: bool = True):
+        """
+        初期化
+
+        Args:
+            client: AsyncOpenAI / AsyncAzureOpenAI クライアント
+            model: モデル名（Azure OpenAI はデプロイ名）
+            name: プロバイダー名
+            stream_usage: ストリーミングの最終チャンクでトークン使用量を受け取るか
+        """
+        super().__init__(name, model)
+        self.client = client
+        self.stream_usage = stream_usage
+
+    @property
+    def base_url(self) -> str:
+        return str(self.client.base_url)
+
+    async def complete(self, messages, temperature, max_tokens, timeout) -> ChatCompletionResult:
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=1.0,
+            frequency_penalty=0.0,
+            presence_penalty=0.0,
+            timeout=timeout
+        )
+
+        choice = response.choices[0]
+
+        return ChatCompletionResult(
+            content=choice.message.content,
+            model=response.model,
+            usage={
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "total_tokens": response.usage.total_tokens
+            },
+            finish_reason=choice.finish_reason
+        )
+
+    async def open_stream(self, messages, temperature, max_tokens, timeout) -> AsyncIterator[ChatStreamChunk]:
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=1.0,
+            frequency_penalty=0.0,
+            presence_penalty=0.0,
+            stream=True,
+            timeout=timeout,
+            # 最終チャンクでトークン使用量を受け取る
+            extra_body={"stream_options": {"include_usage": True}} if self.stream_usage else None
+        )
+        return self._iter_chunks(stream)
+
+    async def _iter_chunks(self, stream) -> AsyncIterator[ChatStreamChunk]:
+        """SDKのストリームを ChatStreamChunk に変換"""
+        async for chunk in stream:
+            usage = getattr(chunk, "usage", None)
+            if usage:
+                if not isinstance(usage, dict):
+                    usage = usage.model_dump()
+                yield ChatStreamChunk(
+                    model=chunk.model,
+                    usage={
+                        "prompt_tokens": usage.get("prompt_tokens", 0),
+                        "completion_tokens": usage.get("completion_tokens", 0),
+                        "total_tokens": usage.get("total_tokens", 0)
+                    }
+                )
+
+            if not chunk.choices:
+                continue
+
+            choice = chunk.choices[0]
+            if choice.delta.content or choice.finish_reason:
+                yield ChatStreamChunk(
+                    content=choice.delta.content or "",
+                    model=chunk.model,
+                    finish_reason=choice.finish_reason
+                )
+
+
+class AnthropicChatProvider(ChatProvider):
+    """Anthropic Claude（Messages API）"""
+
+    def __init__(self, api_key: str, model: str, base_url: str = "https://api.anthropic.com"):
+        """
+        初期化
+
+        Args:
+            api_key: Anthropic APIキー
+            model: モデル名
+            base_url: APIのURL
+        """
+        super().__init__("anthropic", model)
+        self._base_url = base_url.rstrip("/")
+        self.headers = {
+            "x-api-key": api_key,
+            "anthropic-version": ANTHROPIC_VERSION,
+            "content-type": "application/json"
+        }
+        # 接続は OpenAI の呼び出しと共有
+        self.client = get_http_pool().client
+
+    @property
+    def base_url(self) -> str:
+        return self._base_url
+
+    def _payload(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        stream: bool
+    ) -> Dict[str, Any]:
+        """
+        OpenAI形式のメッセージを Messages API のリクエストに変換
+
+        system メッセージは system パラメータにまとめ、同じ役割が続くメッセージは結合する
+        （Messages API は user / assistant の交互・user 始まりが必要）
+        """
+        system = "\n\n".join(message["content"] for message in messages if message["role"] == "system")
+        turns: List[Dict[str, str]] = []
+        for message in messages:
+            if message["role"] == "system":
+                continue
+            role = "assistant" if message["role"] == "assistant" else "user"
+            if turns and turns[-1]["role"] == role:
+                turns[-1]["content"] += "\n\n" + message["content"]
+            elif turns or role == "user":
+                turns.append({"role": role, "content": message["content"]})
+
+        payload: Dict[str, Any] = {
+            "model": self.model,
+            "messages": turns,
+            "max_tokens": max_tokens,
+            "temperature": min(temperature, 1.0),  # Claude の範囲は 0.0〜1.0
+            "stream": stream
+        }
+        if system:
+            payload["system"] = system
+        return payload
+
+    @staticmethod
+    def _raise_for_status(response: httpx.Response) -> None:
+        """エラー応答を例外に変換（429 は流量制御で再試行できるよう RateLimitError）"""
+        if response.status_code < 400:
+            return
+        message = f"Anthropic API error {response.status_code}: {response.text[:200]}"
+        if response.status_code == 429:
+            raise RateLimitError(message, response=response, body=None)
+        raise ProviderError(message)
+
+    async def complete(self, messages, temperature, max_tokens, timeout) -> ChatCompletionResult:
+        response = await self.client.post(
+            f"{self._base_url}/v1/messages",
+            json=self._payload(messages, temperature, max_tokens, stream=False),
+            headers=self.headers,
+            timeout=timeout
+        )
+        self._raise_for_status(response)
+        data = response.json()
+
+        usage = data.get("usage", {})
+        prompt_tokens = usage.get("input_tokens", 0)
+        completion_tokens = usage.get("output_tokens", 0)
+
+        return ChatCompletionResult(
+            content="".join(block.get("text", "") for block in data.get("content", []) if block.get("type") == "text"),
+            model=data.get("model", self.model),
+            usage={
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            },
+            finish_reason=_ANTHROPIC_FINISH_REASONS.get(data.get("stop_reason"), data.get("stop_reason") or "stop")
+        )
+
+    async def open_stream(self, messages, temperature, max_tokens, timeout) -> AsyncIterator[ChatStreamChunk]:
+        request = self.client.build_request(
+            "POST",
+            f"{self._base_url}/v1/messages",
+            json=self._payload(messages, temperature, max_tokens, stream=True),
+            headers=self.headers,
+            timeout=timeout
+        )
+        response = await self.client.send(request, stream=True)
+        if response.status_code >= 400:
+            await response.aread()
+            await response.aclose()
+            self._raise_for_status(response)
+        return self._iter_events(response)
+
+    async def _iter_events(self, response: httpx.Response) -> AsyncIterator[ChatStreamChunk]:
+        """Server-Sent Events を ChatStreamChunk に変換"""
+        model = self.model
+        prompt_tokens = 0
+        completion_tokens = 0
+        finish_reason = None
+
+        try:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                event = json.loads(line[5:].strip())
+                event_type = event.get("type")
+
+                if event_type == "message_start":
+                    message = event.get("message", {})
+                    model = message.get("model", model)
+                    prompt_tokens = message.get("usage", {}).get("input_tokens", 0)
+                elif event_type == "content_block_delta" and event.get("delta", {}).get("type") == "text_delta":
+                    yield ChatStreamChunk(content=event["delta"].get("text", ""), model=model)
+                elif event_type == "message_delta":
+                    completion_tokens = event.get("usage", {}).get("output_tokens", completion_tokens)
+                    stop_reason = event.get("delta", {}).get("stop_reason")
+                    finish_reason = _ANTHROPIC_FINISH_REASONS.get(stop_reason, stop_reason)
+                elif event_type == "error":
+                    raise ProviderError(f"Anthropic API error: {event.get('error', {}).get('message', '')}")
+        finally:
+            await response.aclose()
+
+        yield ChatStreamChunk(model=model, finish_reason=finish_reason or "stop")
+        yield ChatStreamChunk(
+            model=model,
+            usage={
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        )
+
+
+class ChatRouter:
+    """主・副プロバイダーの切り替え（流量制御・タイムアウト・ヘッジリクエストを適用）"""
+
+    def __init__(self, primary: ChatProvider, secondary: Optional[ChatProvider] = None, mode: str = "fallback"):
+        """
+        初期化
+
+        Args:
+            primary: 主プロバイダー
+            secondary: 副プロバイダー（Noneの場合は切り替えない）
+            mode: fallback（失敗時のみ）/ race（応答が遅い場合に並行して呼び出す）
+        """
+        self.primary = primary
+        self.secondary = secondary
+        self.mode = mode
+        self.fallbacks = 0
+
+    def _can_fall_back(self) -> bool:
+        """副プロバイダーに切り替える時間が残っているか"""
+        remaining = remaining_time()
+        return self.secondary is not None and (remaining is None or remaining > 0)
+
+    async def _complete(self, provider: ChatProvider, messages, temperature, max_tokens) -> ChatCompletionResult:
+        """
+        1回の呼び出しで応答を生成し、使用量を記録
+
+        ヘッジリクエスト・race の副プロバイダー等、先に完了した側に中止された呼び出しも上流では課金されるため、
+        入力トークン数をリクエストから概算して記録する
+        """
+        timeout = get_hedger("chat").timeout
+
+        async def attempt() -> ChatCompletionResult:
+            started = time.monotonic()
+            try:
+                result = await provider.complete(messages, temperature, max_tokens, timeout)
+            except asyncio.CancelledError:
+                get_usage_ledger().record(
+                    "chat", provider.model, prompt_tokens=history_tokens(messages), latency_ms=_elapsed_ms(started)
+                )
+                raise
+            get_usage_ledger().record(
+                "chat",
+                result.model,
+                prompt_tokens=result.usage.get("prompt_tokens", 0),
+                completion_tokens=result.usage.get("completion_tokens", 0),
+                latency_ms=_elapsed_ms(started)
+            )
+            return result
+
+        return await get_scheduler(provider.scheduler_kind).call(attempt)
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int
+    ) -> ChatCompletionResult:
+        """
+        応答を生成
+
+        Args:
+            messages: メッセージリスト
+            temperature: ランダム性
+            max_tokens: 最大トークン数
+
+        Returns:
+            ChatCompletionResult
+        """
+        alternate = None
+        if self.mode == "race" and self.secondary is not None:
+            alternate = lambda: self._complete(self.secondary, messages, temperature, max_tokens)
+
+        try:
+            return await get_hedger("chat").run(
+                lambda: self._complete(self.primary, messages, temperature, max_tokens),
+                alternate
+            )
+        except Exception as e:
+            if not self._can_fall_back():
+                raise
+            self.fallbacks += 1
+            logger.warning("%s の応答生成に失敗したため %s に切り替えます: %s", self.primary.name, self.secondary.name, e)
+            return await self._complete(self.secondary, messages, temperature, max_tokens)
+
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int
+    ) -> AsyncIterator[ChatStreamChunk]:
+        """
+        ストリーミング応答を生成（最初の断片を受信する前に失敗した場合のみ副プロバイダーに切り替える）
+
+        Args:
+            messages: メッセージリスト
+            temperature: ランダム性
+            max_tokens: 最大トークン数
+
+        Yields:
+            ChatStreamChunk: 応答の断片
+        """
+        timeout = get_hedger("chat").timeout
+        providers = [self.primary] + ([self.secondary] if self.secondary is not None else [])
+
+        for index, provider in enumerate(providers):
+            scheduler = get_scheduler(provider.scheduler_kind)
+            received = False
+            try:
+                # 受信し終わるまで実行枠を保持
+                async with scheduler.slot():
+                    chunks = await scheduler.retrying(
+                        lambda: provider.open_stream(messages, temperature, max_tokens, timeout)
+                    )
+                    async for chunk in chunks:
+                        received = True
+                        yield chunk
+                return
+            except Exception as e:
+                if received or index == len(providers) - 1 or not self._can_fall_back():
+                    raise
+                self.fallbacks += 1
+                logger.warning("%s の応答生成に失敗したため %s に切り替えます: %s", provider.name, providers[index + 1].name, e)
+
+    def stats(self) -> Dict[str, Any]:
+        """プロバイダー構成と切り替え回数を取得"""
+        return {
+            "primary": f"{self.primary.name}:{self.primary.model}",
+            "secondary": f"{self.secondary.name}:{self.secondary.model}" if self.secondary else None,
+            "mode": self.mode,
+            "fallbacks": self.fallbacks
+        }
+
+
+def _elapsed_ms(started: float) -> float:
+    """time.monotonic() の値 started からの経過時間（ミリ秒）"""
+    return (time.monotonic() - started) * 1000
+
+
+def build_chat_provider(name: str, openai_client: AsyncOpenAI, openai_model: str) -> ChatProvider:
+    """
+    プロバイダー名からプロバイダーを生成
+
+    Args:
+        name: openai / azure / anthropic
+        openai_client: OpenAIService のクライアント（openai の場合に使用）
+        openai_model: OpenAIService のチャットモデル（openai の場合に使用）
+
+    Returns:
+        ChatProvider
+
+    Raises:
+        ValueError: 不明なプロバイダー名・必要な環境変数が未設定の場合
+    """
+    if name == "openai":
+        return OpenAIChatProvider(openai_client, openai_model)
+
+    if name == "azure":
+        api_key = os.getenv("AZURE_OPENAI_API_KEY")
+        endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+        if not api_key or not endpoint:
+            raise ValueError("AZURE_OPENAI_API_KEY / AZURE_OPENAI_ENDPOINT is not set")
+        client = AsyncAzureOpenAI(
+            api_key=api_key,
+            azure_endpoint=endpoint,
+            api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-01"),
+            max_retries=0,  # 再試行は流量制御で行う
+            http_client=get_http_pool().client
+        )
+        return OpenAIChatProvider(
+            client,
+            os.getenv("AZURE_OPENAI_DEPLOYMENT", openai_model),
+            name="azure",
+            stream_usage=False  # stream_options に対応していないAPIバージョンがある
+        )
+
+    if name == "anthropic":
+        api_key = os.getenv("ANTHROPIC_API_KEY")
+        if not api_key:
+            raise ValueError("ANTHROPIC_API_KEY is not set")
+        return AnthropicChatProvider(
+            api_key,
+            os.getenv("ANTHROPIC_MODEL", "claude-3-5-sonnet-latest"),
+            os.getenv("ANTHROPIC_BASE_URL", "https://api.anthropic.com")
+        )
+
+    raise ValueError(f"Unknown chat provider: {name}")
+
+
+def build_chat_router(openai_client: AsyncOpenAI, openai_model: str) -> ChatRouter:
+    """
+    環境変数（CHAT_PROVIDER / CHAT_SECONDARY_PROVIDER / CHAT_PROVIDER_MODE）から ChatRouter を生成
+
+    Args:
+        openai_client: OpenAIService のクライアント
+        openai_model: OpenAIService のチャットモデル
+
+    Returns:
+        ChatRouter
+    """
+    primary = build_chat_provider(CHAT_PROVIDER, openai_client, openai_model)
+    secondary = None
+    if CHAT_SECONDARY_PROVIDER and CHAT_SECONDARY_PROVIDER != CHAT_PROVIDER:
+        secondary = build_chat_provider(CHAT_SECONDARY_PROVIDER, openai_client, openai_model)
+    return ChatRouter(primary, secondary, CHAT_PROVIDER_MODE)
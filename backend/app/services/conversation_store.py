@@ -0,0 +1,270 @@
+"""
+作業案件毎の対話セッション
+直近の対話をメモリ上のLRUに保持し（初回は chat_history テーブルから読み込み）、
+新しい対話はバッファに溜めてバックグラウンドでまとめて chat_history に書き込む（応答を待たせない）
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.core.batch_writer import DEFAULT_MAX_PENDING, BatchWriter
+from app.core.database import AsyncSessionLocal
+from app.core.single_flight import get_single_flight
+from app.models.database import ChatHistory, WorkOrder
+
+
+logger = logging.getLogger(__name__)
+
+# 1会話で保持する対話履歴の最大メッセージ数
+# （プロンプトにはトークン予算内の直近の対話と古い対話の要約のみを含めるため、長時間の作業分を保持する）
+MAX_HISTORY_MESSAGES = 1000
+
+# メモリ上に保持する会話数（超えた場合は最終利用の古い順に破棄、次回はDBから読み込む）
+CONVERSATION_CACHE_SIZE = int(os.getenv("CONVERSATION_CACHE_SIZE", "256"))
+
+# 会話の読み込み時にDBから取得する直近のメッセージ数
+HISTORY_LOAD_LIMIT = int(os.getenv("HISTORY_LOAD_LIMIT", "200"))
+
+# 読み込みのタイムアウト（秒、DBの応答が遅い場合は空の履歴で続行）
+HISTORY_LOAD_TIMEOUT = 2.0
+
+# 書き込みの間隔（秒）・1回に書き込む最大件数（溜まった時点で間隔を待たずに書き込む）
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "1.0"))
+HISTORY_FLUSH_BATCH = int(os.getenv("HISTORY_FLUSH_BATCH", "100"))
+
+
+class WorkOrderNotFound(Exception):
+    """作業案件が存在しない（IDの形式不正を含む）"""
+
+
+class Conversation:
+    """1会話の対話履歴（作業案件に紐付かない場合は保存しない）"""
+
+    def __init__(
+        self,
+        key: Optional[str],
+        work_order_id: Optional[uuid.UUID] = None,
+        messages: Optional[List[Dict[str, str]]] = None
+    ):
+        """
+        初期化
+
+        Args:
+            key: 会話の識別子（対話履歴の要約の識別子にも使用、Noneの場合は要約しない）
+            work_order_id: 作業案件ID（Noneの場合は chat_history に保存しない）
+            messages: 読み込んだ対話履歴
+        """
+        self.key = key
+        self.work_order_id = work_order_id
+        self.messages: List[Dict[str, str]] = messages or []
+        self.offset = 0  # 保持件数の上限で先頭から削ったメッセージ数（要約済みの範囲の位置合わせに使用）
+
+    @property
+    def persistent(self) -> bool:
+        """chat_history に保存する会話か"""
+        return self.work_order_id is not None
+
+    def add_turn(self, user_message: str, assistant_message: str) -> None:
+        """1往復分の対話を履歴に追加"""
+        self.messages.append({"role": "user", "content": user_message})
+        self.messages.append({"role": "assistant", "content": assistant_message})
+        overflow = len(self.messages) - MAX_HISTORY_MESSAGES
+        if overflow > 0:
+            del self.messages[:overflow]
+            self.offset += overflow
+
+
+def parse_work_order_id(value: str) -> uuid.UUID:
+    """
+    作業案件IDを変換
+
+    Raises:
+        WorkOrderNotFound: UUID形式でない場合
+    """
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        raise WorkOrderNotFound(f"作業案件 {value} が見つかりません") from None
+
+
+def work_order_conversation_key(work_order_id: uuid.UUID) -> str:
+    """作業案件の会話の識別子"""
+    return f"work_order:{work_order_id}"
+
+
+class ConversationStore:
+    """作業案件毎の会話のLRUと chat_history への書き込みバッファ"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Any] = AsyncSessionLocal,
+        max_conversations: int = CONVERSATION_CACHE_SIZE,
+        load_limit: int = HISTORY_LOAD_LIMIT,
+        flush_batch: int = HISTORY_FLUSH_BATCH,
+        max_pending: int = DEFAULT_MAX_PENDING
+    ):
+        """
+        初期化
+
+        Args:
+            session_factory: DBセッションを生成する関数（AsyncSession のコンテキストマネージャー）
+            max_conversations: メモリ上に保持する会話数
+            load_limit: 読み込み時に取得する直近のメッセージ数
+            flush_batch: 1回に書き込む最大件数
+            max_pending: 書き込み待ちの上限件数
+        """
+        self.session_factory = session_factory
+        self.max_conversations = max_conversations
+        self.load_limit = load_limit
+        self.writer = BatchWriter(ChatHistory, session_factory, flush_batch=flush_batch, max_pending=max_pending)
+
+        self._conversations: "OrderedDict[uuid.UUID, Conversation]" = OrderedDict()
+
+        self.hits = 0
+        self.loads = 0
+        self.load_failures = 0
+
+    async def open(self, work_order_id: str) -> Conversation:
+        """
+        作業案件の会話を取得（メモリ上にない場合はDBから直近の対話を読み込む）
+
+        Args:
+            work_order_id: 作業案件ID
+
+        Returns:
+            Conversation
+
+        Raises:
+            WorkOrderNotFound: 作業案件が存在しない場合
+        """
+        order_id = parse_work_order_id(work_order_id)
+        conversation = self._conversations.get(order_id)
+        if conversation is not None:
+            self.hits += 1
+            self._conversations.move_to_end(order_id)
+            return conversation
+
+        # 同じ作業案件の同時の読み込みは1回にまとめる
+        conversation, loaded = await get_single_flight("conversation").run(str(order_id), lambda: self._load(order_id))
+        if not loaded:
+            # 読み込みに失敗した会話は保持せず、次のリクエストでDBから読み込み直す
+            return conversation
+        cached = self._conversations.setdefault(order_id, conversation)
+        self._conversations.move_to_end(order_id)
+        while len(self._conversations) > self.max_conversations:
+            self._conversations.popitem(last=False)
+        return cached
+
+    async def _load(self, order_id: uuid.UUID) -> Tuple[Conversation, bool]:
+        """
+        DBから直近の対話を読み込み（DB障害時は書き込み待ちの対話のみで続行）
+
+        Args:
+            order_id: 作業案件ID
+
+        Returns:
+            (会話, DBから読み込めたか)
+        """
+        self.loads += 1
+        rows: List[Any] = []
+        loaded_from_db = True
+        try:
+            rows = await asyncio.wait_for(self._select(order_id), HISTORY_LOAD_TIMEOUT)
+        except (SQLAlchemyError, OSError, asyncio.TimeoutError) as e:
+            self.load_failures += 1
+            loaded_from_db = False
+            logger.warning("対話履歴の読み込みに失敗しました (%s): %r", order_id, e)
+
+        messages = [{"role": row.role, "content": row.message} for row in rows]
+
+        # メモリから破棄された後にまだ書き込まれていない対話を補う
+        loaded = {row.id for row in rows}
+        messages.extend(
+            {"role": row["role"], "content": row["message"]}
+            for row in self.writer.unwritten()
+            if row["work_order_id"] == order_id and row["id"] not in loaded
+        )
+        conversation = Conversation(work_order_conversation_key(order_id), order_id, messages[-MAX_HISTORY_MESSAGES:])
+        return conversation, loaded_from_db
+
+    async def _select(self, order_id: uuid.UUID) -> List[Any]:
+        """作業案件の存在を確認し、直近の対話を古い順に取得"""
+        async with self.session_factory() as session:
+            if await session.get(WorkOrder, order_id) is None:
+                raise WorkOrderNotFound(f"作業案件 {order_id} が見つかりません")
+            result = await session.execute(
+                select(ChatHistory)
+                .where(ChatHistory.work_order_id == order_id)
+                .order_by(ChatHistory.timestamp.desc())
+                .limit(self.load_limit)
+            )
+            return list(reversed(result.scalars().all()))
+
+    def add_turn(self, conversation: Conversation, user_message: str, assistant_message: str) -> None:
+        """
+        1往復分の対話を履歴に追加し、作業案件の会話は chat_history への書き込みを予約
+
+        Args:
+            conversation: 会話
+            user_message: 利用者の発言
+            assistant_message: 応答
+        """
+        conversation.add_turn(user_message, assistant_message)
+        if not conversation.persistent:
+            return
+
+        # 同一ターンの並び順を保つため、応答の時刻を1マイクロ秒ずらす
+        now = datetime.now()
+        self.writer.add([
+            {
+                "id": uuid.uuid4(),
+                "work_order_id": conversation.work_order_id,
+                "role": role,
+                "message": message,
+                "timestamp": now + timedelta(microseconds=offset)
+            }
+            for offset, (role, message) in enumerate((("user", user_message), ("assistant", assistant_message)))
+        ])
+
+    async def flush(self) -> int:
+        """書き込み待ちの対話を chat_history に書き込む（終了時に呼び出す）"""
+        return await self.writer.flush()
+
+    async def run_writer(self, interval_seconds: float = HISTORY_FLUSH_INTERVAL) -> None:
+        """一定間隔で対話を chat_history に書き込む（起動時にバックグラウンドタスクとして開始）"""
+        await self.writer.run(interval_seconds)
+
+    def forget(self, work_order_id: str) -> None:
+        """作業案件の会話をメモリから破棄（次回はDBから読み込む）"""
+        self._conversations.pop(parse_work_order_id(work_order_id), None)
+
+    def stats(self) -> Dict[str, Any]:
+        """会話・書き込みの統計を取得"""
+        return {
+            "conversations": len(self._conversations),
+            "max_conversations": self.max_conversations,
+            "hits": self.hits,
+            "loads": self.loads,
+            "load_failures": self.load_failures,
+            **self.writer.stats()
+        }
+
+
+# シングルトンインスタンス
+_conversation_store: Optional[ConversationStore] = None
+
+
+def get_conversation_store() -> ConversationStore:
+    """ConversationStoreのシングルトンインスタンスを取得"""
+    global _conversation_store
+    if _conversation_store is None:
+        _conversation_store = ConversationStore()
+    return _conversation_store
@@ -5,27 +5,45 @@ Whisper (音声認識), TTS (音声合成), GPT-4 (対話) を統合
 
 import os
 import asyncio
-from typing import List, Dict, Optional
+import time
+from typing import AsyncIterator, Awaitable, Callable, List, Dict, Optional, Tuple
 from pathlib import Path
 import tempfile
 
 from openai import AsyncOpenAI
 from pydantic import BaseModel
 
+from app.core.answer_cache import get_answer_cache
+from app.core.audio_preprocess import get_preprocess_stats, preprocess_audio
+from app.core.hedging import get_hedger
+from app.core.history import SUMMARY_MAX_TOKENS, select_recent_history
+from app.core.http_pool import get_http_pool
+from app.core.metrics import PIPELINE_STAGE_SECONDS, stage_timer
+from app.core.scheduler import get_scheduler
+from app.core.tracing import add_span, span
+from app.core.single_flight import get_single_flight, make_key
+from app.core.text_segmenter import SentenceSplitter
+from app.core.usage import get_usage_ledger
+from app.services.audio_clips import get_clip_library, split_spoken_segments
+from app.services.chat_providers import (
+    ChatCompletionResult,
+    ChatRouter,
+    ChatStreamChunk,
+    build_chat_router
+)
+from app.services.tts_cache import get_tts_cache
+
+
+# Whisperに渡すエアコン用語のヒント
+WHISPER_PROMPT = "エアコン、室内機、室外機、配管、フレア、真空引き、ドレン、冷媒、R32"
+
 
 class TranscriptionResult(BaseModel):
     """音声認識結果"""
     text: str
     language: str
     duration: Optional[float] = None
-
-
-class ChatCompletionResult(BaseModel):
-    """チャット応答結果"""
-    content: str
-    model: str
-    usage: Dict[str, int]
-    finish_reason: str
+    audio_seconds_dropped: float = 0.0  # 前処理で除去した無音の長さ
 
 
 class TTSResult(BaseModel):
@@ -34,27 +52,77 @@ class TTSResult(BaseModel):
     format: str = "mp3"
 
 
+class VoiceStreamEvent(BaseModel):
+    """パイプライン音声チャットのイベント"""
+    type: str  # transcript | audio | done
+    text: str = ""
+    audio_data: bytes = b""
+    model: Optional[str] = None
+    usage: Optional[Dict[str, int]] = None
+    cached: bool = False
+
+
+# 回答キャッシュから返した場合のトークン使用量
+CACHED_USAGE = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+
 class OpenAIService:
     """OpenAI API統合サービス"""
 
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, base_url: str = None):
         """
         初期化
 
         Args:
             api_key: OpenAI APIキー（環境変数OPENAI_API_KEYから取得可能）
+            base_url: APIのURL（環境変数OPENAI_BASE_URLから取得可能、負荷試験では tools/mock_openai.py を指定）
         """
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY is not set")
-
-        self.client = AsyncOpenAI(api_key=self.api_key)
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+
+        # 429 応答の再試行は流量制御（app/core/scheduler.py）で行うため、クライアントでは再試行しない。
+        # 接続は Whisper・GPT・TTS で共有のコネクションプールを使う
+        self.client = AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            max_retries=0,
+            http_client=get_http_pool().client
+        )
 
         # モデル設定
         self.whisper_model = "whisper-1"
         self.chat_model = "gpt-4o"  # GPT-4o (最新版、コスト効率良い)
         self.tts_model = "tts-1"  # 低レイテンシ版
         self.tts_voice = "alloy"  # 音声タイプ (alloy, echo, fable, onyx, nova, shimmer)
+        self.summary_model = os.getenv("SUMMARY_MODEL", "gpt-4o-mini")  # 対話履歴の要約用（安価なモデル）
+
+        self._chat_router: Optional[ChatRouter] = None
+
+    @property
+    def chat_router(self) -> ChatRouter:
+        """チャット応答生成のプロバイダー切り替え（初回利用時に環境変数から生成）"""
+        if self._chat_router is None:
+            self._chat_router = build_chat_router(self.client, self.chat_model)
+        return self._chat_router
+
+    def api_base_urls(self) -> List[str]:
+        """呼び出し先APIのURL（OpenAI とチャットプロバイダー）"""
+        urls = [str(self.client.base_url)]
+        for provider in (self.chat_router.primary, self.chat_router.secondary):
+            if provider is not None and provider.base_url not in urls:
+                urls.append(provider.base_url)
+        return urls
+
+    async def warm_connections(self) -> int:
+        """
+        呼び出し先APIへの接続を事前に確立（起動時に呼び出す）
+
+        Returns:
+            確立に成功したリクエスト数
+        """
+        return await get_http_pool().warm_up(self.api_base_urls())
 
     async def transcribe_audio(
         self,
@@ -73,61 +141,238 @@ class OpenAIService:
         Returns:
             TranscriptionResult: 認識結果
         """
-        with open(audio_file_path, "rb") as audio_file:
-            # Whisper APIで音声認識
-            transcript = await self.client.audio.transcriptions.create(
-                model=self.whisper_model,
-                file=audio_file,
-                language=language,
-                prompt=prompt,  # エアコン用語のヒント
-                response_format="verbose_json"  # 詳細情報取得
+        # イベントループを止めないよう別スレッドで読み込み、メモリ上の音声として前処理・認識
+        with span("file_read"):
+            audio_data = await asyncio.to_thread(Path(audio_file_path).read_bytes)
+        return await self.transcribe_audio_data(
+            audio_data=audio_data,
+            filename=Path(audio_file_path).name,
+            language=language,
+            prompt=prompt  # エアコン用語のヒント
+        )
+
+    async def transcribe_audio_data(
+        self,
+        audio_data: bytes,
+        filename: str = "audio.webm",
+        language: str = "ja",
+        prompt: Optional[str] = None
+    ) -> TranscriptionResult:
+        """
+        メモリ上の音声データをテキストに変換（Whisper API）
+
+        WAVは前処理（前後の無音除去、モノラル・16kHz変換）してから送信する
+
+        Args:
+            audio_data: 音声データ
+            filename: ファイル名（拡張子から音声形式が判定される）
+            language: 言語コード（ja: 日本語）
+            prompt: ヒント文（専門用語を正しく認識させるため）
+
+        Returns:
+            TranscriptionResult: 認識結果
+        """
+        # NumPyの処理はCPU負荷があるため別スレッドで実行
+        with span("preprocess"):
+            processed = await asyncio.to_thread(preprocess_audio, audio_data, filename)
+        get_preprocess_stats().record(processed)
+
+        hedger = get_hedger("whisper")
+
+        async def create():
+            started = time.monotonic()
+            try:
+                transcript = await self.client.audio.transcriptions.create(
+                    model=self.whisper_model,
+                    file=(processed.filename, processed.audio),
+                    language=language,
+                    prompt=prompt,
+                    response_format="verbose_json",  # 詳細情報取得
+                    timeout=hedger.timeout
+                )
+            except asyncio.CancelledError:
+                # 先に完了した側に中止されたヘッジリクエストも上流では課金されるため、送信した音声の長さで記録
+                get_usage_ledger().record(
+                    "whisper", self.whisper_model, audio_seconds=processed.output_seconds, latency_ms=_elapsed_ms(started)
+                )
+                raise
+            get_usage_ledger().record(
+                "whisper", self.whisper_model, audio_seconds=transcript.duration or 0.0, latency_ms=_elapsed_ms(started)
             )
+            return transcript
+
+        # 応答が遅い場合は複製を送り、先に返った結果を使う（送った呼び出しは全て使用量に記録）
+        transcript = await hedger.run(lambda: get_scheduler("whisper").call(create))
 
         return TranscriptionResult(
             text=transcript.text,
             language=transcript.language,
-            duration=transcript.duration
+            duration=transcript.duration,
+            audio_seconds_dropped=processed.dropped_seconds
         )
 
     async def chat_completion(
         self,
         messages: List[Dict[str, str]],
         temperature: float = 0.7,
-        max_tokens: int = 500
+        max_tokens: int = 500,
+        cache_key: Optional[str] = None
     ) -> ChatCompletionResult:
         """
-        チャット応答生成（GPT-4 API）
+        チャット応答生成（GPT-4 API、CHAT_PROVIDER の設定により Azure OpenAI / Claude）
+
+        同じメッセージ・パラメータで実行中の呼び出しがあれば、その応答を共有する
 
         Args:
             messages: メッセージリスト [{"role": "system|user|assistant", "content": "..."}]
             temperature: ランダム性（0.0〜2.0、低いほど一貫性高い）
             max_tokens: 最大トークン数
+            cache_key: 回答キャッシュのキー（AnswerCache.make_key()、Noneの場合はキャッシュしない）
 
         Returns:
             ChatCompletionResult: 応答結果
         """
-        response = await self.client.chat.completions.create(
-            model=self.chat_model,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            top_p=1.0,
-            frequency_penalty=0.0,
-            presence_penalty=0.0
+        answer_cache = get_answer_cache()
+        if cache_key:
+            cached = answer_cache.get(cache_key)
+            if cached:
+                get_usage_ledger().record("chat", cached.model, cached=True)
+                return ChatCompletionResult(
+                    content=cached.content,
+                    model=cached.model,
+                    usage=dict(CACHED_USAGE),
+                    finish_reason="stop",
+                    cached=True
+                )
+
+        led = False
+
+        def complete() -> Awaitable[ChatCompletionResult]:
+            nonlocal led
+            led = True
+            return self._complete(messages, temperature, max_tokens)
+
+        result = await get_single_flight("chat").run(
+            make_key(self.chat_model, messages, temperature, max_tokens), complete
         )
+        if not led:
+            # 実行中の呼び出しに合流した場合は上流の呼び出しなし（作業案件毎の集計に含めるため記録）
+            get_usage_ledger().record("chat", result.model, cached=True)
+
+        # 途中で打ち切られた応答はキャッシュしない
+        if cache_key and result.finish_reason == "stop" and result.content:
+            answer_cache.put(cache_key, result.content, result.model)
+
+        return result
+
+    async def _complete(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> ChatCompletionResult:
+        """チャット応答を生成（chat_completion の上流呼び出し、使用量は ChatRouter が呼び出し毎に記録）"""
+        return await self.chat_router.complete(messages, temperature, max_tokens)
+
+    async def chat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 500,
+        cache_key: Optional[str] = None
+    ) -> AsyncIterator[ChatStreamChunk]:
+        """
+        チャット応答をストリーミング生成（GPT-4 API、CHAT_PROVIDER の設定により Azure OpenAI / Claude）
+
+        トークンが届く毎に content を持つ断片を返し、最後に usage 付きの断片を返す。
+        回答キャッシュにヒットした場合は応答全文を1つの断片で返す
+
+        Args:
+            messages: メッセージリスト
+            temperature: ランダム性
+            max_tokens: 最大トークン数
+            cache_key: 回答キャッシュのキー（Noneの場合はキャッシュしない）
+
+        Yields:
+            ChatStreamChunk: 応答の断片
+        """
+        answer_cache = get_answer_cache()
+        if cache_key:
+            cached = answer_cache.get(cache_key)
+            if cached:
+                get_usage_ledger().record("chat", cached.model, cached=True)
+                yield ChatStreamChunk(
+                    content=cached.content,
+                    model=cached.model,
+                    usage=dict(CACHED_USAGE),
+                    finish_reason="stop",
+                    cached=True
+                )
+                return
+
+        parts: List[str] = []
+        finish_reason = None
+        model = self.chat_model
+        usage: Optional[Dict[str, int]] = None
+        started = time.monotonic()
+
+        try:
+            async for chunk in self.chat_router.stream(messages, temperature, max_tokens):
+                model = chunk.model or model
+                usage = chunk.usage or usage
+                if chunk.content:
+                    parts.append(chunk.content)
+                if chunk.finish_reason:
+                    finish_reason = chunk.finish_reason
+                yield chunk
+        finally:
+            # 切断・例外で中断した場合も、それまでに届いた使用量を記録
+            _record_token_usage("chat", model, usage, started)
+
+        # 最後まで受信できた応答のみキャッシュ
+        if cache_key and finish_reason == "stop" and parts:
+            answer_cache.put(cache_key, "".join(parts), model)
+
+    async def summarize(self, messages: List[Dict[str, str]]) -> str:
+        """
+        対話履歴の要約を生成（安価なモデル、app.core.history の要約生成用メッセージを渡す）
+
+        Args:
+            messages: 要約生成用のメッセージリスト
+
+        Returns:
+            要約
+        """
+        hedger = get_hedger("chat")
+        started = time.monotonic()
+        response = await get_scheduler("chat").call(
+            lambda: self.client.chat.completions.create(
+                model=self.summary_model,
+                messages=messages,
+                temperature=0.2,
+                max_tokens=SUMMARY_MAX_TOKENS,
+                timeout=hedger.timeout
+            )
+        )
+        _record_token_usage("summary", self.summary_model, _usage_dict(response.usage), started)
+        return response.choices[0].message.content or ""
+
+    async def create_embeddings(
+        self,
+        texts: List[str],
+        model: str = "text-embedding-3-small"
+    ) -> List[List[float]]:
+        """
+        テキストの埋め込みベクトルを取得（Embeddings API）
+
+        Args:
+            texts: テキストのリスト
+            model: 埋め込みモデル名
 
-        choice = response.choices[0]
-
-        return ChatCompletionResult(
-            content=choice.message.content,
-            model=response.model,
-            usage={
-                "prompt_tokens": response.usage.prompt_tokens,
-                "completion_tokens": response.usage.completion_tokens,
-                "total_tokens": response.usage.total_tokens
-            },
-            finish_reason=choice.finish_reason
+        Returns:
+            テキスト毎の埋め込みベクトル
+        """
+        started = time.monotonic()
+        response = await get_scheduler("embedding").call(
+            lambda: self.client.embeddings.create(model=model, input=texts)
         )
+        _record_token_usage("embedding", model, _usage_dict(response.usage), started)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
 
     async def synthesize_speech(
         self,
@@ -138,6 +383,8 @@ class OpenAIService:
         """
         テキストを音声に変換（TTS API）
 
+        合成済みの音声はキャッシュから返し、同じテキストを合成中の呼び出しがあれば、その結果を共有する
+
         Args:
             text: 読み上げるテキスト
             voice: 音声タイプ (alloy, echo, fable, onyx, nova, shimmer)
@@ -148,85 +395,355 @@ class OpenAIService:
         """
         voice = voice or self.tts_voice
 
-        response = await self.client.audio.speech.create(
-            model=self.tts_model,
-            voice=voice,
-            input=text,
-            speed=speed,
-            response_format="mp3"
-        )
+        # 同じテキスト・音声設定の合成済み音声があれば再利用
+        tts_cache = get_tts_cache()
+        cache_key = tts_cache.make_key(text, voice, speed, self.tts_model)
+        cached_audio = await tts_cache.get(cache_key)
+        if cached_audio is not None:
+            get_usage_ledger().record("tts", self.tts_model, cached=True)
+            return TTSResult(audio_data=cached_audio, format="mp3")
+
+        led = False
 
-        # ストリーミングレスポンスをバイトデータに変換
-        audio_data = b""
-        async for chunk in response.iter_bytes():
-            audio_data += chunk
+        def create_speech() -> Awaitable[bytes]:
+            nonlocal led
+            led = True
+            return self._create_speech(text, voice, speed, cache_key)
+
+        audio_data = await get_single_flight("tts").run(cache_key, create_speech)
+        if not led:
+            get_usage_ledger().record("tts", self.tts_model, cached=True)
 
         return TTSResult(
             audio_data=audio_data,
             format="mp3"
         )
 
+    async def _create_speech(self, text: str, voice: str, speed: float, cache_key: str) -> bytes:
+        """TTS API を呼び出して音声合成キャッシュに登録（synthesize_speech の上流呼び出し）"""
+        hedger = get_hedger("tts")
+
+        async def create() -> bytes:
+            started = time.monotonic()
+            try:
+                response = await self.client.audio.speech.create(
+                    model=self.tts_model,
+                    voice=voice,
+                    input=text,
+                    speed=speed,
+                    response_format="mp3",
+                    timeout=hedger.timeout
+                )
+            except asyncio.CancelledError:
+                # 先に完了した側に中止されたヘッジリクエストも上流では課金されるため記録
+                get_usage_ledger().record("tts", self.tts_model, tts_characters=len(text), latency_ms=_elapsed_ms(started))
+                raise
+            get_usage_ledger().record("tts", self.tts_model, tts_characters=len(text), latency_ms=_elapsed_ms(started))
+
+            # 応答本文は読み込み済み（SDKの iter_bytes() は同期イテレーター）
+            return response.content
+
+        # 応答が遅い場合は複製を送り、先に返った結果を使う（送った呼び出しは全て使用量に記録）
+        audio_data = await hedger.run(lambda: get_scheduler("tts").call(create))
+
+        await get_tts_cache().put(cache_key, audio_data)
+        return audio_data
+
     async def voice_to_voice_chat(
         self,
-        audio_file_path: str,
+        audio_file_path: Optional[str],
         system_prompt: str,
         chat_history: List[Dict[str, str]] = None,
-        temperature: float = 0.7
+        temperature: float = 0.7,
+        reference_provider: Optional[Callable[[str], Awaitable[Optional[str]]]] = None,
+        cache_key_provider: Optional[Callable[[str], Optional[str]]] = None,
+        audio_data: Optional[bytes] = None,
+        audio_filename: str = "audio.webm"
     ) -> Dict[str, any]:
         """
         音声→テキスト→チャット→音声の一連フロー
 
         Args:
-            audio_file_path: 入力音声ファイルパス
+            audio_file_path: 入力音声ファイルパス（audio_data を指定する場合はNone）
             system_prompt: システムプロンプト
             chat_history: 対話履歴
             temperature: GPTの温度パラメータ
+            reference_provider: 認識テキストから参考情報（マニュアル検索結果）を返す関数
+            cache_key_provider: 認識テキストから回答キャッシュのキーを返す関数
+            audio_data: メモリ上の入力音声データ
+            audio_filename: audio_data のファイル名（拡張子で音声形式を判定）
 
         Returns:
             dict: {
                 "transcript": 認識テキスト,
                 "response_text": 応答テキスト,
                 "response_audio": 応答音声データ,
-                "usage": トークン使用量
+                "usage": トークン使用量,
+                "cached": 回答キャッシュから返したか
             }
         """
         chat_history = chat_history or []
 
         # 1. 音声認識（Whisper）
-        # エアコン用語のヒント
-        whisper_prompt = "エアコン、室内機、室外機、配管、フレア、真空引き、ドレン、冷媒、R32"
-
-        transcription = await self.transcribe_audio(
-            audio_file_path=audio_file_path,
-            language="ja",
-            prompt=whisper_prompt
-        )
+        with stage_timer("voice", "transcribe"):
+            transcription = await self._transcribe_input(audio_file_path, audio_data, audio_filename)
 
         # 2. チャット応答生成（GPT-4）
-        messages = [{"role": "system", "content": system_prompt}]
-        messages.extend(chat_history)
-        messages.append({"role": "user", "content": transcription.text})
-
-        chat_result = await self.chat_completion(
-            messages=messages,
-            temperature=temperature,
-            max_tokens=500
-        )
+        with stage_timer("voice", "retrieve"):
+            messages = await _build_messages(
+                system_prompt, chat_history, transcription.text, reference_provider
+            )
+
+        with stage_timer("voice", "chat"):
+            chat_result = await self.chat_completion(
+                messages=messages,
+                temperature=temperature,
+                max_tokens=500,
+                cache_key=cache_key_provider(transcription.text) if cache_key_provider else None
+            )
 
         # 3. 音声合成（TTS）
-        tts_result = await self.synthesize_speech(
-            text=chat_result.content,
-            speed=1.0  # 標準速度
-        )
+        with stage_timer("voice", "tts"):
+            tts_result = await self.synthesize_speech(
+                text=chat_result.content,
+                speed=1.0  # 標準速度
+            )
 
         return {
             "transcript": transcription.text,
             "response_text": chat_result.content,
             "response_audio": tts_result.audio_data,
             "usage": chat_result.usage,
-            "model": chat_result.model
+            "model": chat_result.model,
+            "cached": chat_result.cached,
+            "audio_seconds_dropped": transcription.audio_seconds_dropped
         }
 
+    async def voice_to_voice_chat_stream(
+        self,
+        audio_file_path: Optional[str],
+        system_prompt: str,
+        chat_history: List[Dict[str, str]] = None,
+        temperature: float = 0.7,
+        epilogue: Optional[Callable[[str, str], str]] = None,
+        reference_provider: Optional[Callable[[str], Awaitable[Optional[str]]]] = None,
+        cache_key_provider: Optional[Callable[[str], Optional[str]]] = None,
+        audio_data: Optional[bytes] = None,
+        audio_filename: str = "audio.webm"
+    ) -> AsyncIterator[VoiceStreamEvent]:
+        """
+        音声→テキスト→チャット→音声のパイプライン版
+
+        音声認識後、応答を文単位で音声合成しながら順に返す。
+        最初の文の音声は応答生成の途中で届く。
+
+        Args:
+            audio_file_path: 入力音声ファイルパス（audio_data を指定する場合はNone）
+            system_prompt: システムプロンプト
+            chat_history: 対話履歴
+            temperature: GPTの温度パラメータ
+            epilogue: (認識テキスト, 応答テキスト) から応答末尾に読み上げる追加テキストを返す関数
+            reference_provider: 認識テキストから参考情報（マニュアル検索結果）を返す関数
+            cache_key_provider: 認識テキストから回答キャッシュのキーを返す関数
+            audio_data: メモリ上の入力音声データ
+            audio_filename: audio_data のファイル名
+
+        Yields:
+            VoiceStreamEvent: transcript（認識結果）→ audio（文毎の音声、順序保証）→ done（応答全文と使用量）
+        """
+        with stage_timer("voice_stream", "transcribe"):
+            transcription = await self._transcribe_input(audio_file_path, audio_data, audio_filename)
+        yield VoiceStreamEvent(type="transcript", text=transcription.text)
+
+        with stage_timer("voice_stream", "retrieve"):
+            messages = await _build_messages(
+                system_prompt, chat_history, transcription.text, reference_provider
+            )
+
+        tail = None
+        if epilogue:
+            tail = lambda content: epilogue(transcription.text, content)
+
+        cache_key = cache_key_provider(transcription.text) if cache_key_provider else None
+
+        async for event in self.chat_speech_stream(
+            messages, temperature, epilogue=tail, cache_key=cache_key, pipeline="voice_stream"
+        ):
+            yield event
+
+    async def _transcribe_input(
+        self,
+        audio_file_path: Optional[str],
+        audio_data: Optional[bytes],
+        audio_filename: str
+    ) -> TranscriptionResult:
+        """音声チャットの入力（ファイルまたはメモリ上のデータ）を音声認識"""
+        if audio_data is not None:
+            return await self.transcribe_audio_data(
+                audio_data=audio_data,
+                filename=audio_filename,
+                language="ja",
+                prompt=WHISPER_PROMPT
+            )
+        return await self.transcribe_audio(
+            audio_file_path=audio_file_path,
+            language="ja",
+            prompt=WHISPER_PROMPT
+        )
+
+    async def chat_speech_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        epilogue: Optional[Callable[[str], str]] = None,
+        max_parallel_tts: int = 3,
+        cache_key: Optional[str] = None,
+        pipeline: str = "voice_ws"
+    ) -> AsyncIterator[VoiceStreamEvent]:
+        """
+        チャット応答をストリーミング生成し、文単位で並行に音声合成する
+
+        Args:
+            messages: メッセージリスト
+            temperature: GPTの温度パラメータ
+            epilogue: 応答テキストから末尾に読み上げる追加テキストを返す関数
+            max_parallel_tts: 同時に実行する音声合成の最大数
+            cache_key: 回答キャッシュのキー（Noneの場合はキャッシュしない）
+            pipeline: メトリクスの処理の種類（最初の音声・応答完了までの時間を記録）
+
+        Yields:
+            VoiceStreamEvent: audio（文毎の音声、順序保証）→ done（応答全文と使用量）
+        """
+        splitter = SentenceSplitter()
+        semaphore = asyncio.Semaphore(max_parallel_tts)
+        # 合成タスクを文の順序どおりに保持するキュー（None で終端）
+        pending: "asyncio.Queue[Optional[Tuple[str, asyncio.Task]]]" = asyncio.Queue()
+        summary = VoiceStreamEvent(type="done", model=self.chat_model)
+        clips = get_clip_library()
+
+        async def synthesize(text: str) -> TTSResult:
+            # 固定文（安全リマインダー等）は事前合成クリップを使う
+            clip = clips.get(text)
+            if clip is not None:
+                return TTSResult(audio_data=clip)
+            async with semaphore:
+                return await self.synthesize_speech(text=text, speed=1.0)
+
+        def schedule(text: str) -> None:
+            pending.put_nowait((text, asyncio.create_task(synthesize(text))))
+
+        async def produce() -> None:
+            parts = []
+            try:
+                async for chunk in self.chat_completion_stream(
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=500,
+                    cache_key=cache_key
+                ):
+                    if chunk.model:
+                        summary.model = chunk.model
+                    if chunk.usage:
+                        summary.usage = chunk.usage
+                    if chunk.cached:
+                        summary.cached = True
+                    if chunk.content:
+                        parts.append(chunk.content)
+                        for sentence in splitter.feed(chunk.content):
+                            schedule(sentence)
+
+                rest = splitter.flush()
+                if rest:
+                    schedule(rest)
+
+                summary.text = "".join(parts)
+                if epilogue:
+                    # 段落（安全リマインダー）毎に分けて事前合成クリップと照合
+                    for segment in split_spoken_segments(epilogue(summary.text)):
+                        schedule(segment)
+            finally:
+                pending.put_nowait(None)
+
+        started = time.perf_counter()
+        first_audio = True
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await pending.get()
+                if item is None:
+                    break
+                text, task = item
+                tts_result = await task
+                if first_audio:
+                    first_audio = False
+                    PIPELINE_STAGE_SECONDS.labels(pipeline, "first_audio").observe(time.perf_counter() - started)
+                    add_span("first_audio", started)
+                yield VoiceStreamEvent(type="audio", text=text, audio_data=tts_result.audio_data)
+
+            # 応答生成側の例外を伝播
+            await producer
+            PIPELINE_STAGE_SECONDS.labels(pipeline, "respond").observe(time.perf_counter() - started)
+            add_span("respond", started)
+            yield summary
+        finally:
+            # クライアント切断時等は未完了の生成・合成を中止
+            producer.cancel()
+            while not pending.empty():
+                item = pending.get_nowait()
+                if item is not None:
+                    item[1].cancel()
+
+
+def _elapsed_ms(started: float) -> float:
+    """time.monotonic() の値 started からの経過時間（ミリ秒）"""
+    return (time.monotonic() - started) * 1000
+
+
+def _usage_dict(usage) -> Optional[Dict[str, int]]:
+    """SDKの usage オブジェクトを辞書に変換"""
+    if usage is None:
+        return None
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0
+    }
+
+
+def _record_token_usage(kind: str, model: str, usage: Optional[Dict[str, int]], started: float) -> None:
+    """トークン数と応答時間を使用量として記録"""
+    usage = usage or {}
+    get_usage_ledger().record(
+        kind,
+        model,
+        prompt_tokens=usage.get("prompt_tokens", 0),
+        completion_tokens=usage.get("completion_tokens", 0),
+        latency_ms=_elapsed_ms(started)
+    )
+
+
+async def _build_messages(
+    system_prompt: str,
+    chat_history: List[Dict[str, str]],
+    user_message: str,
+    reference_provider: Optional[Callable[[str], Awaitable[Optional[str]]]] = None
+) -> List[Dict[str, str]]:
+    """音声チャット用のメッセージリストを構築（参考情報は質問の直前に置く）"""
+    messages = [{"role": "system", "content": system_prompt}]
+
+    # 先頭の要約（HistoryCompactor の system メッセージ）は残し、以降の対話をトークン予算内に絞る
+    history = list(chat_history or [])
+    summary_end = 0
+    while summary_end < len(history) and history[summary_end].get("role") == "system":
+        summary_end += 1
+    messages.extend(history[:summary_end])
+    messages.extend(select_recent_history(history[summary_end:]))
+    if reference_provider:
+        reference = await reference_provider(user_message)
+        if reference:
+            messages.append({"role": "system", "content": reference})
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
 
 # シングルトンインスタンス
 _openai_service: Optional[OpenAIService] = None
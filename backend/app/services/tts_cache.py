@@ -0,0 +1,221 @@
+"""
+音声合成キャッシュ
+(テキスト, 音声タイプ, 速度, TTSモデル) のハッシュをキーに合成済み音声を保持し、
+同じ文の再合成（TTS API呼び出し）を省略する。メモリ層とサイズ上限付きのディスク層の2段構成
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+class TTSCache:
+    """メモリ + ディスクの2層LRU音声キャッシュ"""
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_memory_bytes: int = 32 * 1024 * 1024,
+        max_disk_bytes: int = 256 * 1024 * 1024
+    ):
+        """
+        初期化
+
+        Args:
+            cache_dir: ディスク層の保存先（Noneの場合はメモリ層のみ）
+            max_memory_bytes: メモリ層の上限バイト数
+            max_disk_bytes: ディスク層の上限バイト数
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        # ディスク層の索引（キー → バイト数、古い順）
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+
+        if self.cache_dir:
+            self._load_disk_index()
+
+    @staticmethod
+    def make_key(text: str, voice: str, speed: float, tts_model: str) -> str:
+        """
+        キャッシュキーを生成
+
+        Args:
+            text: 読み上げるテキスト
+            voice: 音声タイプ
+            speed: 速度
+            tts_model: TTSモデル名
+
+        Returns:
+            SHA-256 の16進文字列
+        """
+        raw = "\0".join([tts_model, voice, f"{speed:.3f}", text])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """
+        合成済み音声を取得（メモリ層 → ディスク層の順に探す）
+
+        Args:
+            key: make_key() で生成したキー
+
+        Returns:
+            音声データ（未登録の場合はNone）
+        """
+        audio = self._memory.get(key)
+        if audio is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            self.bytes_saved += len(audio)
+            return audio
+
+        if key in self._disk:
+            audio = await asyncio.to_thread(self._read_disk, key)
+            if audio is not None:
+                self._disk.move_to_end(key)
+                self._remember(key, audio)
+                self.disk_hits += 1
+                self.bytes_saved += len(audio)
+                return audio
+            # 外部から削除された場合は索引からも外す
+            self._disk_bytes -= self._disk.pop(key, 0)
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, audio: bytes) -> None:
+        """
+        合成した音声を登録
+
+        Args:
+            key: make_key() で生成したキー
+            audio: 音声データ
+        """
+        if not audio:
+            return
+
+        self._remember(key, audio)
+
+        if self.cache_dir and key not in self._disk and len(audio) <= self.max_disk_bytes:
+            # 同じ文の並行合成で二重登録しないよう、書き込み前に索引へ追加
+            self._disk[key] = len(audio)
+            self._disk_bytes += len(audio)
+            try:
+                await asyncio.to_thread(self._write_disk, key, audio)
+            except OSError:
+                self._disk_bytes -= self._disk.pop(key, 0)
+                return
+
+            stale = []
+            while self._disk_bytes > self.max_disk_bytes:
+                old_key, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                stale.append(old_key)
+            if stale:
+                self.evictions += len(stale)
+                await asyncio.to_thread(self._remove_disk, stale)
+
+    def _remember(self, key: str, audio: bytes) -> None:
+        """メモリ層に追加し、上限を超えた古いものから破棄"""
+        if len(audio) > self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, old = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.mp3"
+
+    def _load_disk_index(self) -> None:
+        """既存のディスク層を最終アクセス順に索引化"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for path in self.cache_dir.glob("*.mp3"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            audio = path.read_bytes()
+            # 最終アクセス時刻を更新（再起動後のLRU順序に使う）
+            now = time.time()
+            os.utime(path, (now, now))
+            return audio
+        except OSError:
+            return None
+
+    def _write_disk(self, key: str, audio: bytes) -> None:
+        # 書き込み途中のファイルを読まないよう一時ファイルから置き換える
+        path = self._path(key)
+        temp_path = path.with_suffix(".tmp")
+        temp_path.write_bytes(audio)
+        os.replace(temp_path, path)
+
+    def _remove_disk(self, keys) -> None:
+        for key in keys:
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """キャッシュ統計を取得"""
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "evictions": self.evictions,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+            "max_disk_bytes": self.max_disk_bytes
+        }
+
+
+# シングルトンインスタンス
+_tts_cache: Optional[TTSCache] = None
+
+
+def get_tts_cache() -> TTSCache:
+    """TTSCacheのシングルトンインスタンスを取得"""
+    global _tts_cache
+    if _tts_cache is None:
+        _tts_cache = TTSCache(
+            # 空文字でディスク層を無効化
+            cache_dir=os.getenv("TTS_CACHE_DIR", "/tmp/aircon_tts_cache") or None,
+            max_memory_bytes=int(os.getenv("TTS_CACHE_MEMORY_MB", "32")) * 1024 * 1024,
+            max_disk_bytes=int(os.getenv("TTS_CACHE_DISK_MB", "256")) * 1024 * 1024
+        )
+    return _tts_cache
@@ -0,0 +1,153 @@
+"""
+WebSocket音声セッション
+1接続（1作業）の間、機種・作業工程・対話履歴をサーバー側で保持し、
+発話中に届く音声フレームを蓄積する
+"""
+
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from app.core.history import get_history_compactor
+from app.core.prompt_cache import get_prompt_compiler
+from app.core.retrieval import build_reference_context
+from app.data.aircon_manuals import get_manual
+from app.services.conversation_store import Conversation, get_conversation_store
+
+
+# 1発話あたりの音声データ上限（Whisper APIのファイルサイズ上限）
+MAX_UTTERANCE_BYTES = 25 * 1024 * 1024
+
+
+class UtteranceTooLarge(Exception):
+    """発話の音声データが上限を超えた"""
+
+
+class VoiceSession:
+    """WebSocket接続毎の音声チャットセッション"""
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        current_step: Optional[str] = None,
+        audio_format: str = "webm"
+    ):
+        """
+        初期化
+
+        Args:
+            model: エアコン機種名
+            current_step: 現在の作業工程
+            audio_format: クライアントが送信する音声形式（拡張子）
+        """
+        self.model = model
+        self.current_step = current_step
+        self.audio_format = audio_format
+        # 作業案件に紐付くまではこの接続内のみの対話履歴
+        self.conversation = Conversation(uuid.uuid4().hex)
+        self._audio = bytearray()
+
+    @property
+    def history(self) -> List[Dict[str, str]]:
+        """対話履歴"""
+        return self.conversation.messages
+
+    @property
+    def conversation_id(self) -> str:
+        """会話の識別子（対話履歴の要約の識別子）"""
+        return self.conversation.key
+
+    def attach(self, conversation: Conversation) -> None:
+        """
+        作業案件の会話に切り替え（以降の対話は chat_history に保存）
+
+        Args:
+            conversation: ConversationStore.open() で取得した会話
+        """
+        self.conversation = conversation
+
+    def configure(
+        self,
+        model: Optional[str] = None,
+        current_step: Optional[str] = None,
+        audio_format: Optional[str] = None
+    ) -> None:
+        """
+        セッション設定を更新（指定された項目のみ）
+
+        Args:
+            model: エアコン機種名
+            current_step: 現在の作業工程
+            audio_format: 音声形式（拡張子）
+        """
+        if model is not None:
+            self.model = model or None
+        if current_step is not None:
+            self.current_step = current_step or None
+        if audio_format:
+            self.audio_format = audio_format.lstrip(".")
+
+    def append_audio(self, frame: bytes) -> None:
+        """
+        発話中の音声フレームを追加
+
+        Raises:
+            UtteranceTooLarge: 発話の音声データが上限を超えた場合
+        """
+        if len(self._audio) + len(frame) > MAX_UTTERANCE_BYTES:
+            self._audio.clear()
+            raise UtteranceTooLarge("音声データが大きすぎます")
+        self._audio.extend(frame)
+
+    def take_utterance(self) -> bytes:
+        """蓄積した発話の音声データを取り出し、バッファを空にする"""
+        audio = bytes(self._audio)
+        self._audio.clear()
+        return audio
+
+    def discard_utterance(self) -> None:
+        """蓄積中の音声データを破棄"""
+        self._audio.clear()
+
+    @property
+    def utterance_filename(self) -> str:
+        """Whisperに渡すファイル名（拡張子で音声形式を判定させる）"""
+        return f"utterance.{self.audio_format}"
+
+    async def build_messages(self, user_message: str) -> Tuple[List[Dict[str, str]], int]:
+        """
+        現在のセッション状態からメッセージリストを構築
+
+        Args:
+            user_message: 音声認識されたユーザーの発話
+
+        Returns:
+            (OpenAI APIに渡すメッセージリスト, 削減したマニュアルトークン数)
+        """
+        manual_data = get_manual(self.model) if self.model else None
+        compiled = get_prompt_compiler().compile(
+            model=self.model,
+            current_step=self.current_step,
+            manual_data=manual_data
+        )
+
+        # 古い対話は要約に畳み込み、トークン予算内の直近の対話のみを含める
+        messages = [{"role": "system", "content": compiled.text}]
+        messages.extend(get_history_compactor().compact(
+            self.conversation_id, self.history, self.conversation.offset
+        ).messages)
+
+        # 質問に関連するマニュアル抜粋を質問の直前に追加
+        reference = await build_reference_context(
+            user_message,
+            model=self.model if manual_data else None,
+            included_sections=compiled.sections
+        )
+        if reference:
+            messages.append({"role": "system", "content": reference})
+
+        messages.append({"role": "user", "content": user_message})
+        return messages, compiled.manual_tokens_saved
+
+    def add_turn(self, user_message: str, assistant_message: str) -> None:
+        """1往復分の対話を履歴に追加（作業案件の会話は chat_history への書き込みを予約）"""
+        get_conversation_store().add_turn(self.conversation, user_message, assistant_message)
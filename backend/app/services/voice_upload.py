@@ -0,0 +1,194 @@
+"""
+音声アップロードの受信
+multipart/form-data のリクエスト本文をチャンク単位で解析し、音声をメモリ上に受け取る
+（一時ファイルを使わず、サイズ上限を超えた時点で受信を打ち切る）
+"""
+
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from fastapi import Request
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+from pydantic import BaseModel
+
+from app.core import mp3
+from app.core.wav import parse_wav
+
+
+# 音声ファイルのサイズ上限（Whisper APIのファイルサイズ上限）
+MAX_UPLOAD_BYTES = int(os.getenv("VOICE_UPLOAD_MAX_MB", "25")) * 1024 * 1024
+
+# 音声の長さの上限（秒、長さを判定できる形式のみ）
+MAX_AUDIO_SECONDS = float(os.getenv("VOICE_UPLOAD_MAX_SECONDS", "120"))
+
+# 音声以外のフォーム項目（機種名等）のサイズ上限
+MAX_FIELD_BYTES = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    """音声のサイズ・長さが上限を超えた（413）"""
+
+
+class InvalidUpload(Exception):
+    """multipart/form-data として解析できない（400）"""
+
+
+class VoiceUpload(BaseModel):
+    """受信した音声とフォーム項目"""
+    audio: bytes
+    filename: str
+    fields: Dict[str, str]
+    duration: Optional[float] = None
+
+
+def audio_duration(audio: bytes, filename: str) -> Optional[float]:
+    """
+    音声の長さを取得（WAV・MP3のみ、ヘッダー・フレームから計算）
+
+    Args:
+        audio: 音声データ
+        filename: ファイル名（拡張子で形式を判定）
+
+    Returns:
+        長さ（秒、判定できない形式の場合はNone）
+    """
+    suffix = Path(filename).suffix.lower()
+    if suffix == ".wav":
+        info = parse_wav(audio)
+        return info.duration if info else None
+    if suffix == ".mp3":
+        return mp3.duration_seconds(audio) or None
+    return None
+
+
+async def read_voice_upload(
+    request: Request,
+    file_field: str = "audio",
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    max_seconds: float = MAX_AUDIO_SECONDS
+) -> VoiceUpload:
+    """
+    multipart/form-data のリクエスト本文を受信しながら解析
+
+    Args:
+        request: リクエスト
+        file_field: 音声ファイルのフォーム項目名
+        max_bytes: 音声のサイズ上限
+        max_seconds: 音声の長さの上限
+
+    Returns:
+        VoiceUpload
+
+    Raises:
+        UploadTooLarge: サイズ・長さが上限を超えた場合
+        InvalidUpload: multipart/form-data でない、または音声ファイルがない場合
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise InvalidUpload("multipart/form-data で送信してください")
+
+    # Content-Length で明らかに超過する場合は本文を受信せずに拒否
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_bytes + MAX_FIELD_BYTES:
+        raise UploadTooLarge("音声ファイルが大きすぎます")
+
+    collector = _FormCollector(file_field, max_bytes)
+    parser = MultipartParser(boundary, callbacks=collector.callbacks())
+
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                parser.write(chunk)
+        parser.finalize()
+    except MultipartParseError as e:
+        raise InvalidUpload("multipart/form-data の形式が不正です") from e
+
+    if collector.filename is None or not collector.audio:
+        raise InvalidUpload("音声ファイルがありません")
+
+    audio = bytes(collector.audio)
+    duration = audio_duration(audio, collector.filename)
+    if duration is not None and duration > max_seconds:
+        raise UploadTooLarge(f"音声が長すぎます（上限 {max_seconds:.0f} 秒）")
+
+    return VoiceUpload(
+        audio=audio,
+        filename=collector.filename,
+        fields=collector.fields,
+        duration=duration
+    )
+
+
+class _FormCollector:
+    """MultipartParser のコールバックで各パートを受け取る"""
+
+    def __init__(self, file_field: str, max_bytes: int):
+        self.file_field = file_field
+        self.max_bytes = max_bytes
+        self.audio = bytearray()
+        self.filename: Optional[str] = None
+        self.fields: Dict[str, str] = {}
+
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = bytearray()
+        self._header_value = bytearray()
+        self._name: Optional[str] = None
+        self._part_filename: Optional[str] = None
+        self._value = bytearray()
+
+    def callbacks(self) -> Dict[str, Any]:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self) -> None:
+        self._headers = {}
+        self._name = None
+        self._part_filename = None
+        self._value.clear()
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field.extend(data[start:end])
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value.extend(data[start:end])
+
+    def on_header_end(self) -> None:
+        self._headers[bytes(self._header_field).lower()] = bytes(self._header_value)
+        self._header_field.clear()
+        self._header_value.clear()
+
+    def on_headers_finished(self) -> None:
+        _, disposition = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = disposition.get(b"name")
+        filename = disposition.get(b"filename")
+        self._name = name.decode("utf-8", "replace") if name is not None else None
+        self._part_filename = filename.decode("utf-8", "replace") if filename else None
+        if self._name == self.file_field:
+            self.audio.clear()
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        # 受信済みのチャンクから直接追記（中間コピーを作らない）
+        if self._name == self.file_field:
+            if len(self.audio) + (end - start) > self.max_bytes:
+                raise UploadTooLarge("音声ファイルが大きすぎます")
+            self.audio.extend(memoryview(data)[start:end])
+        else:
+            if len(self._value) + (end - start) > MAX_FIELD_BYTES:
+                raise UploadTooLarge("フォーム項目が大きすぎます")
+            self._value.extend(memoryview(data)[start:end])
+
+    def on_part_end(self) -> None:
+        if self._name == self.file_field:
+            self.filename = self._part_filename or f"{self.file_field}.webm"
+        elif self._name is not None:
+            self.fields[self._name] = self._value.decode("utf-8", "replace")
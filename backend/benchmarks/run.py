@@ -0,0 +1,382 @@
+"""
+マイクロベンチマーク
+チャットのリクエスト毎に実行されるCPU処理（プロンプト構築・安全キーワード検出（質問・回答・ストリーミング応答）・マニュアル検索）の
+処理速度（ops/sec、timeit）とメモリ確保量（1回あたりのピーク、tracemalloc）を計測し、
+ベースライン（benchmarks/baseline.json）より閾値を超えて劣化した場合は終了コード1を返す。
+処理速度は同じ実行で計測した校正用の処理（マシン・負荷状況の違いを打ち消す）との比で比較する。
+校正用の処理は数ミリ秒かかる処理をケースの合間に繰り返し計測して中央値を使い、
+劣化したケースは再計測しても劣化した場合のみ報告する。
+実データ（AIRCON_MANUALS）と、機種数を増やした合成カタログ（既定5000機種）で計測する
+
+実行:
+    python -m benchmarks.run                 # ベースラインと比較
+    python -m benchmarks.run --save          # ベースラインを更新
+    python -m benchmarks.run --filter safety # 名前に safety を含むケースのみ
+"""
+
+import argparse
+import copy
+import gc
+import json
+import platform
+import statistics
+import sys
+import timeit
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Collection, Dict, Iterator, List, Optional
+
+from app.core import prompts, safety
+from app.data import aircon_manuals
+
+
+# ベースラインの保存先
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+# 劣化とみなす閾値（ops/sec の低下率・メモリ確保量の増加率）
+SPEED_THRESHOLD = 0.25
+ALLOC_THRESHOLD = 0.10
+
+# 合成カタログの既定の機種数
+DEFAULT_SCALE = 5000
+
+# 計測の繰り返し回数（timeit は最良値、tracemalloc は中央値を使う）
+TIMEIT_REPEAT = 5
+ALLOC_REPEAT = 5
+
+# 校正用の処理の繰り返し回数（1回で数ミリ秒）・1回の校正で計測する回数（最良値を使う）
+CALIBRATION_ROUNDS = 1000
+CALIBRATION_REPEAT = 3
+
+# 作業者の質問（安全キーワードを含むものと含まないもの）
+QUESTIONS = [
+    "室外機を2階のベランダに置く場合、脚立での作業は大丈夫ですか",
+    "真空引きのあとR32を開放するときの注意点は",
+    "ドレンホースの勾配はどのくらい必要ですか",
+    "ブレーカーを落とさずに電源の配線をしても平気ですか",
+]
+
+# AIの回答（安全リマインダーの追加対象）
+RESPONSE = "フレアナットは規定トルクで締め付けてください。2分は14〜18ニュートンメートル、3分は34〜42ニュートンメートルです。"
+
+
+def build_catalogue(scale: int) -> Dict[str, dict]:
+    """
+    実データの機種を複製して、機種数を増やした合成カタログを生成
+
+    Args:
+        scale: 機種数
+
+    Returns:
+        {機種名: マニュアル辞書}
+    """
+    originals = list(aircon_manuals.AIRCON_MANUALS.values())
+    catalogue = {}
+    for index in range(scale):
+        manual = copy.deepcopy(originals[index % len(originals)])
+        model = f"{manual['model']}-S{index:05d}"
+        manual["model"] = model
+        # 症状の文言も機種毎に変え、部分一致検索が全件を走査するようにする
+        if "troubleshooting" in manual:
+            manual["troubleshooting"] = {
+                f"{issue}（{model}）": details for issue, details in manual["troubleshooting"].items()
+            }
+        catalogue[model] = manual
+    return catalogue
+
+
+@contextmanager
+def use_catalogue(catalogue: Dict[str, dict]) -> Iterator[None]:
+    """get_manual / search_troubleshooting が参照するカタログを一時的に差し替える"""
+    original = aircon_manuals.AIRCON_MANUALS
+    aircon_manuals.AIRCON_MANUALS = catalogue
+    try:
+        yield
+    finally:
+        aircon_manuals.AIRCON_MANUALS = original
+
+
+def _chat_history(turns: int) -> List[Dict[str, str]]:
+    history = []
+    for index in range(turns):
+        history.append({"role": "user", "content": QUESTIONS[index % len(QUESTIONS)]})
+        history.append({"role": "assistant", "content": RESPONSE})
+    return history
+
+
+def _round_robin(values: List[Any]) -> Callable[[], Any]:
+    """呼び出し毎に次の値を返す（同じ入力ばかりを計測しない）"""
+    state = {"index": 0}
+
+    def next_value() -> Any:
+        value = values[state["index"] % len(values)]
+        state["index"] += 1
+        return value
+
+    return next_value
+
+
+def calibration_workload() -> int:
+    """校正用の処理（文字列の整形・部分一致・辞書の走査、対象の処理と同種の純Python処理を CALIBRATION_ROUNDS 回）"""
+    manual = aircon_manuals.AIRCON_MANUALS.get("CS-X400D2", {})
+    installation = manual.get("indoor_unit", {}).get("installation", {})
+    total = 0
+    for _ in range(CALIBRATION_ROUNDS):
+        lines = [f"- {key}: {value}" for key, value in installation.items()]
+        total += sum(1 for question in QUESTIONS for word in ("屋根", "電気", "冷媒", "室外機") if word in question)
+        total += len("\n".join(lines))
+    return total
+
+
+def measure_calibration() -> float:
+    """
+    校正用の処理の速度を1回計測
+
+    Returns:
+        1秒あたりの実行回数（CALIBRATION_REPEAT 回のうち最良値）
+    """
+    return 1 / min(timeit.Timer(calibration_workload).repeat(repeat=CALIBRATION_REPEAT, number=1))
+
+
+def build_cases(catalogue_name: str, catalogue: Dict[str, dict]) -> Dict[str, Callable[[], Any]]:
+    """
+    カタログ毎の計測ケースを生成
+
+    Args:
+        catalogue_name: カタログ名（ケース名の接頭辞）
+        catalogue: {機種名: マニュアル辞書}
+
+    Returns:
+        {ケース名: 引数なしで呼び出す関数}
+    """
+    models = list(catalogue)
+    next_model = _round_robin(models)
+    next_question = _round_robin(QUESTIONS)
+    system_prompt = prompts.build_system_prompt(models[0], "配管接続", catalogue[models[0]])
+    history = _chat_history(20)
+    symptoms = [issue for manual in catalogue.values() for issue in manual.get("troubleshooting", {})][:50]
+    next_symptom = _round_robin(symptoms or ["真空度"])
+
+    def system_prompt_case() -> str:
+        model = next_model()
+        return prompts.build_system_prompt(model, "配管接続", catalogue[model])
+
+    def manual_case() -> str:
+        return prompts.format_manual_for_prompt(catalogue[next_model()])
+
+    def chat_prompt_case() -> List[Dict[str, str]]:
+        return prompts.build_chat_prompt(system_prompt, history, next_question(), reference_context=RESPONSE)
+
+    def safety_case() -> List[str]:
+        return prompts.extract_safety_keywords(next_question())
+
+    def safety_response_case() -> List[str]:
+        return safety.detect_safety_categories(next_question(), RESPONSE)
+
+    def safety_stream_case() -> List[str]:
+        stream = safety.get_safety_scanner().stream()
+        for index in range(0, len(RESPONSE), 8):
+            stream.feed(RESPONSE[index:index + 8])
+        stream.finish()
+        return stream.categories
+
+    def reminder_case() -> str:
+        return prompts.add_safety_reminder(RESPONSE, ["高所", "電気", "冷媒"])
+
+    def get_manual_case() -> dict:
+        return aircon_manuals.get_manual(next_model())
+
+    def troubleshooting_case() -> list:
+        return aircon_manuals.search_troubleshooting(next_symptom())
+
+    cases = {
+        "build_system_prompt": system_prompt_case,
+        "format_manual_for_prompt": manual_case,
+        "build_chat_prompt": chat_prompt_case,
+        "extract_safety_keywords": safety_case,
+        "detect_safety_categories": safety_response_case,
+        "safety_stream": safety_stream_case,
+        "add_safety_reminder": reminder_case,
+        "get_manual": get_manual_case,
+        "search_troubleshooting": troubleshooting_case,
+    }
+    return {f"{catalogue_name}/{name}": case for name, case in cases.items()}
+
+
+def measure_speed(func: Callable[[], Any]) -> float:
+    """
+    処理速度を計測
+
+    Returns:
+        ops/sec（繰り返しのうち最良値）
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=TIMEIT_REPEAT, number=number))
+    return number / best
+
+
+def measure_allocation(func: Callable[[], Any]) -> int:
+    """
+    1回の呼び出しで確保するメモリのピークを計測
+
+    Returns:
+        バイト数（繰り返しの中央値）
+    """
+    func()  # 初回のみの確保（キャッシュ等）を除く
+    peaks = []
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for _ in range(ALLOC_REPEAT):
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            func()
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    finally:
+        tracemalloc.stop()
+    return int(statistics.median(peaks))
+
+
+def build_catalogues(scale: int) -> Dict[str, Dict[str, dict]]:
+    """
+    計測に使うカタログを生成
+
+    Args:
+        scale: 合成カタログの機種数
+
+    Returns:
+        {カタログ名: {機種名: マニュアル辞書}}
+    """
+    return {
+        "real": aircon_manuals.AIRCON_MANUALS,
+        f"synthetic-{scale}": build_catalogue(scale),
+    }
+
+
+def run_benchmarks(
+    catalogues: Dict[str, Dict[str, dict]],
+    name_filter: Optional[str] = None,
+    names: Optional[Collection[str]] = None
+) -> Dict[str, Dict[str, float]]:
+    """
+    全ケースを計測
+
+    Args:
+        catalogues: build_catalogues() のカタログ
+        name_filter: ケース名に含む文字列（指定した場合は一致するケースのみ）
+        names: 計測するケース名（再計測用、Noneの場合は全ケース）
+
+    Returns:
+        {ケース名: {"ops_per_sec": ..., "relative_speed": ..., "peak_bytes": ...}}
+    """
+    # 校正用の処理はケースの合間に毎回計測し、中央値を使う（一時的な負荷の影響を抑える）
+    calibrations = [measure_calibration()]
+    results = {}
+    for catalogue_name, catalogue in catalogues.items():
+        with use_catalogue(catalogue):
+            for name, func in build_cases(catalogue_name, catalogue).items():
+                if (name_filter and name_filter not in name) or (names is not None and name not in names):
+                    continue
+                results[name] = {
+                    "ops_per_sec": round(measure_speed(func), 1),
+                    "peak_bytes": measure_allocation(func),
+                }
+                calibrations.append(measure_calibration())
+                print(f"{name:<50}{results[name]['ops_per_sec']:>14,.1f} ops/s{results[name]['peak_bytes']:>12,} B")
+
+    calibration = statistics.median(calibrations)
+    for result in results.values():
+        result["relative_speed"] = round(result["ops_per_sec"] / calibration, 6)
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    speed_threshold: float = SPEED_THRESHOLD,
+    alloc_threshold: float = ALLOC_THRESHOLD
+) -> Dict[str, List[str]]:
+    """
+    ベースラインと比較
+
+    Args:
+        results: 今回の計測結果
+        baseline: ベースラインの計測結果
+        speed_threshold: 劣化とみなす処理速度（校正用の処理との比）の低下率
+        alloc_threshold: 劣化とみなすメモリ確保量の増加率
+
+    Returns:
+        {劣化したケース名: 劣化の説明のリスト}（劣化なしは空の辞書）
+    """
+    regressions: Dict[str, List[str]] = {}
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["relative_speed"] < base["relative_speed"] * (1 - speed_threshold):
+            regressions.setdefault(name, []).append(
+                f"{name}: 処理速度 {result['relative_speed'] / base['relative_speed'] - 1:+.0%} "
+                f"(ops/sec {base['ops_per_sec']:,.1f} → {result['ops_per_sec']:,.1f})"
+            )
+        # 数百バイト程度の揺れは劣化とみなさない
+        if result["peak_bytes"] > max(base["peak_bytes"] * (1 + alloc_threshold), base["peak_bytes"] + 1024):
+            regressions.setdefault(name, []).append(
+                f"{name}: peak {base['peak_bytes']:,} B → {result['peak_bytes']:,} B "
+                f"({result['peak_bytes'] / max(base['peak_bytes'], 1) - 1:+.0%})"
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="プロンプト構築・安全キーワード検出・マニュアル検索のマイクロベンチマーク")
+    parser.add_argument("--scale", type=int, default=DEFAULT_SCALE, help="合成カタログの機種数")
+    parser.add_argument("--filter", help="ケース名に含む文字列")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="ベースラインのJSONファイル")
+    parser.add_argument("--save", action="store_true", help="計測結果をベースラインとして保存")
+    parser.add_argument("--threshold", type=float, default=SPEED_THRESHOLD, help="劣化とみなす ops/sec の低下率")
+    parser.add_argument("--alloc-threshold", type=float, default=ALLOC_THRESHOLD, help="劣化とみなすメモリ確保量の増加率")
+    args = parser.parse_args()
+
+    catalogues = build_catalogues(args.scale)
+    results = run_benchmarks(catalogues, args.filter)
+
+    if args.save:
+        saved = {}
+        if args.baseline.exists():
+            saved = json.loads(args.baseline.read_text(encoding="utf-8")).get("results", {})
+        saved.update(results)
+        args.baseline.write_text(json.dumps({
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": dict(sorted(saved.items()))
+        }, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"\nベースラインを保存しました: {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"\nベースラインがありません（--save で作成）: {args.baseline}")
+        return
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    if baseline.get("python") != platform.python_version():
+        print(f"\n注意: ベースラインは Python {baseline.get('python')} で計測されています")
+    regressions = compare(results, baseline["results"], args.threshold, args.alloc_threshold)
+    if regressions:
+        # 一時的な負荷による揺れを除くため、劣化したケースを再計測して再現した場合のみ報告する
+        print(f"\n{len(regressions)} 件のケースを再計測します")
+        retried = run_benchmarks(catalogues, names=regressions)
+        confirmed = compare(retried, baseline["results"], args.threshold, args.alloc_threshold)
+        regressions = {name: confirmed[name] for name in regressions if name in confirmed}
+    if regressions:
+        print("\n性能が劣化しました:")
+        for descriptions in regressions.values():
+            for regression in descriptions:
+                print(f"  {regression}")
+        sys.exit(1)
+    print("\nベースラインからの劣化はありません")
+
+
+if __name__ == "__main__":
+    main()
@@ -90,6 +90,25 @@ CREATE TABLE chat_history (
     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- API使用量テーブル（呼び出し毎のトークン数・音声の長さ・読み上げ文字数・応答時間）
+-- 作業者・作業案件の削除後も集計できるよう外部キーにしない
+CREATE TABLE usage_records (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    request_id UUID NOT NULL,
+    worker_id UUID,
+    work_order_id UUID,
+    endpoint VARCHAR(100),
+    kind VARCHAR(20) NOT NULL, -- whisper/chat/tts/embedding/summary
+    model VARCHAR(100) NOT NULL,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    audio_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    tts_characters INTEGER NOT NULL DEFAULT 0,
+    latency_ms DOUBLE PRECISION NOT NULL DEFAULT 0,
+    cached BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
 -- インデックス作成
 CREATE INDEX idx_work_orders_worker_id ON work_orders(worker_id);
 CREATE INDEX idx_work_orders_status ON work_orders(status);
@@ -99,6 +118,9 @@ CREATE INDEX idx_work_photos_work_report_id ON work_photos(work_report_id);
 CREATE INDEX idx_used_materials_work_report_id ON used_materials(work_report_id);
 CREATE INDEX idx_work_steps_work_report_id ON work_steps(work_report_id);
 CREATE INDEX idx_chat_history_work_order_id ON chat_history(work_order_id);
+CREATE INDEX idx_usage_records_worker_id ON usage_records(worker_id);
+CREATE INDEX idx_usage_records_work_order_id ON usage_records(work_order_id);
+CREATE INDEX idx_usage_records_created_at ON usage_records(created_at);
 
 -- 更新日時の自動更新トリガー
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -0,0 +1,483 @@
+"""
+エンドツーエンド負荷試験
+仮想の作業者（同時接続ユーザー）がテキスト・音声・WebSocket・作業案件付きの対話を混ぜて送り、
+エンドポイント毎・処理段階毎の応答時間（p50/p95/p99）とスループットを集計する。
+API料金をかけずに試験する場合は tools/mock_openai.py を接続先にしたバックエンドに対して実行する
+
+実行例（要件定義 5.1: 同時接続100名、音声認識1秒以内、回答生成3秒以内）:
+    python -m tools.mock_openai --port 9000 &
+    OPENAI_BASE_URL=http://localhost:9000/v1 OPENAI_API_KEY=mock uvicorn app.main:app --port 8000 &
+    python -m tools.loadtest --users 100 --duration 60 --mock-url http://localhost:9000
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import random
+import sys
+import time
+import uuid
+import wave
+from collections import defaultdict
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+try:
+    import websockets
+except ImportError:  # uvicorn[standard] に含まれる
+    websockets = None
+
+
+# 既定のシナリオの比率
+DEFAULT_MIX = "text=4,text_stream=2,voice=2,voice_stream=1,voice_ws=1"
+
+# 作業者の質問（回答キャッシュを使う場合はヒット率に影響）
+QUESTIONS = [
+    "フレアナットの締付トルクを教えてください",
+    "真空引きはどのくらいの時間が必要ですか",
+    "室内機の取付位置の注意点は",
+    "ドレンホースの勾配はどうすればいいですか",
+    "配管の曲げ半径の目安は",
+    "アース工事は必要ですか",
+]
+
+MODELS = ["CS-X400D2", "AN40ZRP", "MSZ-ZW4022S"]
+STEPS = ["室内機設置", "配管接続", "真空引き", "試運転"]
+
+# 要件定義 5.1 の性能目標（p95、秒）
+SLO_SECONDS = {
+    "transcript": 1.0,    # 音声認識の応答時間
+    "llm": 3.0,           # 回答生成時間（テキストは応答全体、ストリーミングは最初のトークン）
+}
+
+
+class Recorder:
+    """エンドポイント・処理段階毎の応答時間とエラーを記録"""
+
+    def __init__(self):
+        self.samples: Dict[Tuple[str, str], List[float]] = defaultdict(list)
+        self.completed: Dict[str, int] = defaultdict(int)
+        self.errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def stage(self, endpoint: str, stage: str, seconds: float) -> None:
+        self.samples[(endpoint, stage)].append(seconds)
+
+    def success(self, endpoint: str) -> None:
+        self.completed[endpoint] += 1
+
+    def error(self, endpoint: str, reason: str) -> None:
+        self.errors[endpoint][reason] += 1
+
+
+def percentile(values: List[float], q: float) -> float:
+    """パーセンタイル（最近順位法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(int(np.ceil(q / 100 * len(ordered))) - 1, 0)
+    return ordered[index]
+
+
+def synthesize_wav(speech_seconds: float = 1.5, silence_seconds: float = 0.5, sample_rate: int = 16000) -> bytes:
+    """
+    試験用の発話音声（前後に無音を含むWAV）を生成
+
+    Args:
+        speech_seconds: 発話（音声区間）の長さ
+        silence_seconds: 前後の無音の長さ
+        sample_rate: サンプリング周波数
+
+    Returns:
+        WAV（16bit・モノラル）
+    """
+    rng = np.random.default_rng(0)
+    t = np.arange(int(speech_seconds * sample_rate)) / sample_rate
+    speech = 0.3 * np.sin(2 * np.pi * 220 * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 3 * t))
+    silence = 0.001 * rng.standard_normal(int(silence_seconds * sample_rate))
+    samples = np.concatenate([silence, speech, silence])
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes((samples * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+class LoadTest:
+    """仮想の作業者による負荷試験"""
+
+    def __init__(self, args: argparse.Namespace, audio: bytes):
+        self.args = args
+        self.audio = audio
+        self.recorder = Recorder()
+        self.base_url = args.base_url.rstrip("/")
+        self.mix = _parse_mix(args.mix)
+        self.work_orders: List[str] = []
+
+        headers = {} if args.use_answer_cache else {"X-Answer-Cache": "bypass"}
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=headers,
+            timeout=args.timeout,
+            limits=httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users)
+        )
+
+    async def prepare_work_orders(self) -> None:
+        """作業案件付きの対話に使う作業案件を用意（不足分は作成、DBに接続できない場合は作業案件なしで続行）"""
+        if not self.args.work_orders:
+            return
+        try:
+            response = await self.client.get("/api/v1/work-orders/", params={"limit": self.args.work_orders})
+            response.raise_for_status()
+            self.work_orders = [order["id"] for order in response.json()][:self.args.work_orders]
+            while len(self.work_orders) < self.args.work_orders:
+                response = await self.client.post("/api/v1/work-orders/", json={
+                    "customer_name": f"負荷試験 {len(self.work_orders) + 1}",
+                    "address": "東京都千代田区",
+                    "model": random.choice(MODELS),
+                    "scheduled_date": date.today().isoformat()
+                })
+                response.raise_for_status()
+                self.work_orders.append(response.json()["id"])
+        except httpx.HTTPError as e:
+            print(f"作業案件を用意できないため、作業案件なしで実行します: {e}", file=sys.stderr)
+            self.work_orders = []
+
+    async def run(self) -> float:
+        """
+        仮想の作業者を起動し、試験時間が過ぎるまで実行
+
+        Returns:
+            経過時間（秒）
+        """
+        await self.prepare_work_orders()
+        started = time.monotonic()
+        deadline = started + self.args.ramp_up + self.args.duration
+        users = [
+            asyncio.create_task(self.user(index, started + self.args.ramp_up * index / self.args.users, deadline))
+            for index in range(self.args.users)
+        ]
+        await asyncio.gather(*users)
+        return time.monotonic() - started
+
+    async def user(self, index: int, start_at: float, deadline: float) -> None:
+        """1人の作業者（考える時間を挟んでシナリオを繰り返す）"""
+        rng = random.Random(index)
+        await asyncio.sleep(max(start_at - time.monotonic(), 0.0))
+
+        worker_id = str(uuid.uuid4())
+        work_order_id = None
+        if self.work_orders and rng.random() < self.args.work_order_ratio:
+            work_order_id = self.work_orders[index % len(self.work_orders)]
+        scenarios, weights = zip(*self.mix.items())
+
+        while time.monotonic() < deadline:
+            scenario = rng.choices(scenarios, weights)[0]
+            context = {
+                "worker_id": worker_id,
+                "work_order_id": work_order_id,
+                "model": rng.choice(MODELS),
+                "current_step": rng.choice(STEPS),
+                "message": rng.choice(QUESTIONS),
+            }
+            endpoint = scenario + ("+work_order" if work_order_id else "")
+            try:
+                await getattr(self, f"scenario_{scenario}")(endpoint, context)
+                self.recorder.success(endpoint)
+            except httpx.HTTPStatusError as e:
+                self.recorder.error(endpoint, str(e.response.status_code))
+            except Exception as e:
+                self.recorder.error(endpoint, type(e).__name__)
+            await asyncio.sleep(rng.expovariate(1 / self.args.think_time) if self.args.think_time else 0.0)
+
+    def _voice_form(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        form = {"model": context["model"], "current_step": context["current_step"]}
+        if context["work_order_id"]:
+            form["work_order_id"] = context["work_order_id"]
+        return {"data": form, "files": {"audio": ("utterance.wav", self.audio, "audio/wav")}}
+
+    async def scenario_text(self, endpoint: str, context: Dict[str, Any]) -> None:
+        """テキストチャット（応答全体）"""
+        started = time.monotonic()
+        response = await self.client.post(
+            "/api/v1/chat/text",
+            json=_text_request(context),
+            headers={"X-Worker-Id": context["worker_id"]}
+        )
+        response.raise_for_status()
+        self.recorder.stage(endpoint, "total", time.monotonic() - started)
+
+    async def scenario_text_stream(self, endpoint: str, context: Dict[str, Any]) -> None:
+        """テキストチャット（SSE、最初のトークン・完了）"""
+        started = time.monotonic()
+        first_token = None
+        event = None
+        async with self.client.stream(
+            "POST",
+            "/api/v1/chat/text/stream",
+            json=_text_request(context),
+            headers={"X-Worker-Id": context["worker_id"]}
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                    if event == "token" and first_token is None:
+                        first_token = time.monotonic() - started
+                    elif event == "error":
+                        raise RuntimeError("stream error")
+        if event != "done":
+            raise RuntimeError("stream incomplete")
+        self.recorder.stage(endpoint, "first_token", first_token or 0.0)
+        self.recorder.stage(endpoint, "total", time.monotonic() - started)
+
+    async def scenario_voice(self, endpoint: str, context: Dict[str, Any]) -> None:
+        """音声チャット（応答全体・応答音声の取得）"""
+        started = time.monotonic()
+        response = await self.client.post(
+            "/api/v1/chat/voice",
+            headers={"X-Worker-Id": context["worker_id"]},
+            **self._voice_form(context)
+        )
+        response.raise_for_status()
+        self.recorder.stage(endpoint, "total", time.monotonic() - started)
+
+        fetch_started = time.monotonic()
+        audio = await self.client.get(response.json()["audio_url"])
+        audio.raise_for_status()
+        self.recorder.stage(endpoint, "audio_fetch", time.monotonic() - fetch_started)
+
+    async def scenario_voice_stream(self, endpoint: str, context: Dict[str, Any]) -> None:
+        """音声チャット（パイプライン、音声認識結果・最初の音声・完了）"""
+        started = time.monotonic()
+        async with self.client.stream(
+            "POST",
+            "/api/v1/chat/voice/stream",
+            headers={"X-Worker-Id": context["worker_id"]},
+            **self._voice_form(context)
+        ) as response:
+            response.raise_for_status()
+            # レスポンスヘッダーは音声認識の完了後に返る
+            self.recorder.stage(endpoint, "transcript", time.monotonic() - started)
+            first_audio = None
+            async for chunk in response.aiter_bytes():
+                if chunk and first_audio is None:
+                    first_audio = time.monotonic() - started
+        self.recorder.stage(endpoint, "first_audio", first_audio or 0.0)
+        self.recorder.stage(endpoint, "total", time.monotonic() - started)
+
+    async def scenario_voice_ws(self, endpoint: str, context: Dict[str, Any]) -> None:
+        """音声チャットセッション（WebSocket、音声認識結果・最初の応答音声・完了）"""
+        if websockets is None:
+            raise RuntimeError("websockets is not installed")
+
+        params = {"worker_id": context["worker_id"]}
+        if context["work_order_id"]:
+            params["work_order_id"] = context["work_order_id"]
+        url = httpx.URL(self.base_url.replace("http", "ws", 1) + "/api/v1/chat/voice/ws", params=params)
+
+        async with websockets.connect(str(url), max_size=None) as ws:
+            await asyncio.wait_for(ws.recv(), self.args.timeout)  # ready
+            await ws.send(json.dumps({
+                "type": "start",
+                "model": context["model"],
+                "current_step": context["current_step"],
+                "format": "wav"
+            }))
+            started = time.monotonic()
+            await ws.send(self.audio)
+            await ws.send(json.dumps({"type": "end"}))
+
+            first_audio = None
+            while True:
+                message = await asyncio.wait_for(ws.recv(), self.args.timeout)
+                if isinstance(message, bytes):
+                    continue
+                data = json.loads(message)
+                if data["type"] == "transcript":
+                    self.recorder.stage(endpoint, "transcript", time.monotonic() - started)
+                elif data["type"] == "audio" and not data.get("filler") and first_audio is None:
+                    first_audio = time.monotonic() - started
+                elif data["type"] == "done":
+                    break
+                elif data["type"] == "error":
+                    raise RuntimeError(data.get("detail"))
+        self.recorder.stage(endpoint, "first_audio", first_audio or 0.0)
+        self.recorder.stage(endpoint, "total", time.monotonic() - started)
+
+    async def fetch_json(self, url: str) -> Optional[Dict[str, Any]]:
+        """統計情報を取得（取得できない場合はNone）"""
+        try:
+            response = await self.client.get(url)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError:
+            return None
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def _text_request(context: Dict[str, Any]) -> Dict[str, Any]:
+    request = {"message": context["message"], "model": context["model"], "current_step": context["current_step"]}
+    if context["work_order_id"]:
+        request["work_order_id"] = context["work_order_id"]
+    return request
+
+
+def _parse_mix(value: str) -> Dict[str, float]:
+    """「シナリオ=比率,...」形式のシナリオの比率を解析"""
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if not hasattr(LoadTest, f"scenario_{name}"):
+            raise SystemExit(f"不明なシナリオです: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def build_report(recorder: Recorder, elapsed: float, max_error_rate: float) -> Dict[str, Any]:
+    """
+    エンドポイント・処理段階毎の集計
+
+    Args:
+        recorder: 記録
+        elapsed: 経過時間（秒）
+        max_error_rate: 許容するエラー率
+
+    Returns:
+        {"endpoints": {エンドポイント: {...}}, "slo": {...}}
+    """
+    endpoints: Dict[str, Any] = {}
+    for endpoint in sorted(set(recorder.completed) | set(recorder.errors)):
+        completed = recorder.completed.get(endpoint, 0)
+        errors = dict(recorder.errors.get(endpoint, {}))
+        total = completed + sum(errors.values())
+        stages = {
+            stage: {
+                "count": len(values),
+                "p50": round(percentile(values, 50), 3),
+                "p95": round(percentile(values, 95), 3),
+                "p99": round(percentile(values, 99), 3),
+                "max": round(max(values), 3)
+            }
+            for (name, stage), values in sorted(recorder.samples.items())
+            if name == endpoint
+        }
+        endpoints[endpoint] = {
+            "requests": total,
+            "throughput_rps": round(completed / elapsed, 2) if elapsed else 0.0,
+            "error_rate": round(sum(errors.values()) / total, 4) if total else 0.0,
+            "errors": errors,
+            "stages": stages
+        }
+
+    # 要件定義 5.1 の性能目標（全エンドポイントの該当段階をまとめて判定）
+    def stage_p95(stage: str, scenarios: Tuple[str, ...]) -> Optional[float]:
+        values = [
+            value
+            for (endpoint, name), samples in recorder.samples.items()
+            if name == stage and endpoint.split("+")[0] in scenarios
+            for value in samples
+        ]
+        return round(percentile(values, 95), 3) if values else None
+
+    requests = sum(item["requests"] for item in endpoints.values())
+    failed = sum(sum(item["errors"].values()) for item in endpoints.values())
+    checks = {
+        "transcript_p95": (stage_p95("transcript", ("voice_stream", "voice_ws")), SLO_SECONDS["transcript"]),
+        "llm_total_p95": (stage_p95("total", ("text",)), SLO_SECONDS["llm"]),
+        "llm_first_token_p95": (stage_p95("first_token", ("text_stream",)), SLO_SECONDS["llm"]),
+    }
+    slo = {
+        name: {"p95": value, "target": target, "ok": value is None or value <= target}
+        for name, (value, target) in checks.items()
+    }
+    error_rate = round(failed / requests, 4) if requests else 0.0
+    slo["error_rate"] = {"value": error_rate, "target": max_error_rate, "ok": error_rate <= max_error_rate}
+    return {"elapsed_seconds": round(elapsed, 1), "endpoints": endpoints, "slo": slo}
+
+
+def print_report(report: Dict[str, Any], users: int) -> bool:
+    """
+    集計結果を表示
+
+    Returns:
+        性能目標を満たしたか
+    """
+    print(f"\n同時接続 {users} ユーザー / {report['elapsed_seconds']} 秒")
+    print(f"{'エンドポイント':<26}{'段階':<13}{'件数':>7}{'p50':>8}{'p95':>8}{'p99':>8}{'rps':>8}{'エラー率':>9}")
+    for endpoint, item in report["endpoints"].items():
+        print(f"{endpoint:<26}{'':<13}{item['requests']:>7}{'':>24}{item['throughput_rps']:>8.2f}{item['error_rate']:>9.2%}")
+        for stage, values in item["stages"].items():
+            print(
+                f"{'':<26}{stage:<13}{values['count']:>7}"
+                f"{values['p50']:>8.3f}{values['p95']:>8.3f}{values['p99']:>8.3f}"
+            )
+        if item["errors"]:
+            print(f"{'':<26}errors: {item['errors']}")
+
+    print("\n性能目標（要件定義 5.1）")
+    for name, check in report["slo"].items():
+        value = check.get("p95", check.get("value"))
+        mark = "OK" if check["ok"] else "NG"
+        print(f"  [{mark}] {name}: {value if value is not None else '-'} (目標 {check['target']})")
+    return all(check["ok"] for check in report["slo"].values())
+
+
+async def main_async(args: argparse.Namespace) -> int:
+    if args.audio:
+        with open(args.audio, "rb") as f:
+            audio = f.read()
+    else:
+        audio = synthesize_wav()
+
+    test = LoadTest(args, audio)
+    try:
+        elapsed = await test.run()
+        report = build_report(test.recorder, elapsed, args.max_error_rate)
+        report["server_stats"] = await test.fetch_json("/api/v1/chat/stats")
+        if args.mock_url:
+            report["mock_stats"] = await test.fetch_json(args.mock_url.rstrip("/") + "/mock/stats")
+    finally:
+        await test.close()
+
+    ok = print_report(report, args.users)
+    if report.get("mock_stats"):
+        print(f"\n代替サーバー: {report['mock_stats']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0 if ok else 1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="エンドツーエンド負荷試験")
+    parser.add_argument("--base-url", default="http://localhost:8000", help="バックエンドのURL")
+    parser.add_argument("--users", type=int, default=100, help="同時接続ユーザー数")
+    parser.add_argument("--duration", type=float, default=60.0, help="試験時間（秒、立ち上げ時間を除く）")
+    parser.add_argument("--ramp-up", type=float, default=10.0, help="全ユーザーが揃うまでの時間（秒）")
+    parser.add_argument("--think-time", type=float, default=2.0, help="リクエスト間の平均待ち時間（秒、指数分布）")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"シナリオの比率（既定: {DEFAULT_MIX}）")
+    parser.add_argument("--work-orders", type=int, default=10, help="作業案件付きの対話に使う作業案件数（0で無効）")
+    parser.add_argument("--work-order-ratio", type=float, default=0.5, help="作業案件に紐付くユーザーの割合")
+    parser.add_argument("--use-answer-cache", action="store_true", help="回答キャッシュを使う（既定は bypass）")
+    parser.add_argument("--audio", help="送信する音声ファイル（省略時は合成したWAV）")
+    parser.add_argument("--timeout", type=float, default=30.0, help="1リクエストのタイムアウト（秒）")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="許容するエラー率")
+    parser.add_argument("--mock-url", help="tools/mock_openai.py のURL（呼び出し数を表示）")
+    parser.add_argument("--output", help="集計結果の JSON ファイル")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
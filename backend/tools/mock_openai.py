@@ -0,0 +1,335 @@
+"""
+OpenAI API のローカル代替サーバー（負荷試験用）
+Chat Completions（ストリーミング含む）・音声認識・音声合成・埋め込みを、設定した応答時間の分布で返す。
+一定割合で 429 を返し、流量制御・切り替えの動作も確認できる（API料金はかからない）
+
+起動:
+    python -m tools.mock_openai --port 9000 --chat-latency 0.8:2.5 --rate-limit-ratio 0.02
+
+バックエンドの接続先を切り替え:
+    OPENAI_BASE_URL=http://localhost:9000/v1 OPENAI_API_KEY=mock uvicorn app.main:app
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+
+from app.core.wav import parse_wav
+
+
+# 既定の応答（--responses で JSON ファイルを指定すると置き換え）
+DEFAULT_RESPONSES: Dict[str, List[str]] = {
+    "chat": [
+        "フレアナットの締付トルクは、2分管（1/4インチ）で14〜18N・m、3分管（3/8インチ）で34〜42N・mです。トルクレンチを使用し、締め過ぎに注意してください。",
+        "真空引きは-0.1MPa（-76cmHg）に到達してから15分以上継続してください。その後バルブを閉じて5分間放置し、圧力が戻らないことを確認します。",
+        "室内機は天井から5cm以上、左右の壁から5cm以上離して取り付けてください。据付板は水平器で水平を確認してから固定します。",
+        "ドレンホースは下り勾配を確保し、途中で立ち上がりや波打ちがないようにしてください。接続部はテープで確実に固定します。",
+    ],
+    "transcripts": [
+        "フレアナットの締付トルクを教えてください",
+        "真空引きはどのくらいの時間が必要ですか",
+        "室内機の取付位置の注意点は",
+        "ドレンホースの勾配はどうすればいいですか",
+    ],
+}
+
+# 埋め込みの次元数（text-embedding-3-small）
+EMBEDDING_DIMENSIONS = 1536
+
+# ストリーミング応答の1チャンクの文字数
+STREAM_CHUNK_CHARS = 4
+
+# 音声合成の1文字あたりの再生時間（秒）・MP3フレーム（MPEG1 Layer3 128kbps 44.1kHz）
+TTS_SECONDS_PER_CHAR = 0.15
+MP3_FRAME_SECONDS = 1152 / 44100
+MP3_FRAME = b"\xff\xfb\x90\x64" + b"\x00" * 413
+
+# 標準正規分布の95パーセンタイル（p95 から対数正規分布の広がりを求める）
+Z_95 = 1.6449
+
+
+class LatencyProfile(BaseModel):
+    """応答時間の分布（対数正規分布、中央値とp95で指定）"""
+    median: float
+    p95: float
+
+    @classmethod
+    def parse(cls, value: str) -> "LatencyProfile":
+        """「中央値:p95」（秒）形式の文字列から生成（p95 省略時は中央値と同じ＝固定値）"""
+        median, _, p95 = value.partition(":")
+        return cls(median=float(median), p95=float(p95 or median))
+
+    def sample(self, rng: random.Random) -> float:
+        """応答時間を1つ生成（秒）"""
+        if self.median <= 0:
+            return 0.0
+        sigma = math.log(max(self.p95, self.median) / self.median) / Z_95
+        return rng.lognormvariate(math.log(self.median), sigma)
+
+
+class MockConfig(BaseModel):
+    """代替サーバーの設定"""
+    chat_latency: LatencyProfile = LatencyProfile(median=0.8, p95=2.0)  # 応答全体（ストリーミングは最初のチャンクまで）
+    chat_chunk_interval: float = 0.02                                  # ストリーミングのチャンク間隔（秒）
+    whisper_latency: LatencyProfile = LatencyProfile(median=0.5, p95=1.0)
+    tts_latency: LatencyProfile = LatencyProfile(median=0.3, p95=0.8)
+    embedding_latency: LatencyProfile = LatencyProfile(median=0.1, p95=0.3)
+    rate_limit_ratio: float = 0.0                                      # 429 を返す割合
+    retry_after: float = 1.0                                           # 429 の Retry-After（秒）
+    responses: Dict[str, List[str]] = DEFAULT_RESPONSES
+    seed: Optional[int] = None
+
+
+class MockStats:
+    """エンドポイント毎の呼び出し数"""
+
+    def __init__(self):
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.rate_limited: Dict[str, int] = defaultdict(int)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.started_at = time.monotonic()
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started_at
+        return {
+            "calls": dict(self.calls),
+            "rate_limited": dict(self.rate_limited),
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "requests_per_second": round(sum(self.calls.values()) / elapsed, 2) if elapsed else 0.0
+        }
+
+
+def _rate_limit_error(config: MockConfig) -> JSONResponse:
+    """OpenAI と同じ形式の 429 応答"""
+    return JSONResponse(
+        status_code=429,
+        content={
+            "error": {
+                "message": "Rate limit reached for requests (mock)",
+                "type": "requests",
+                "param": None,
+                "code": "rate_limit_exceeded"
+            }
+        },
+        headers={
+            "retry-after": str(config.retry_after),
+            "x-ratelimit-reset-requests": f"{config.retry_after}s"
+        }
+    )
+
+
+def _estimate_tokens(text: str) -> int:
+    """トークン数の概算（日本語は1文字あたり約1トークン）"""
+    return max(len(text), 1)
+
+
+def _pick(rng: random.Random, candidates: List[str], seed_text: str = "") -> str:
+    """応答を選ぶ（同じ入力には同じ応答を返す）"""
+    if seed_text:
+        index = int(hashlib.sha256(seed_text.encode("utf-8")).hexdigest(), 16) % len(candidates)
+        return candidates[index]
+    return rng.choice(candidates)
+
+
+def create_app(config: Optional[MockConfig] = None) -> FastAPI:
+    """
+    代替サーバーのアプリケーションを生成
+
+    Args:
+        config: 設定（省略時は既定値）
+
+    Returns:
+        FastAPI アプリケーション
+    """
+    config = config or MockConfig()
+    rng = random.Random(config.seed)
+    stats = MockStats()
+    app = FastAPI(title="Mock OpenAI API")
+
+    async def admit(endpoint: str, latency: LatencyProfile) -> Optional[JSONResponse]:
+        """呼び出しを記録して応答時間分待つ（429 を返す場合はその応答）"""
+        stats.calls[endpoint] += 1
+        if rng.random() < config.rate_limit_ratio:
+            stats.rate_limited[endpoint] += 1
+            return _rate_limit_error(config)
+        stats.in_flight += 1
+        stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+        try:
+            await asyncio.sleep(latency.sample(rng))
+        finally:
+            stats.in_flight -= 1
+        return None
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        question = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        answer = _pick(rng, config.responses["chat"], question)
+        prompt_tokens = sum(_estimate_tokens(str(m.get("content", ""))) for m in messages)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": _estimate_tokens(answer),
+            "total_tokens": prompt_tokens + _estimate_tokens(answer)
+        }
+        completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+        model = body.get("model", "gpt-4o")
+
+        rejected = await admit("chat", config.chat_latency)
+        if rejected is not None:
+            return rejected
+
+        if not body.get("stream"):
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": answer},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            }
+
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+        async def events() -> AsyncIterator[str]:
+            def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra: Any) -> str:
+                payload = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else [],
+                    **extra
+                }
+                return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+            yield chunk({"role": "assistant", "content": ""})
+            for start in range(0, len(answer), STREAM_CHUNK_CHARS):
+                yield chunk({"content": answer[start:start + STREAM_CHUNK_CHARS]})
+                await asyncio.sleep(config.chat_chunk_interval)
+            yield chunk({}, "stop")
+            if include_usage:
+                yield chunk(None, usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/audio/transcriptions")
+    async def transcriptions(request: Request):
+        form = await request.form()
+        upload = form.get("file")
+        audio = await upload.read() if upload is not None and hasattr(upload, "read") else b""
+        info = parse_wav(audio)
+        # WAV以外（webm 等）は 16kHz・16bit・モノラル相当として長さを見積もる
+        duration = info.duration if info else len(audio) / 32000
+
+        rejected = await admit("whisper", config.whisper_latency)
+        if rejected is not None:
+            return rejected
+
+        text = _pick(rng, config.responses["transcripts"])
+        if form.get("response_format") == "verbose_json":
+            return {"task": "transcribe", "language": "japanese", "duration": round(duration, 2), "text": text, "segments": []}
+        return {"text": text}
+
+    @app.post("/v1/audio/speech")
+    async def speech(request: Request):
+        body = await request.json()
+        text = body.get("input", "")
+
+        rejected = await admit("tts", config.tts_latency)
+        if rejected is not None:
+            return rejected
+
+        frames = max(int(len(text) * TTS_SECONDS_PER_CHAR / MP3_FRAME_SECONDS), 1)
+        return Response(content=MP3_FRAME * frames, media_type="audio/mpeg")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+
+        rejected = await admit("embedding", config.embedding_latency)
+        if rejected is not None:
+            return rejected
+
+        data = []
+        for index, text in enumerate(inputs):
+            # 同じ入力には同じベクトルを返す（類似度検索の結果を安定させる）
+            seed = int(hashlib.sha256(str(text).encode("utf-8")).hexdigest()[:8], 16)
+            vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIMENSIONS)
+            vector /= np.linalg.norm(vector)
+            data.append({"object": "embedding", "index": index, "embedding": vector.round(6).tolist()})
+
+        tokens = sum(_estimate_tokens(str(text)) for text in inputs)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "text-embedding-3-small"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        }
+
+    @app.get("/mock/stats")
+    async def get_stats():
+        return stats.to_dict()
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OpenAI API のローカル代替サーバー（負荷試験用）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--chat-latency", default="0.8:2.0", help="応答生成の応答時間「中央値:p95」（秒、ストリーミングは最初のチャンクまで）")
+    parser.add_argument("--chat-chunk-interval", type=float, default=0.02, help="ストリーミングのチャンク間隔（秒）")
+    parser.add_argument("--whisper-latency", default="0.5:1.0", help="音声認識の応答時間「中央値:p95」（秒）")
+    parser.add_argument("--tts-latency", default="0.3:0.8", help="音声合成の応答時間「中央値:p95」（秒）")
+    parser.add_argument("--embedding-latency", default="0.1:0.3", help="埋め込みの応答時間「中央値:p95」（秒）")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="429 を返す割合（0〜1）")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429 の Retry-After（秒）")
+    parser.add_argument("--responses", help="応答の JSON ファイル（{\"chat\": [...], \"transcripts\": [...]}）")
+    parser.add_argument("--seed", type=int, help="乱数のシード（応答時間・429 を再現する）")
+    args = parser.parse_args()
+
+    responses = dict(DEFAULT_RESPONSES)
+    if args.responses:
+        with open(args.responses, encoding="utf-8") as f:
+            responses.update(json.load(f))
+
+    config = MockConfig(
+        chat_latency=LatencyProfile.parse(args.chat_latency),
+        chat_chunk_interval=args.chat_chunk_interval,
+        whisper_latency=LatencyProfile.parse(args.whisper_latency),
+        tts_latency=LatencyProfile.parse(args.tts_latency),
+        embedding_latency=LatencyProfile.parse(args.embedding_latency),
+        rate_limit_ratio=args.rate_limit_ratio,
+        retry_after=args.retry_after,
+        responses=responses,
+        seed=args.seed
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,9 @@ import { useChatStore } from '../stores/chatStore';
 import { useWorkStore } from '../stores/workStore';
 import { chatApi } from '../services/api';
 
+// 登録済み（サーバー側に存在する）作業案件IDの形式
+const UUID_PATTERN = /^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$/i;
+
 export function ChatPage() {
   const [inputText, setInputText] = useState('');
   const [isRecording, setIsRecording] = useState(false);
@@ -24,11 +27,13 @@ export function ChatPage() {
 
   const {
     messages,
+    conversationId,
     currentModel,
     currentStep,
     isLoading,
     error,
     addMessage,
+    appendToLastMessage,
     setLoading,
     setError,
   } = useChatStore();
@@ -42,6 +47,10 @@ export function ChatPage() {
     }
   }, [currentWorkOrder, workOrders, setCurrentWorkOrder]);
 
+  // 登録済みの作業案件（UUID）では対話履歴をサーバー側で保持し、新しいメッセージのみ送信する
+  const workOrderId =
+    currentWorkOrder && UUID_PATTERN.test(currentWorkOrder.id) ? currentWorkOrder.id : undefined;
+
   // Auto scroll to bottom
   const scrollToBottom = (smooth = true) => {
     messagesEndRef.current?.scrollIntoView({
@@ -78,18 +87,43 @@ export function ChatPage() {
     setError(null);
 
     try {
-      const response = await chatApi.sendTextMessage({
-        message: inputText,
-        model: currentModel || currentWorkOrder?.model,
-        current_step: currentStep || undefined,
-        chat_history: messages,
-      });
-
-      addMessage({ role: 'assistant', content: response.reply });
+      let started = false;
+      const startReply = () => {
+        // 最初のトークン到着時に応答メッセージを表示
+        if (!started) {
+          started = true;
+          addMessage({ role: 'assistant', content: '' });
+          setLoading(false);
+        }
+      };
 
-      if (response.safety_warnings && response.safety_warnings.length > 0) {
-        console.warn('Safety warnings:', response.safety_warnings);
-      }
+      await chatApi.streamTextMessage(
+        {
+          message: inputText,
+          model: currentModel || currentWorkOrder?.model,
+          current_step: currentStep || undefined,
+          work_order_id: workOrderId,
+          chat_history: workOrderId ? undefined : messages,
+          conversation_id: workOrderId ? undefined : conversationId,
+        },
+        {
+          onSafety: (safetyWarnings) => {
+            if (safetyWarnings.length > 0) {
+              console.warn('Safety warnings:', safetyWarnings);
+            }
+          },
+          onToken: (content) => {
+            startReply();
+            appendToLastMessage(content);
+          },
+          onDone: (done) => {
+            startReply();
+            if (done.reminder) {
+              appendToLastMessage(done.reminder);
+            }
+          },
+        }
+      );
     } catch (err: any) {
       setError(err.message || '送信に失敗しました');
     } finally {
@@ -137,7 +171,8 @@ export function ChatPage() {
       const response = await chatApi.sendVoiceMessage(
         audioBlob,
         currentModel || currentWorkOrder?.model,
-        currentStep || undefined
+        currentStep || undefined,
+        workOrderId
       );
 
       addMessage({ role: 'user', content: response.transcript });
@@ -6,6 +6,7 @@ import axios from 'axios';
 import type {
   TextChatRequest,
   TextChatResponse,
+  TextChatStreamHandlers,
   VoiceChatResponse,
   AirconModel,
   WorkOrder,
@@ -52,18 +53,72 @@ export const chatApi = {
     return response.data;
   },
 
+  /**
+   * テキストチャット（SSEストリーミング）
+   */
+  async streamTextMessage(
+    request: TextChatRequest,
+    handlers: TextChatStreamHandlers
+  ): Promise<void> {
+    const response = await fetch(`${API_BASE_URL}/api/v1/chat/text/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(request),
+    });
+
+    if (!response.ok || !response.body) {
+      const data = await response.json().catch(() => null);
+      throw new Error(data?.detail || 'サーバーエラーが発生しました');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    const dispatch = (rawEvent: string) => {
+      let event = 'message';
+      let data = '';
+      for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+      if (!data) return;
+
+      const payload = JSON.parse(data);
+      if (event === 'safety') handlers.onSafety?.(payload.safety_warnings);
+      else if (event === 'token') handlers.onToken(payload.content);
+      else if (event === 'done') handlers.onDone?.(payload);
+      else if (event === 'error') throw new Error(payload.detail);
+    };
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+
+      buffer += decoder.decode(value, { stream: true });
+      let separator = buffer.indexOf('\n\n');
+      while (separator !== -1) {
+        dispatch(buffer.slice(0, separator));
+        buffer = buffer.slice(separator + 2);
+        separator = buffer.indexOf('\n\n');
+      }
+    }
+  },
+
   /**
    * 音声チャット
    */
   async sendVoiceMessage(
     audioBlob: Blob,
     model?: string,
-    currentStep?: string
+    currentStep?: string,
+    workOrderId?: string
   ): Promise<VoiceChatResponse> {
     const formData = new FormData();
     formData.append('audio', audioBlob, 'recording.wav');
     if (model) formData.append('model', model);
     if (currentStep) formData.append('current_step', currentStep);
+    if (workOrderId) formData.append('work_order_id', workOrderId);
 
     const response = await apiClient.post<VoiceChatResponse>(
       '/api/v1/chat/voice',
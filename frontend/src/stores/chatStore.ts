@@ -5,8 +5,15 @@
 import { create } from 'zustand';
 import type { ChatMessage } from '@/types';
 
+// 作業案件に紐付かない会話の識別子（サーバー側の対話履歴の要約に使用、履歴の消去で新しくする）
+const newConversationId = (): string =>
+  typeof crypto !== 'undefined' && typeof crypto.randomUUID === 'function'
+    ? crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+
 interface ChatState {
   messages: ChatMessage[];
+  conversationId: string;
   currentModel: string | null;
   currentStep: string | null;
   isLoading: boolean;
@@ -14,6 +21,7 @@ interface ChatState {
 
   // アクション
   addMessage: (message: ChatMessage) => void;
+  appendToLastMessage: (content: string) => void;
   setCurrentModel: (model: string | null) => void;
   setCurrentStep: (step: string | null) => void;
   setLoading: (loading: boolean) => void;
@@ -23,6 +31,7 @@ interface ChatState {
 
 export const useChatStore = create<ChatState>((set) => ({
   messages: [],
+  conversationId: newConversationId(),
   currentModel: null,
   currentStep: null,
   isLoading: false,
@@ -33,6 +42,15 @@ export const useChatStore = create<ChatState>((set) => ({
       messages: [...state.messages, message],
     })),
 
+  appendToLastMessage: (content) =>
+    set((state) => {
+      if (state.messages.length === 0) return state;
+      const messages = [...state.messages];
+      const last = messages[messages.length - 1];
+      messages[messages.length - 1] = { ...last, content: last.content + content };
+      return { messages };
+    }),
+
   setCurrentModel: (model) => set({ currentModel: model }),
 
   setCurrentStep: (step) => set({ currentStep: step }),
@@ -41,5 +59,5 @@ export const useChatStore = create<ChatState>((set) => ({
 
   setError: (error) => set({ error }),
 
-  clearMessages: () => set({ messages: [] }),
+  clearMessages: () => set({ messages: [], conversationId: newConversationId() }),
 }));
@@ -72,7 +72,9 @@ export interface TextChatRequest {
   message: string;
   model?: string;
   current_step?: string;
+  work_order_id?: string; // 指定時はサーバー側の対話履歴を使用（chat_history は不要）
   chat_history?: ChatMessage[];
+  conversation_id?: string; // 作業案件の指定がない場合の会話の識別子（古い対話の要約に使用）
 }
 
 export interface TextChatResponse {
@@ -86,6 +88,22 @@ export interface TextChatResponse {
   safety_warnings?: string[];
 }
 
+export interface TextChatStreamDone {
+  reminder: string;
+  model_used: string;
+  usage: {
+    prompt_tokens: number;
+    completion_tokens: number;
+    total_tokens: number;
+  };
+}
+
+export interface TextChatStreamHandlers {
+  onSafety?: (safetyWarnings: string[]) => void;
+  onToken: (content: string) => void;
+  onDone?: (done: TextChatStreamDone) => void;
+}
+
 export interface VoiceChatResponse {
   transcript: string;
   reply: string;